@@ -0,0 +1,231 @@
+"""
+Content-addressed cache for chart analysis results
+Results are keyed on a hash of the image bytes plus the prompt parameters and
+model name, so re-uploading the same chart skips the OpenAI round-trip
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(image_bytes, trading_style, risk_profile, asset_type, model, timeframes=None,
+                   prompt_version=None):
+    """
+    Build a cache key from the image content and the analysis parameters
+    For a multi-timeframe analysis image_bytes is a sequence of images, one per timeframe;
+    prompt_version retires cached results when the prompt template changes
+    """
+    params = {
+        'trading_style': trading_style,
+        'risk_profile': risk_profile,
+        'asset_type': asset_type,
+        'model': model
+    }
+    if prompt_version is not None:
+        params['prompt_version'] = prompt_version
+    digest = hashlib.sha256()
+    if timeframes is None:
+        digest.update(image_bytes)
+    else:
+        params['timeframes'] = list(timeframes)
+        for image in image_bytes:
+            # Length prefixes keep the boundaries between images unambiguous
+            digest.update(len(image).to_bytes(8, 'big'))
+            digest.update(image)
+    digest.update(b'\0')
+    params = json.dumps(params, sort_keys=True)
+    digest.update(params.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU backend (lost on restart, not shared between workers)"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (value, expires_at) or None, marking the entry as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """Store an entry and return the number of entries evicted to make room"""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """File-backed LRU backend that survives restarts and is shared between workers on one host"""
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Connections do not survive fork (e.g. gunicorn --preload); open one per process on first use
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        """This process's connection; call with self._lock held"""
+        if self._conn is None or self._pid != os.getpid():
+            # A handle inherited from the parent is abandoned, not closed: it belongs to the parent
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            with conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS analysis_cache ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' value TEXT NOT NULL,'
+                    ' expires_at REAL NOT NULL,'
+                    ' last_access REAL NOT NULL)'
+                )
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS ix_analysis_cache_last_access '
+                    'ON analysis_cache (last_access)'
+                )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key):
+        """Return (value, expires_at) or None, marking the entry as recently used"""
+        with self._lock, self._connection() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE analysis_cache SET last_access = ? WHERE key = ?',
+                    (time.time(), key)
+                )
+            return row
+
+    def set(self, key, value, expires_at):
+        """Store an entry and return the number of entries evicted to make room"""
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?)',
+                (key, value, expires_at, time.time())
+            )
+            count = conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow <= 0:
+                return 0
+            conn.execute(
+                'DELETE FROM analysis_cache WHERE key IN ('
+                ' SELECT key FROM analysis_cache ORDER BY last_access ASC LIMIT ?)',
+                (overflow,)
+            )
+            return overflow
+
+    def delete(self, key):
+        with self._lock, self._connection() as conn:
+            conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock, self._connection() as conn:
+            conn.execute('DELETE FROM analysis_cache')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+
+class AnalysisCache:
+    """TTL cache of analysis dicts on top of a pluggable backend, with hit/miss counters"""
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'sets': 0, 'evictions': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key):
+        """Return a fresh copy of the cached analysis, or None on a miss"""
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self.backend.delete(key)
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        # Values are stored serialized so callers can never mutate the cached copy
+        return json.loads(value)
+
+    def set(self, key, analysis):
+        """Cache an analysis dict for the configured TTL"""
+        evicted = self.backend.set(key, json.dumps(analysis), time.time() + self.ttl)
+        self._count('sets')
+        if evicted:
+            self._count('evictions', evicted)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 2) if lookups else 0
+        stats['size'] = len(self.backend)
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+def create_analysis_cache(backend='memory', path='instance/analysis_cache.db', ttl=3600, max_entries=1000):
+    """
+    Build an AnalysisCache for the given backend name
+    Returns None when caching is disabled ('none')
+    """
+    backend = (backend or 'none').lower()
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return AnalysisCache(MemoryCacheBackend(max_entries), ttl=ttl)
+    if backend == 'sqlite':
+        return AnalysisCache(SQLiteCacheBackend(path, max_entries), ttl=ttl)
+    raise ValueError(f'Unknown analysis cache backend: {backend}')
@@ -1,16 +1,52 @@
 import os
 import base64
+import io
 import json
+import hmac
+import math
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_from_directory, redirect, url_for, session
+from functools import wraps
+import click
+from flask import Flask, Request, Response, g, has_request_context, request, jsonify, redirect, url_for, session, stream_with_context
 from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached, object_session
 from dotenv import load_dotenv
 import openai
-from pathlib import Path
+from analysis_cache import create_analysis_cache, make_cache_key
+from db_engine import engine_options, install_sqlite_pragmas, pool_stats, sqlite_pragmas
+from identity_cache import IdentityCache
+from job_queue import QueueFullError, create_job_queue
+from openai_client import OpenAIClientManager
+from metrics import MetricsRegistry
+import migrations
+from passwords import PasswordHasher, PasswordHasherBusyError, below_floor, calibrate
+from pattern_tags import normalize_pattern_tag, pattern_tags
+from rate_limit import create_rate_limiter, parse_rate_limit
+from resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, RetryPolicy, call_with_retries, is_retryable,
+    parse_deadlines, retry_after_seconds
+)
+from prompts import analysis_prompt, create_prompt_registry
+from read_replicas import ReplicaRouter, RoutingSession, replica_binds, replica_urls
+from timeframes import InvalidTimeframeError, normalize_timeframe_results, order_timeframes
+from json_provider import FastJSONProvider, JSONFragmentCache, embed, json_array
+from compression import compress_response
+from http_cache import (
+    IMMUTABLE_ASSET, PAGE_REVALIDATE, PRIVATE_REVALIDATE, StaticAssets, is_not_modified, make_etag
+)
+from stats import summarize_stats
+from pagination import (
+    InvalidCursorError, InvalidFilterError, clamp_per_page, decode_cursor, encode_cursor, parse_date_bound, parse_fields
+)
+from image_pipeline import ImagePipelineStats, ImagePreprocessingError, detect_mime_type, preprocess_image
 
 # Load environment variables
 load_dotenv()
@@ -25,25 +61,333 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-pro
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///trading_system.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool for server databases; pragmas applied to each new SQLite connection
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('true', '1', 'yes')
+app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+
+def database_engine_options(url):
+    return engine_options(
+        url,
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+        pool_pre_ping=app.config['DB_POOL_PRE_PING']
+    )
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Read replicas for dashboard reads; a user's own writes keep their reads on the primary for a while
+app.config['DATABASE_REPLICA_URLS'] = replica_urls(os.getenv('DATABASE_REPLICA_URLS', ''))
+app.config['DATABASE_REPLICA_STICKY_SECONDS'] = float(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 10))
+app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config['DATABASE_REPLICA_URLS'], database_engine_options)
+
+replica_router = ReplicaRouter(
+    app.config['SQLALCHEMY_BINDS'],
+    sticky_seconds=app.config['DATABASE_REPLICA_STICKY_SECONDS']
+)
+# Session key holding the time of the user's last write, for workers that did not see it
+REPLICA_WRITE_SESSION_KEY = '_db_write_at'
+
+
+def read_bind_key():
+    """Replica bind for the current request, chosen once per request; None means the primary"""
+    if not replica_router.enabled or not has_request_context() or not g.get('read_replica'):
+        return None
+    if 'read_bind_key' not in g:
+        # Flask-Login's session key, so choosing a bind never has to load the user
+        g.read_bind_key = replica_router.choose(session.get('_user_id'), session.get(REPLICA_WRITE_SESSION_KEY))
+    return g.read_bind_key
+
+
+def read_replica(view):
+    """Route decorator: the view only reads, so its queries may use a replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession, 'read_bind': read_bind_key})
+
+with app.app_context():
+    for bind_key, engine in db.engines.items():
+        pragmas = sqlite_pragmas(
+            journal_mode=app.config['SQLITE_JOURNAL_MODE'],
+            busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+            synchronous=app.config['SQLITE_SYNCHRONOUS'],
+            mmap_size=app.config['SQLITE_MMAP_SIZE']
+        )
+        if bind_key in replica_router.bind_keys:
+            # A write that reaches a replica is a routing bug; fail it instead of diverging
+            pragmas.append('PRAGMA query_only=ON')
+        install_sqlite_pragmas(engine, pragmas)
+
 login_manager = LoginManager(app)
 login_manager.login_view = 'login_page'
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 FREE_USER_DAILY_LIMIT = 5  # Daily analysis limit for free users
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Uploads up to this size are kept in memory; larger ones spool to a temp file
+app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 4 * 1024 * 1024))
+
+
+class ChartUploadRequest(Request):
+    """Request class that buffers uploads in memory below the spool threshold"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        threshold = app.config['UPLOAD_SPOOL_THRESHOLD']
+        if total_content_length is not None and total_content_length <= threshold:
+            return io.BytesIO()
+        return tempfile.SpooledTemporaryFile(max_size=threshold, mode='rb+')
+    
+    @property
+    def max_content_length(self):
+        # Batch and multi-timeframe uploads carry several charts, so they get their own body size limit
+        if self.endpoint == 'analyze_chart_batch':
+            return app.config['BATCH_MAX_CONTENT_LENGTH']
+        if self.endpoint == 'analyze_timeframes':
+            return app.config['MULTI_TIMEFRAME_MAX_CHARTS'] * MAX_FILE_SIZE
+        return super().max_content_length
+
+
+app.request_class = ChartUploadRequest
+
+# POST /api/analyze/stream: forward the model output to the browser as it is generated
+app.config['ANALYSIS_STREAMING_ENABLED'] = os.getenv('ANALYSIS_STREAMING_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+# Batch analysis: charts per request and concurrent OpenAI calls per batch
+app.config['BATCH_MAX_FILES'] = int(os.getenv('BATCH_MAX_FILES', 20))
+app.config['BATCH_CONCURRENCY'] = int(os.getenv('BATCH_CONCURRENCY', 4))
+app.config['BATCH_MAX_CONTENT_LENGTH'] = int(os.getenv(
+    'BATCH_MAX_CONTENT_LENGTH', app.config['BATCH_MAX_FILES'] * MAX_FILE_SIZE
+))
+
+# Multi-timeframe analysis: charts of one instrument sent to the model in a single call
+app.config['MULTI_TIMEFRAME_MAX_CHARTS'] = int(os.getenv('MULTI_TIMEFRAME_MAX_CHARTS', 4))
+
+# Serve /api/stats from the incrementally maintained user_stats_rollup table
+app.config['STATS_ROLLUP_ENABLED'] = os.getenv('STATS_ROLLUP_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+# History page size cap; clients asking for more get this many
+app.config['HISTORY_MAX_PER_PAGE'] = int(os.getenv('HISTORY_MAX_PER_PAGE', 100))
+
+# JSON responses: orjson when installed, plus cached fragments for analysis records
+app.config['FAST_JSON_ENABLED'] = os.getenv('FAST_JSON_ENABLED', 'True').lower() in ('true', '1', 'yes')
+app.config['JSON_FRAGMENT_CACHE_SIZE'] = int(os.getenv('JSON_FRAGMENT_CACHE_SIZE', 4096))
+
+app.json = FastJSONProvider(app)
+app.json.use_orjson = app.json.use_orjson and app.config['FAST_JSON_ENABLED']
+analysis_fragments = JSONFragmentCache(max_entries=app.config['JSON_FRAGMENT_CACHE_SIZE'])
+
+# gzip/br compression of responses at least COMPRESSION_MIN_SIZE bytes long
+app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', 'True').lower() in ('true', '1', 'yes')
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+
+# HTML pages link CSS/JS as /file?v=<content hash>; those URLs are cached for a year
+static_assets = StaticAssets(app.static_folder)
+
+# Request and stage metrics exposed at /api/metrics
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+# Scrapers send "Authorization: Bearer <token>"; without a token the endpoint stays closed
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
 
-# Create uploads directory if it doesn't exist
-Path(UPLOAD_FOLDER).mkdir(exist_ok=True)
+metrics = MetricsRegistry(enabled=app.config['METRICS_ENABLED'])
+metrics.describe('http_request_duration_seconds', 'histogram', 'Flask request latency by route')
+metrics.describe('analysis_stage_duration_seconds', 'histogram', 'Time spent in each stage of a chart analysis')
+metrics.describe('image_pipeline_stage_duration_seconds', 'histogram', 'Time spent in each image preprocessing stage')
+metrics.describe('openai_request_duration_seconds', 'histogram', 'OpenAI API call latency')
+metrics.describe('openai_time_to_first_token_seconds', 'histogram', 'Time until a streamed OpenAI call returns its first token')
+metrics.describe('openai_tokens_total', 'counter', 'OpenAI tokens used, from response.usage')
+metrics.describe('openai_errors_total', 'counter', 'OpenAI API call failures by exception class')
+metrics.describe('openai_retries_total', 'counter', 'OpenAI API attempts retried after a transient error')
+metrics.describe('openai_hedges_total', 'counter', 'Slow OpenAI API attempts raced by a hedged second attempt')
 
 # OpenAI API key
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+ANALYSIS_MODEL = 'gpt-4o'
+
+# Shared OpenAI client connection pool
+app.config['OPENAI_BASE_URL'] = os.getenv('OPENAI_BASE_URL') or None
+app.config['OPENAI_POOL_MAX_CONNECTIONS'] = int(os.getenv('OPENAI_POOL_MAX_CONNECTIONS', 20))
+app.config['OPENAI_POOL_MAX_KEEPALIVE'] = int(os.getenv('OPENAI_POOL_MAX_KEEPALIVE', 10))
+app.config['OPENAI_POOL_KEEPALIVE_EXPIRY'] = float(os.getenv('OPENAI_POOL_KEEPALIVE_EXPIRY', 30))
+app.config['OPENAI_TIMEOUT'] = float(os.getenv('OPENAI_TIMEOUT', 60))
+app.config['OPENAI_CONNECT_TIMEOUT'] = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 10))
+
+openai_clients = OpenAIClientManager(
+    api_key=OPENAI_API_KEY,
+    base_url=app.config['OPENAI_BASE_URL'],
+    max_connections=app.config['OPENAI_POOL_MAX_CONNECTIONS'],
+    max_keepalive=app.config['OPENAI_POOL_MAX_KEEPALIVE'],
+    keepalive_expiry=app.config['OPENAI_POOL_KEEPALIVE_EXPIRY'],
+    timeout=app.config['OPENAI_TIMEOUT'],
+    connect_timeout=app.config['OPENAI_CONNECT_TIMEOUT'],
+    # Retries are handled by openai_retry_policy below, which also enforces deadlines
+    max_retries=0
+)
+
+# Retries, deadlines and circuit breaker around OpenAI calls
+app.config['OPENAI_MAX_ATTEMPTS'] = int(os.getenv('OPENAI_MAX_ATTEMPTS', 3))
+app.config['OPENAI_RETRY_BASE_DELAY'] = float(os.getenv('OPENAI_RETRY_BASE_DELAY', 0.5))
+app.config['OPENAI_RETRY_MAX_DELAY'] = float(os.getenv('OPENAI_RETRY_MAX_DELAY', 8))
+app.config['OPENAI_DEADLINE'] = float(os.getenv('OPENAI_DEADLINE', 90))
+app.config['OPENAI_CALL_DEADLINES'] = parse_deadlines(os.getenv('OPENAI_CALL_DEADLINES', 'openai_call=30'))
+app.config['OPENAI_CIRCUIT_FAILURE_THRESHOLD'] = int(os.getenv('OPENAI_CIRCUIT_FAILURE_THRESHOLD', 5))
+app.config['OPENAI_CIRCUIT_RECOVERY_TIMEOUT'] = float(os.getenv('OPENAI_CIRCUIT_RECOVERY_TIMEOUT', 30))
+app.config['OPENAI_HEDGE_ENABLED'] = os.getenv('OPENAI_HEDGE_ENABLED', 'False').lower() in ('true', '1', 'yes')
+app.config['OPENAI_HEDGE_DELAY'] = float(os.getenv('OPENAI_HEDGE_DELAY', 10))
+
+openai_retry_policy = RetryPolicy(
+    max_attempts=app.config['OPENAI_MAX_ATTEMPTS'],
+    base_delay=app.config['OPENAI_RETRY_BASE_DELAY'],
+    max_delay=app.config['OPENAI_RETRY_MAX_DELAY']
+)
+openai_circuit = CircuitBreaker(
+    failure_threshold=app.config['OPENAI_CIRCUIT_FAILURE_THRESHOLD'],
+    recovery_timeout=app.config['OPENAI_CIRCUIT_RECOVERY_TIMEOUT']
+)
+
+# Analysis result cache (memory, sqlite or none)
+app.config['ANALYSIS_CACHE_BACKEND'] = os.getenv('ANALYSIS_CACHE_BACKEND', 'memory')
+app.config['ANALYSIS_CACHE_PATH'] = os.getenv('ANALYSIS_CACHE_PATH', os.path.join(app.instance_path, 'analysis_cache.db'))
+app.config['ANALYSIS_CACHE_TTL'] = int(os.getenv('ANALYSIS_CACHE_TTL', 3600))
+app.config['ANALYSIS_CACHE_MAX_ENTRIES'] = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 1000))
+
+analysis_cache = create_analysis_cache(
+    backend=app.config['ANALYSIS_CACHE_BACKEND'],
+    path=app.config['ANALYSIS_CACHE_PATH'],
+    ttl=app.config['ANALYSIS_CACHE_TTL'],
+    max_entries=app.config['ANALYSIS_CACHE_MAX_ENTRIES']
+)
+
+# Token-bucket rate limits per IP, per user and across all users (RATE_LIMIT_<RULE> to override)
+RATE_LIMIT_DEFAULTS = {
+    'login_ip': '30/minute',
+    'login_username': '10/minute',
+    'register_ip': '10/hour',
+    'analyze_user': '60/minute',
+    'openai_call_user': '30/minute',
+    'openai_global': '600/minute'
+}
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() in ('true', '1', 'yes')
+app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_PATH'] = os.getenv('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'rate_limits.db'))
+app.config['RATE_LIMITS'] = {
+    rule: parse_rate_limit(os.getenv(f'RATE_LIMIT_{rule.upper()}', default))
+    for rule, default in RATE_LIMIT_DEFAULTS.items()
+}
+
+rate_limiter = create_rate_limiter(
+    backend=app.config['RATE_LIMIT_BACKEND'],
+    path=app.config['RATE_LIMIT_PATH'],
+    enabled=app.config['RATE_LIMIT_ENABLED']
+)
+
+
+def rate_limited_response(decision):
+    retry_after = max(1, math.ceil(decision.retry_after))
+    response = jsonify({
+        'success': False,
+        'error': f'Too many requests. Please try again in {retry_after} seconds.',
+        'retry_after': retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    response.headers['X-RateLimit-Limit'] = str(decision.limit)
+    response.headers['X-RateLimit-Remaining'] = '0'
+    return response, 429
+
+
+def rate_limit_client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def rate_limit_user():
+    return str(current_user.id) if current_user.is_authenticated else None
+
+
+def rate_limit_login_username():
+    username = (request.get_json(silent=True) or {}).get('username')
+    return str(username).strip().lower() if username else None
+
+
+def rate_limit_global():
+    return 'all'
+
+
+def rate_limits(*rules, cost=None):
+    """Route decorator: rules are (rule name, key function) pairs checked together"""
+    # Limits are looked up in RATE_LIMITS per request, so a rule set to None is skipped
+    return rate_limiter.limit(
+        *((rule, key_func, lambda rule=rule: app.config['RATE_LIMITS'].get(rule)) for rule, key_func in rules),
+        on_limited=rate_limited_response,
+        cost=cost
+    )
+
+
+login_rate_limit = rate_limits(('login_ip', rate_limit_client_ip), ('login_username', rate_limit_login_username))
+register_rate_limit = rate_limits(('register_ip', rate_limit_client_ip))
+# Every chart in a batch is a separate OpenAI call
+analysis_rate_limit = rate_limits(
+    ('analyze_user', rate_limit_user), ('openai_global', rate_limit_global),
+    cost=lambda: max(1, len(request.files.getlist('chart'))) if request.path == '/api/analyze/batch' else 1
+)
+openai_call_rate_limit = rate_limits(('openai_call_user', rate_limit_user), ('openai_global', rate_limit_global))
+
+# Image preprocessing before upload to the vision model
+app.config['IMAGE_PREPROCESSING_ENABLED'] = os.getenv('IMAGE_PREPROCESSING_ENABLED', 'True').lower() in ('true', '1', 'yes')
+app.config['IMAGE_MAX_DIMENSION'] = int(os.getenv('IMAGE_MAX_DIMENSION', 2048))
+app.config['IMAGE_MAX_SHORT_SIDE'] = int(os.getenv('IMAGE_MAX_SHORT_SIDE', 768))
+app.config['IMAGE_QUALITY'] = int(os.getenv('IMAGE_QUALITY', 85))
+app.config['IMAGE_OUTPUT_FORMAT'] = os.getenv('IMAGE_OUTPUT_FORMAT', 'webp')
+
+image_pipeline_stats = ImagePipelineStats()
+
+# Async analysis jobs (opt-in per request with async=true)
+app.config['ASYNC_ANALYSIS_ENABLED'] = os.getenv('ASYNC_ANALYSIS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+app.config['ANALYSIS_JOB_WORKERS'] = int(os.getenv('ANALYSIS_JOB_WORKERS', 2))
+app.config['ANALYSIS_JOB_QUEUE_SIZE'] = int(os.getenv('ANALYSIS_JOB_QUEUE_SIZE', 20))
+app.config['ANALYSIS_JOB_RESULT_TTL'] = int(os.getenv('ANALYSIS_JOB_RESULT_TTL', 3600))
+app.config['ANALYSIS_JOB_RETRY_AFTER'] = int(os.getenv('ANALYSIS_JOB_RETRY_AFTER', 10))
+app.config['ANALYSIS_JOB_SSE_KEEPALIVE'] = int(os.getenv('ANALYSIS_JOB_SSE_KEEPALIVE', 15))
+
+# Logged-in user lookups cached for Flask-Login (USER_CACHE_TTL=0 disables)
+app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', 30))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+user_identity_cache = IdentityCache(ttl=app.config['USER_CACHE_TTL'], max_entries=app.config['USER_CACHE_MAX_ENTRIES'])
+
+# Password hashing cost and where the key derivation runs (PASSWORD_HASH_WORKERS=0: request thread)
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 0))
+app.config['PASSWORD_HASH_EXECUTOR'] = os.getenv('PASSWORD_HASH_EXECUTOR', 'thread')
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+app.config['PASSWORD_HASH_RETRY_AFTER'] = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 2))
+app.config['PASSWORD_REHASH_ENABLED'] = os.getenv('PASSWORD_REHASH_ENABLED', 'True').lower() in ('true', '1', 'yes')
+
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    executor=app.config['PASSWORD_HASH_EXECUTOR'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+)
 
 
 # Database Models
@@ -56,33 +400,74 @@ class User(UserMixin, db.Model):
     full_name = db.Column(db.String(120))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_premium = db.Column(db.Boolean, default=False)
+    # Bumped whenever one of the user's analyses is added or changed; validates history/stats ETags
+    analyses_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relationships
     analyses = db.relationship('TradeAnalysis', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def get_today_analysis_count(self):
         """Get number of analyses done today"""
-        today = datetime.utcnow().date()
-        return TradeAnalysis.query.filter(
-            TradeAnalysis.user_id == self.id,
-            db.func.date(TradeAnalysis.created_at) == today
-        ).count()
+        return DailyUsage.get_count(self.id, datetime.utcnow().date())
     
-    def can_analyze(self):
+    def can_analyze(self, analyses_today=None):
         """Check if user can perform analysis (considering daily limit)"""
         if self.is_premium:
             return True
-        return self.get_today_analysis_count() < FREE_USER_DAILY_LIMIT
+        if analyses_today is None:
+            analyses_today = self.get_today_analysis_count()
+        return analyses_today < FREE_USER_DAILY_LIMIT
+    
+    def reserve_analysis(self):
+        """
+        Atomically take one of today's analysis slots
+        Returns the day the slot was counted against, or None if the daily limit is reached
+        """
+        limit = None if self.is_premium else FREE_USER_DAILY_LIMIT
+        return DailyUsage.increment(self.id, limit=limit)
+    
+    def reserve_analyses(self, count):
+        """
+        Atomically take up to count of today's slots for a batch
+        Returns (day, granted); granted is less than count when the limit cuts the batch short
+        """
+        if count <= 0:
+            return None, 0
+        if self.is_premium:
+            return DailyUsage.increment(self.id, amount=count), count
+        
+        # The remaining allowance can shrink between the read and the update, so retry a few times
+        for _ in range(3):
+            remaining = FREE_USER_DAILY_LIMIT - DailyUsage.get_count(self.id, datetime.utcnow().date())
+            if remaining <= 0:
+                return None, 0
+            granted = min(count, remaining)
+            day = DailyUsage.increment(self.id, limit=FREE_USER_DAILY_LIMIT, amount=granted)
+            if day is not None:
+                return day, granted
+        return None, 0
+    
+    def release_analysis(self, day, count=1):
+        """Give back slots taken by reserve_analysis()/reserve_analyses() when analyses failed"""
+        DailyUsage.decrement(self.id, day, amount=count)
+
+
+# JSON list columns: JSONB on PostgreSQL, JSON text (queryable with JSON1) elsewhere
+JSONList = db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
 
 
 class TradeAnalysis(db.Model):
     """Trade analysis history model"""
+    __table_args__ = tuple(
+        db.Index(name, *columns) for name, columns in migrations.TRADE_ANALYSIS_INDEXES
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -92,29 +477,345 @@ class TradeAnalysis(db.Model):
     risk_profile = db.Column(db.String(50))  # Conservative/Balanced/Aggressive
     asset_type = db.Column(db.String(50))  # Crypto/Forex/Stocks
     
-    # Analysis results (stored as JSON)
-    patterns = db.Column(db.Text)  # JSON array
-    indicators = db.Column(db.Text)  # JSON array
+    # Analysis results (lists are JSON columns)
+    # The long text columns are deferred so list queries only load them when asked
+    patterns = db.deferred(db.Column(JSONList), group='analysis_text')
+    indicators = db.deferred(db.Column(JSONList), group='analysis_text')
     trade_direction = db.Column(db.String(20))  # Long/Short
     entry_price = db.Column(db.String(100))
     stop_loss = db.Column(db.String(100))
-    take_profit = db.Column(db.Text)  # JSON array for multiple TPs
-    pattern_explanation = db.Column(db.Text)
-    reasoning = db.Column(db.Text)
+    take_profit = db.Column(JSONList)  # Multiple TPs
+    pattern_explanation = db.deferred(db.Column(db.Text), group='analysis_text')
+    reasoning = db.deferred(db.Column(db.Text), group='analysis_text')
     confidence_score = db.Column(db.Integer)
-    risk_factors = db.Column(db.Text)  # JSON array
+    risk_factors = db.deferred(db.Column(JSONList), group='analysis_text')
     
     # User feedback
     outcome = db.Column(db.String(20))  # win/loss/pending
     notes = db.Column(db.Text)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Incremented on every change, so (id, version) identifies a representation
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def bump_analyses_version(user_id):
+    """Invalidate cached history and stats for a user, inside the caller's transaction"""
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(analyses_version=User.analyses_version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+
+class AnalysisPattern(db.Model):
+    """One normalized pattern tag per analysis, indexed for pattern searches"""
+    __table_args__ = (
+        db.Index('ix_analysis_pattern_user_tag', 'user_id', 'tag'),
+    )
+    
+    analysis_id = db.Column(db.Integer, db.ForeignKey('trade_analysis.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+
+
+class AnalysisTimeframe(db.Model):
+    """Per-timeframe sub-result of a multi-timeframe analysis"""
+    analysis_id = db.Column(db.Integer, db.ForeignKey('trade_analysis.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)  # Shortest timeframe first
+    timeframe = db.Column(db.String(20), nullable=False)
+    trend = db.Column(db.String(50))
+    direction = db.Column(db.String(20))
+    patterns = db.Column(JSONList)
+    indicators = db.Column(JSONList)
+    confidence_score = db.Column(db.Integer)
+    summary = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'timeframe': self.timeframe,
+            'trend': self.trend,
+            'direction': self.direction,
+            'patterns': self.patterns if self.patterns is not None else [],
+            'indicators': self.indicators if self.indicators is not None else [],
+            'confidence_score': self.confidence_score,
+            'summary': self.summary
+        }
+
+
+class DailyUsage(db.Model):
+    """Per-user, per-day analysis counter used for quota checks"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    analysis_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def get_count(cls, user_id, day):
+        """Primary-key lookup of a user's analysis count for one day"""
+        count = db.session.execute(
+            db.select(cls.analysis_count).where(cls.user_id == user_id, cls.day == day)
+        ).scalar()
+        return count or 0
+    
+    @classmethod
+    def increment(cls, user_id, limit=None, amount=1):
+        """
+        Add amount to today's counter in a single conditional UPDATE (or INSERT for the
+        first analysis of the day), so concurrent requests cannot exceed the limit
+        Returns the day counted against, or None when the limit would be exceeded
+        """
+        today = datetime.utcnow().date()
+        for _ in range(2):
+            stmt = db.update(cls).where(cls.user_id == user_id, cls.day == today)
+            if limit is not None:
+                stmt = stmt.where(cls.analysis_count + amount <= limit)
+            result = db.session.execute(
+                stmt.values(analysis_count=cls.analysis_count + amount),
+                execution_options={'synchronize_session': False}
+            )
+            if result.rowcount:
+                db.session.commit()
+                return today
+            
+            if cls.get_count(user_id, today) or (limit is not None and amount > limit):
+                # The row exists, so the conditional update failed on the limit
+                db.session.rollback()
+                return None
+            
+            try:
+                db.session.execute(db.insert(cls).values(user_id=user_id, day=today, analysis_count=amount))
+                db.session.commit()
+                return today
+            except IntegrityError:
+                # Another request created today's row first; retry the update
+                db.session.rollback()
+        return None
+    
+    @classmethod
+    def decrement(cls, user_id, day, amount=1):
+        db.session.execute(
+            db.update(cls)
+            .where(cls.user_id == user_id, cls.day == day, cls.analysis_count >= amount)
+            .values(analysis_count=cls.analysis_count - amount),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+
+class UserStatsRollup(db.Model):
+    """Per-user analysis counts grouped by parameters and outcome, kept in step with TradeAnalysis"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    # Missing values are stored as '' because primary key columns cannot be NULL
+    asset_type = db.Column(db.String(50), primary_key=True)
+    trading_style = db.Column(db.String(50), primary_key=True)
+    risk_profile = db.Column(db.String(50), primary_key=True)
+    outcome = db.Column(db.String(20), primary_key=True)
+    analysis_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0)
+    confidence_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def apply(cls, analysis, delta, outcome=None):
+        """
+        Add (delta=1) or remove (delta=-1) one analysis from its rollup group
+        Runs inside the caller's transaction so the rollup commits with the change itself
+        """
+        if not app.config['STATS_ROLLUP_ENABLED']:
+            return
+        
+        keys = {
+            'user_id': analysis.user_id,
+            'asset_type': analysis.asset_type or '',
+            'trading_style': analysis.trading_style or '',
+            'risk_profile': analysis.risk_profile or '',
+            'outcome': (outcome if outcome is not None else analysis.outcome) or ''
+        }
+        try:
+            confidence = float(analysis.confidence_score)
+        except (TypeError, ValueError):
+            confidence = None
+        
+        def update_group():
+            return db.session.execute(
+                db.update(cls)
+                .where(*(getattr(cls, column) == value for column, value in keys.items()))
+                .values(
+                    analysis_count=cls.analysis_count + delta,
+                    confidence_sum=cls.confidence_sum + (confidence or 0) * delta,
+                    confidence_count=cls.confidence_count + (delta if confidence is not None else 0)
+                ),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+        
+        if update_group() or delta < 0:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(cls).values(
+                    **keys,
+                    analysis_count=delta,
+                    confidence_sum=(confidence or 0) * delta,
+                    confidence_count=delta if confidence is not None else 0
+                ))
+        except IntegrityError:
+            # A concurrent request created the group first
+            update_group()
+
+
+@app.cli.command('rebuild-stats-rollup')
+def rebuild_stats_rollup_command():
+    """Recompute the per-user stats rollup from all analyses"""
+    db.create_all()
+    with db.engine.begin() as conn:
+        migrations.rebuild_stats_rollup(conn)
+    print("Rebuilt user stats rollup")
+
+
+def backfill_daily_usage():
+    """Rebuild DailyUsage counters from existing TradeAnalysis rows; returns rows written"""
+    day = db.func.date(TradeAnalysis.created_at)
+    rows = db.session.execute(
+        db.select(TradeAnalysis.user_id, day, db.func.count(TradeAnalysis.id))
+        .group_by(TradeAnalysis.user_id, day)
+    ).all()
+    
+    db.session.execute(db.delete(DailyUsage))
+    for user_id, created_day, count in rows:
+        if isinstance(created_day, str):
+            created_day = datetime.strptime(created_day, '%Y-%m-%d').date()
+        db.session.add(DailyUsage(user_id=user_id, day=created_day, analysis_count=count))
+    db.session.commit()
+    return len(rows)
+
+
+@app.cli.command('backfill-daily-usage')
+def backfill_daily_usage_command():
+    """Populate the daily usage counters from existing analyses"""
+    db.create_all()
+    print(f"Backfilled {backfill_daily_usage()} daily usage rows")
+
+
+def init_db():
+    """Create missing tables and apply pending schema migrations"""
+    db.create_all()
+    return migrations.upgrade(db.engine)
+
+
+@app.cli.command('prompt-report')
+def prompt_report_command():
+    """List the rendered prompt variants with their estimated token counts"""
+    for (name, params), prompt in analysis_prompts.variants():
+        values = dict(params)
+        label = ' / '.join(values[key] for key in ('trading_style', 'risk_profile', 'asset_type'))
+        if 'timeframes' in values:
+            label += f" [{values['timeframes']}]"
+        print(f"{name}@{prompt.version}  {label:<40} ~{prompt.estimated_tokens} tokens")
+
+
+@app.cli.command('password-benchmark')
+@click.option('--target-ms', default=250, show_default=True, help='Target time for one password hash')
+@click.option('--algorithm', type=click.Choice(['scrypt', 'pbkdf2']), default='scrypt', show_default=True)
+def password_benchmark_command(target_ms, algorithm):
+    """Time password hash parameters on this machine and recommend PASSWORD_HASH_METHOD"""
+    candidates, recommended = calibrate(target_ms / 1000, algorithm)
+    for method, seconds in candidates:
+        print(f"{method:<28} {seconds * 1000:8.1f} ms")
+    print(f"Current: {password_hasher.method}")
+    if below_floor(candidates, recommended, target_ms / 1000):
+        print(f"Even the minimum cost takes longer than {target_ms} ms on this machine; "
+              f"recommending the minimum: PASSWORD_HASH_METHOD={recommended}")
+    else:
+        print(f"Recommended for ~{target_ms} ms: PASSWORD_HASH_METHOD={recommended}")
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create tables and apply pending schema migrations"""
+    applied = init_db()
+    with db.engine.connect() as conn:
+        version = migrations.get_schema_version(conn)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    print(f"Database schema is at version {version}")
+
+
+# Columns kept in the identity cache; the password hash and analyses_version are loaded on access
+USER_CACHE_COLUMNS = ('id', 'username', 'email', 'full_name', 'created_at', 'is_premium')
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user for Flask-Login"""
-    return User.query.get(int(user_id))
+    """Load user for Flask-Login, from the identity cache when possible"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    
+    if user_identity_cache.enabled:
+        values = user_identity_cache.get(user_id)
+        if values is not None:
+            # Attach a copy to this request's session without a query
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+    
+    # Taken before the read: an update that lands in between makes set() a no-op
+    generation = user_identity_cache.generation(user_id)
+    user = db.session.get(User, user_id)
+    if user is not None and user_identity_cache.enabled:
+        user_identity_cache.set(user_id, {column: getattr(user, column) for column in USER_CACHE_COLUMNS}, generation)
+    return user
+
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, user):
+    """Drop a user's cached identity when the row changes (premium status, profile)"""
+    user_identity_cache.invalidate(user.id)
+    # Readers can still see the old row until commit; invalidate again once it is visible
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault('invalidated_user_ids', set()).add(user.id)
+
+
+@db.event.listens_for(RoutingSession, 'after_commit')
+def invalidate_committed_users(db_session):
+    for user_id in db_session.info.pop('invalidated_user_ids', ()):
+        user_identity_cache.invalidate(user_id)
+
+
+@db.event.listens_for(RoutingSession, 'after_rollback')
+def forget_invalidated_users(db_session):
+    db_session.info.pop('invalidated_user_ids', None)
+
+
+@db.event.listens_for(RoutingSession, 'after_flush')
+def record_flushed_writes(db_session, flush_context):
+    """Keep the owners of flushed rows reading from the primary (covers background jobs too)"""
+    if replica_router.enabled:
+        changed = (*db_session.new, *db_session.dirty, *db_session.deleted)
+        record_replica_writes({obj.id if isinstance(obj, User) else getattr(obj, 'user_id', None) for obj in changed})
+
+
+@db.event.listens_for(RoutingSession, 'do_orm_execute')
+def record_statement_writes(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements bypass the flush"""
+    if replica_router.enabled and not orm_execute_state.is_select:
+        record_replica_writes(set())
+
+
+def record_replica_writes(user_ids):
+    if has_request_context():
+        # The rest of this request reads its own write too
+        g.read_bind_key = None
+        if session.get('_user_id') is not None:
+            session[REPLICA_WRITE_SESSION_KEY] = replica_router.record_write(session['_user_id'])
+    for user_id in user_ids - {None}:
+        replica_router.record_write(user_id)
+
+
+# Analysis prompt variants, rendered once and versioned by template hash
+analysis_prompts = create_prompt_registry()
 
 
 def allowed_file(filename):
@@ -122,158 +823,328 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def encode_image(image_path):
+def read_upload(file):
+    """
+    Return the contents of an uploaded file as a memoryview
+    In-memory uploads are exposed without copying; spooled ones are read once
+    """
+    stream = file.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getbuffer()
+    stream.seek(0)
+    return memoryview(stream.read())
+
+
+def encode_image(image_bytes):
     """Encode image to base64"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    return base64.b64encode(image_bytes).decode('utf-8')
+
+
+def hedge_delay():
+    """Seconds after which a slow call is raced by a second attempt; only for premium users"""
+    if not app.config['OPENAI_HEDGE_ENABLED'] or not has_request_context():
+        return None
+    if not (current_user.is_authenticated and current_user.is_premium):
+        return None
+    return app.config['OPENAI_HEDGE_DELAY']
+
+
+def call_openai(call, attempt, hedge_after=None):
+    """Run attempt(timeout) under the retry policy, the call's deadline and the circuit breaker"""
+    def on_retry(error, delay):
+        metrics.inc('openai_retries_total', labels={'call': call, 'error': type(error).__name__})
+        app.logger.warning(f'OpenAI {call} call failed ({type(error).__name__}); retrying in {delay:.2f}s')
+    
+    return call_with_retries(
+        attempt,
+        openai_retry_policy,
+        breaker=openai_circuit,
+        deadline=app.config['OPENAI_CALL_DEADLINES'].get(call, app.config['OPENAI_DEADLINE']),
+        attempt_timeout=app.config['OPENAI_TIMEOUT'],
+        hedge_after=hedge_after,
+        on_retry=on_retry,
+        on_hedge=lambda: metrics.inc('openai_hedges_total', labels={'call': call})
+    )
 
 
-def analyze_chart_with_ai(image_path, trading_style='Day Trade', risk_profile='Balanced', asset_type='Crypto'):
+def create_chat_completion(call, **kwargs):
+    """Call the chat completions API on the shared client, recording latency, tokens and errors"""
+    labels = {'call': call, 'model': kwargs.get('model')}
+    client = openai_clients.get_client()
+    
+    def attempt(timeout):
+        with metrics.timer('openai_request_duration_seconds', labels):
+            return client.chat.completions.create(timeout=timeout, **kwargs)
+    
+    try:
+        response = call_openai(call, attempt, hedge_delay())
+    except Exception as e:
+        metrics.inc('openai_errors_total', labels={'call': call, 'error': type(e).__name__})
+        raise
+    
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            tokens = getattr(usage, kind, None)
+            if isinstance(tokens, int):
+                metrics.inc('openai_tokens_total', tokens, labels={**labels, 'kind': kind})
+    return response
+
+
+def prepare_chart_image(image_bytes):
+    """Downscale and re-encode a chart if enabled; returns a data URL for the vision API"""
+    if app.config['IMAGE_PREPROCESSING_ENABLED']:
+        with metrics.timer('analysis_stage_duration_seconds', {'stage': 'preprocess'}):
+            prepared = preprocess_image(
+                image_bytes,
+                max_dimension=app.config['IMAGE_MAX_DIMENSION'],
+                max_short_side=app.config['IMAGE_MAX_SHORT_SIDE'],
+                quality=app.config['IMAGE_QUALITY'],
+                output_format=app.config['IMAGE_OUTPUT_FORMAT']
+            )
+        image_pipeline_stats.record(prepared)
+        for stage, seconds in prepared.timings.items():
+            metrics.observe('image_pipeline_stage_duration_seconds', seconds, {'stage': stage})
+        image_bytes, mime_type = prepared.data, prepared.mime_type
+    else:
+        mime_type = detect_mime_type(image_bytes)
+    
+    # Encode the image
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'encode'}):
+        base64_image = encode_image(image_bytes)
+    return f"data:{mime_type};base64,{base64_image}"
+
+
+def stream_chat_completion(call, **kwargs):
+    """
+    Streaming variant of create_chat_completion
+    Yields ('delta', text) for each piece of content as it arrives and returns
+    (content, usage) once the stream is finished
+    """
+    labels = {'call': call, 'model': kwargs.get('model')}
+    # Ask for the usage totals in a final chunk (stream_options, sent raw for older SDKs)
+    extra_body = {**kwargs.pop('extra_body', {}), 'stream_options': {'include_usage': True}}
+    started = time.perf_counter()
+    first_token = None
+    parts = []
+    usage = None
+    client = openai_clients.get_client()
+    try:
+        # Only opening the stream is retried; once output has been forwarded it cannot be replayed
+        stream = call_openai(call, lambda timeout: client.chat.completions.create(
+            stream=True, extra_body=extra_body, timeout=timeout, **kwargs
+        ))
+        with stream:
+            for chunk in stream:
+                chunk_usage = getattr(chunk, 'usage', None)
+                if chunk_usage:
+                    usage = chunk_usage
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                        metrics.observe('openai_time_to_first_token_seconds', first_token, labels)
+                    parts.append(text)
+                    yield 'delta', text
+    except Exception as e:
+        metrics.inc('openai_errors_total', labels={'call': call, 'error': type(e).__name__})
+        raise
+    finally:
+        metrics.observe('openai_request_duration_seconds', time.perf_counter() - started, labels)
+    
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        tokens = usage.get(kind) if isinstance(usage, dict) else getattr(usage, kind, None)
+        if isinstance(tokens, int):
+            metrics.inc('openai_tokens_total', tokens, labels={**labels, 'kind': kind})
+    return ''.join(parts), usage
+
+
+def analysis_messages(image_bytes, prompt, timeframes=None):
+    """Chat messages carrying the prompt and the chart (or one chart per timeframe)"""
+    content = [{"type": "text", "text": prompt.text}]
+    if timeframes:
+        # One message carries every chart, so the long instructions are only sent once
+        for timeframe, chart in zip(timeframes, image_bytes):
+            content.append({"type": "text", "text": f"Timeframe: {timeframe}"})
+            content.append({"type": "image_url", "image_url": {"url": prepare_chart_image(chart)}})
+    else:
+        content.append({"type": "image_url", "image_url": {"url": prepare_chart_image(image_bytes)}})
+    return [
+        {
+            "role": "user",
+            "content": content
+        }
+    ]
+
+
+def parse_analysis(content, timeframes=None):
+    """Decode the model's JSON answer"""
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'json_parse'}):
+        analysis = json.loads(content)
+    if timeframes:
+        analysis['timeframes'] = normalize_timeframe_results(analysis.get('timeframes'), timeframes)
+    return analysis
+
+
+def analysis_error_result(error):
+    """
+    Map an exception raised while analyzing a chart to the error result returned to clients
+    Failures caused by a degraded upstream carry retry_after (seconds) for a 503 response
+    """
+    retry_after = None
+    if isinstance(error, CircuitOpenError):
+        message = 'The analysis service is temporarily unavailable. Please try again shortly.'
+        retry_after = error.retry_after
+    elif isinstance(error, (DeadlineExceededError, openai.APITimeoutError)):
+        message = 'The analysis took too long to complete. Please try again in a few moments.'
+        retry_after = app.config['OPENAI_RETRY_MAX_DELAY']
+    elif isinstance(error, openai.AuthenticationError):
+        # Handle authentication errors (invalid API key)
+        message = 'Invalid OpenAI API key. Please check your OPENAI_API_KEY in the .env file and ensure it is correct. You can get a valid API key from https://platform.openai.com/api-keys'
+    elif isinstance(error, openai.RateLimitError):
+        # Handle rate limit errors
+        message = 'OpenAI API rate limit exceeded. Please try again in a few moments or check your usage at https://platform.openai.com/usage'
+    elif isinstance(error, openai.APIError):
+        # Handle general API errors
+        message = 'An error occurred while communicating with the OpenAI API. Please try again later or check the service status at https://status.openai.com/'
+    elif isinstance(error, ImagePreprocessingError):
+        # Handle uploads that are not decodable images
+        message = 'The uploaded file could not be read as an image. Please upload a valid chart image.'
+    elif isinstance(error, json.JSONDecodeError):
+        # Handle JSON parsing errors
+        message = 'Failed to parse the analysis response. Please try again.'
+    else:
+        # Log the actual error for debugging but return a generic message
+        app.logger.error(f'Unexpected error in chart analysis: {str(error)}', exc_info=error)
+        message = 'An unexpected error occurred while analyzing the chart. Please try again or contact support if the issue persists.'
+    if retry_after is None and is_retryable(error):
+        # Still failing after our own retries; ask the client to come back after the server's hint
+        retry_after = retry_after_seconds(error) or app.config['OPENAI_RETRY_MAX_DELAY']
+    result = {
+        'success': False,
+        'error': message
+    }
+    if retry_after is not None:
+        result['retry_after'] = math.ceil(retry_after)
+    return result
+
+
+def analysis_failure_response(result):
+    """503 with Retry-After when upstream is degraded, otherwise 500"""
+    response = jsonify(result)
+    if 'retry_after' in result:
+        response.headers['Retry-After'] = str(result['retry_after'])
+        return response, 503
+    return response, 500
+
+
+def missing_api_key_result():
+    return {
+        'success': False,
+        'error': 'OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file.'
+    }
+
+
+def analyze_chart_with_ai(image_bytes, trading_style='Day Trade', risk_profile='Balanced', asset_type='Crypto',
+                          timeframes=None):
     """
     Analyze trading chart using OpenAI GPT-4 Vision
     Returns structured analysis with trade setup
+    With timeframes, image_bytes is a list of charts of one instrument (one per timeframe,
+    in the same order) that are sent together in a single call for a confluent setup
     """
     # Check if API key is configured
     if not OPENAI_API_KEY or not OPENAI_API_KEY.strip():
-        return {
-            'success': False,
-            'error': 'OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file.'
-        }
+        return missing_api_key_result()
     
     try:
-        # Read and encode the image
-        base64_image = encode_image(image_path)
-        
-        # Adjust prompt based on trading style and risk profile
-        style_adjustments = {
-            'Scalping': 'Focus on very short-term price movements (minutes to hours). Tighter stop losses and quicker profit targets.',
-            'Day Trade': 'Focus on intraday movements. Positions closed within the same trading day.',
-            'Swing': 'Focus on multi-day to multi-week price movements. Wider stop losses and larger profit targets.'
-        }
+        prompt = analysis_prompt(analysis_prompts, trading_style, risk_profile, asset_type, timeframes)
         
-        risk_adjustments = {
-            'Conservative': 'Recommend tighter stop losses and smaller position sizing. Risk-reward ratio of at least 1:2.',
-            'Balanced': 'Moderate risk approach with standard risk-reward ratio of 1:1.5 to 1:2.',
-            'Aggressive': 'Accept higher risk for potentially higher rewards. Risk-reward ratio of 1:1 to 1:1.5 is acceptable.'
-        }
+        # Serve repeated uploads of the same chart from the cache
+        cache_key = None
+        if analysis_cache is not None:
+            with metrics.timer('analysis_stage_duration_seconds', {'stage': 'cache_lookup'}):
+                cache_key = make_cache_key(image_bytes, trading_style, risk_profile, asset_type, ANALYSIS_MODEL,
+                                           timeframes, prompt.version)
+                cached_analysis = analysis_cache.get(cache_key)
+            if cached_analysis is not None:
+                return {
+                    'success': True,
+                    'analysis': cached_analysis,
+                    'cached': True
+                }
         
-        # Create the prompt for analysis
-        prompt = f"""You are an expert technical analyst. Analyze this trading chart image and provide a structured trade setup.
-
-Trading Context:
-- Asset Type: {asset_type}
-- Trading Style: {trading_style} - {style_adjustments.get(trading_style, '')}
-- Risk Profile: {risk_profile} - {risk_adjustments.get(risk_profile, '')}
-
-Your analysis should include:
-1. Market type identification (crypto/forex/stocks)
-2. Identified chart patterns (e.g., head and shoulders, double top, triangles, flags, etc.)
-3. Key technical indicators visible (e.g., moving averages, RSI, MACD, support/resistance levels)
-4. Chart quality assessment - if the chart is unclear, blurry, missing timeframe, or lacks key information, note this
-5. Suggested trade setup:
-   - Trade direction (Long/Short)
-   - Entry price level
-   - Stop loss level
-   - Multiple take profit levels (TP1, TP2, TP3) for partial exits
-6. Pattern explanation (brief, 2-3 sentences)
-7. Trading reasoning (why this setup, key factors)
-8. Confidence score (0-100%) - lower confidence if chart is unclear
-9. Specific reasons if chart quality is poor
-
-Important guidelines:
-- Only analyze what is clearly visible in the chart
-- If chart is unclear, blurry, or missing critical information (like timeframe), set confidence below 30% and explain issues
-- Be specific with price levels when visible
-- Use neutral, educational tone
-- Include risk factors
-- Emphasize this is educational analysis, not financial advice
-- Adjust recommendations based on the trading style and risk profile provided
-
-Format your response as JSON with this structure:
-{{
-  "market_type": "string",
-  "patterns": ["array", "of", "patterns"],
-  "indicators": ["array", "of", "indicators"],
-  "chart_quality": "clear/moderate/poor",
-  "chart_issues": ["array of issues if quality is poor"],
-  "trade_setup": {{
-    "direction": "Long or Short",
-    "entry": "price level or description",
-    "stop_loss": "price level or description",
-    "take_profit": ["TP1", "TP2", "TP3"]
-  }},
-  "pattern_explanation": "string",
-  "reasoning": "string",
-  "confidence_score": number,
-  "risk_factors": ["array", "of", "risks"]
-}}"""
-
         # Call OpenAI API
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1500,
+        response = create_chat_completion(
+            'analyze_timeframes' if timeframes else 'analyze',
+            model=ANALYSIS_MODEL,
+            messages=analysis_messages(image_bytes, prompt, timeframes),
+            max_tokens=1500 + 300 * len(timeframes or ()),
             response_format={"type": "json_object"}
         )
+        analysis_prompts.record_usage(prompt, getattr(response, 'usage', None))
         
         # Parse the response
-        analysis = json.loads(response.choices[0].message.content)
+        analysis = parse_analysis(response.choices[0].message.content, timeframes)
+        
+        if cache_key is not None:
+            analysis_cache.set(cache_key, analysis)
         
         return {
             'success': True,
             'analysis': analysis
         }
         
-    except openai.AuthenticationError:
-        # Handle authentication errors (invalid API key)
-        return {
-            'success': False,
-            'error': 'Invalid OpenAI API key. Please check your OPENAI_API_KEY in the .env file and ensure it is correct. You can get a valid API key from https://platform.openai.com/api-keys'
-        }
-    except openai.RateLimitError:
-        # Handle rate limit errors
-        return {
-            'success': False,
-            'error': 'OpenAI API rate limit exceeded. Please try again in a few moments or check your usage at https://platform.openai.com/usage'
-        }
-    except openai.APIError:
-        # Handle general API errors
-        return {
-            'success': False,
-            'error': 'An error occurred while communicating with the OpenAI API. Please try again later or check the service status at https://status.openai.com/'
-        }
-    except json.JSONDecodeError:
-        # Handle JSON parsing errors
-        return {
-            'success': False,
-            'error': 'Failed to parse the analysis response. Please try again.'
-        }
     except Exception as e:
-        # Log the actual error for debugging but return a generic message
-        app.logger.error(f'Unexpected error in analyze_chart_with_ai: {str(e)}', exc_info=True)
-        return {
-            'success': False,
-            'error': 'An unexpected error occurred while analyzing the chart. Please try again or contact support if the issue persists.'
-        }
+        return analysis_error_result(e)
+
+
+def stream_chart_analysis(image_bytes, trading_style='Day Trade', risk_profile='Balanced', asset_type='Crypto'):
+    """
+    Streaming variant of analyze_chart_with_ai
+    Yields ('delta', text) events with the model's output as it is generated, then one
+    ('result', result) event with the same result dict analyze_chart_with_ai returns
+    """
+    if not OPENAI_API_KEY or not OPENAI_API_KEY.strip():
+        yield 'result', missing_api_key_result()
+        return
+    
+    try:
+        prompt = analysis_prompt(analysis_prompts, trading_style, risk_profile, asset_type)
+        
+        cache_key = None
+        if analysis_cache is not None:
+            with metrics.timer('analysis_stage_duration_seconds', {'stage': 'cache_lookup'}):
+                cache_key = make_cache_key(image_bytes, trading_style, risk_profile, asset_type, ANALYSIS_MODEL,
+                                           prompt_version=prompt.version)
+                cached_analysis = analysis_cache.get(cache_key)
+            if cached_analysis is not None:
+                yield 'result', {'success': True, 'analysis': cached_analysis, 'cached': True}
+                return
+        
+        content, usage = yield from stream_chat_completion(
+            'analyze_stream',
+            model=ANALYSIS_MODEL,
+            messages=analysis_messages(image_bytes, prompt),
+            max_tokens=1500,
+            response_format={"type": "json_object"}
+        )
+        analysis_prompts.record_usage(prompt, usage)
+        
+        # The streamed text is only trusted once it parses as a whole
+        analysis = parse_analysis(content)
+        if cache_key is not None:
+            analysis_cache.set(cache_key, analysis)
+        yield 'result', {'success': True, 'analysis': analysis}
+    
+    except Exception as e:
+        yield 'result', analysis_error_result(e)
 
 
 # Backend API route for OpenAI call
 @app.route('/api/openai-call', methods=['POST'])
 @login_required
+@openai_call_rate_limit
 def openai_call():
     """
     Backend API route for making OpenAI API calls
@@ -290,8 +1161,8 @@ def openai_call():
         }), 500
     
     try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
+        response = create_chat_completion(
+            'openai_call',
             model="gpt-4",
             messages=[
                 {"role": "user", "content": prompt}
@@ -302,6 +1173,19 @@ def openai_call():
             "success": True,
             "output": response.choices[0].message.content
         })
+    except CircuitOpenError as e:
+        response = jsonify({
+            "success": False,
+            "error": "The OpenAI API is temporarily unavailable. Please try again shortly."
+        })
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response, 503
+    except DeadlineExceededError:
+        app.logger.error('OpenAI deadline exceeded in openai_call', exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": "The OpenAI API took too long to respond. Please try again later."
+        }), 504
     except openai.AuthenticationError:
         app.logger.error('OpenAI authentication error in openai_call', exc_info=True)
         return jsonify({
@@ -328,42 +1212,77 @@ def openai_call():
         }), 500
 
 
+def send_page(filename):
+    """Serve an HTML page from static/ with content-hashed asset URLs and an ETag"""
+    body, etag = static_assets.render_page(filename)
+    if is_not_modified(request, etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_REVALIDATE
+    return response
+
+
 @app.route('/')
 def index():
     """Serve the main HTML page"""
     if current_user.is_authenticated:
-        return send_from_directory('static', 'dashboard.html')
-    return send_from_directory('static', 'login.html')
+        return send_page('dashboard.html')
+    return send_page('login.html')
 
 
 @app.route('/login')
 def login_page():
     """Serve the login page"""
-    return send_from_directory('static', 'login.html')
+    return send_page('login.html')
 
 
 @app.route('/register')
 def register_page():
     """Serve the registration page"""
-    return send_from_directory('static', 'register.html')
+    return send_page('register.html')
 
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
     """Serve the user dashboard"""
-    return send_from_directory('static', 'dashboard.html')
+    return send_page('dashboard.html')
 
 
 @app.route('/analyzer')
 @login_required
 def analyzer():
     """Serve the chart analyzer page"""
-    return send_from_directory('static', 'analyzer.html')
+    return send_page('analyzer.html')
+
+
+def password_hasher_busy_response():
+    response = jsonify({
+        'success': False,
+        'error': 'The server is busy. Please try again in a moment.'
+    })
+    response.headers['Retry-After'] = str(app.config['PASSWORD_HASH_RETRY_AFTER'])
+    return response, 503
+
+
+def schedule_password_rehash(user_id, old_hash, password):
+    """Re-hash a password with the current parameters after the login response has gone out"""
+    def store(new_hash):
+        with app.app_context():
+            # Skip the update if the password was changed in the meantime
+            db.session.execute(
+                db.update(User).where(User.id == user_id, User.password_hash == old_hash).values(password_hash=new_hash)
+            )
+            db.session.commit()
+    
+    return password_hasher.rehash_in_background(password, store)
 
 
 # Authentication API endpoints
 @app.route('/api/register', methods=['POST'])
+@register_rate_limit
 def register():
     """Register a new user"""
     data = request.get_json()
@@ -388,7 +1307,10 @@ def register():
         email=data['email'],
         full_name=data['full_name']
     )
-    user.set_password(data['password'])
+    try:
+        user.set_password(data['password'])
+    except PasswordHasherBusyError:
+        return password_hasher_busy_response()
     
     try:
         db.session.add(user)
@@ -412,6 +1334,7 @@ def register():
 
 
 @app.route('/api/login', methods=['POST'])
+@login_rate_limit
 def login():
     """Login user"""
     data = request.get_json()
@@ -426,9 +1349,17 @@ def login():
     ).first()
     
     # Check password
-    if not user or not user.check_password(data['password']):
+    try:
+        password_ok = user is not None and user.check_password(data['password'])
+    except PasswordHasherBusyError:
+        return password_hasher_busy_response()
+    if not password_ok:
         return jsonify({'success': False, 'error': 'Invalid username or password'}), 401
     
+    # Upgrade hashes made with older parameters while we have the plain password
+    if app.config['PASSWORD_REHASH_ENABLED'] and password_hasher.needs_rehash(user.password_hash):
+        schedule_password_rehash(user.id, user.password_hash, data['password'])
+    
     # Log the user in
     login_user(user, remember=data.get('remember', False))
     
@@ -454,8 +1385,10 @@ def logout():
 
 @app.route('/api/user', methods=['GET'])
 @login_required
+@read_replica
 def get_user():
     """Get current user information"""
+    analyses_today = current_user.get_today_analysis_count()
     return jsonify({
         'success': True,
         'user': {
@@ -464,15 +1397,16 @@ def get_user():
             'email': current_user.email,
             'full_name': current_user.full_name,
             'is_premium': current_user.is_premium,
-            'analyses_today': current_user.get_today_analysis_count(),
+            'analyses_today': analyses_today,
             'daily_limit': FREE_USER_DAILY_LIMIT if not current_user.is_premium else 'Unlimited',
-            'can_analyze': current_user.can_analyze()
+            'can_analyze': current_user.can_analyze(analyses_today)
         }
     }), 200
 
 
 @app.route('/api/analyze', methods=['POST'])
 @login_required
+@analysis_rate_limit
 def analyze_chart():
     """
     Endpoint to analyze uploaded chart image
@@ -480,169 +1414,913 @@ def analyze_chart():
     Returns: JSON with analysis results
     """
     # Check if user can analyze (daily limit)
-    if not current_user.can_analyze():
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_check'}):
+        can_analyze = current_user.can_analyze()
+    if not can_analyze:
+        return daily_limit_response()
+    
+    image_bytes, error_response = read_chart_upload()
+    if error_response is not None:
+        return error_response
+    
+    # Get optional parameters
+    trading_style = request.form.get('trading_style', 'Day Trade')
+    risk_profile = request.form.get('risk_profile', 'Balanced')
+    asset_type = request.form.get('asset_type', 'Crypto')
+    
+    # Take one of today's slots atomically so concurrent uploads cannot exceed the limit
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_reserve'}):
+        usage_day = current_user.reserve_analysis()
+    if usage_day is None:
+        return daily_limit_response()
+    
+    # Release the buffer on the way out so the request stream can be closed
+    with image_bytes:
+        # Opt-in async mode: queue the analysis and return a job id right away
+        if app.config['ASYNC_ANALYSIS_ENABLED'] and request.values.get('async', '').lower() in ('true', '1', 'yes'):
+            return submit_analysis_job(image_bytes, trading_style, risk_profile, asset_type, usage_day)
+        
+        try:
+            # Analyze the chart straight from the upload buffer
+            result = analyze_chart_with_ai(image_bytes, trading_style, risk_profile, asset_type)
+            
+            if result['success']:
+                trade_analysis = save_trade_analysis(current_user.id, result['analysis'], trading_style, risk_profile, asset_type)
+                
+                # Add analysis ID to response
+                result['analysis']['analysis_id'] = trade_analysis.id
+                
+                return jsonify(result), 200
+            else:
+                current_user.release_analysis(usage_day)
+                return analysis_failure_response(result)
+                
+        except Exception as e:
+            db.session.rollback()
+            current_user.release_analysis(usage_day)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/analyze/stream', methods=['POST'])
+@login_required
+@analysis_rate_limit
+def analyze_chart_stream():
+    """
+    Streaming variant of /api/analyze
+    Expects: the same multipart/form-data as /api/analyze
+    Returns: text/event-stream with 'delta' events carrying the model output as it is
+    generated, then one 'result' event with the saved analysis or the error
+    """
+    if not app.config['ANALYSIS_STREAMING_ENABLED']:
+        return jsonify({'success': False, 'error': 'Streaming analysis is disabled'}), 404
+    
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_check'}):
+        can_analyze = current_user.can_analyze()
+    if not can_analyze:
+        return daily_limit_response()
+    
+    image_bytes, error_response = read_chart_upload()
+    if error_response is not None:
+        return error_response
+    
+    trading_style = request.form.get('trading_style', 'Day Trade')
+    risk_profile = request.form.get('risk_profile', 'Balanced')
+    asset_type = request.form.get('asset_type', 'Crypto')
+    
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_reserve'}):
+        usage_day = current_user.reserve_analysis()
+    if usage_day is None:
+        return daily_limit_response()
+    
+    user_id = current_user.id
+    saved = False
+    released = False
+    
+    def generate():
+        nonlocal saved
+        try:
+            # Sent straight away so the browser knows the upload was accepted
+            yield sse_event('status', {'stage': 'analyzing'})
+            for event, data in stream_chart_analysis(image_bytes, trading_style, risk_profile, asset_type):
+                if event == 'delta':
+                    yield sse_event('delta', {'text': data})
+                    continue
+                if data['success']:
+                    trade_analysis = save_trade_analysis(user_id, data['analysis'], trading_style, risk_profile, asset_type)
+                    data['analysis']['analysis_id'] = trade_analysis.id
+                    saved = True
+                yield sse_event('result', data)
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('result', {'success': False, 'error': str(e)})
+    
+    def release():
+        # Runs when the response is closed, even if the client left before the stream started
+        nonlocal released
+        if released:
+            return
+        released = True
+        image_bytes.release()
+        # Failed or abandoned streams do not use up a slot
+        if not saved:
+            with app.app_context():
+                DailyUsage.decrement(user_id, usage_day)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/analyze/batch', methods=['POST'])
+@login_required
+@analysis_rate_limit
+def analyze_chart_batch():
+    """
+    Analyze several uploaded charts in one request
+    Expects: multipart/form-data with up to BATCH_MAX_FILES 'chart' files and the same
+    optional parameters as /api/analyze, applied to every chart
+    Returns: JSON with one result per file, in upload order; some may fail while others succeed
+    """
+    files = request.files.getlist('chart')
+    if not files:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    if len(files) > app.config['BATCH_MAX_FILES']:
         return jsonify({
             'success': False,
-            'error': f'Daily analysis limit reached ({FREE_USER_DAILY_LIMIT} analyses per day for free users). Upgrade to premium for unlimited access.'
-        }), 429
+            'error': f"Too many files. A batch can contain at most {app.config['BATCH_MAX_FILES']} charts"
+        }), 400
     
-    # Check if file is present
-    if 'chart' not in request.files:
-        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    trading_style = request.form.get('trading_style', 'Day Trade')
+    risk_profile = request.form.get('risk_profile', 'Balanced')
+    asset_type = request.form.get('asset_type', 'Crypto')
     
-    file = request.files['chart']
+    results = [{'index': index, 'filename': file.filename} for index, file in enumerate(files)]
     
-    # Check if file is selected
-    if file.filename == '':
-        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    with ExitStack() as buffers:
+        # Validate every file first so rejected ones never take a quota slot
+        accepted = []
+        for result, file in zip(results, files):
+            error = None
+            if file.filename == '':
+                error = 'No file selected'
+            elif not allowed_file(file.filename):
+                error = f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            else:
+                with metrics.timer('analysis_stage_duration_seconds', {'stage': 'read_upload'}):
+                    image_bytes = buffers.enter_context(read_upload(file))
+                if not image_bytes:
+                    error = 'Uploaded file is empty'
+                elif image_bytes.nbytes > MAX_FILE_SIZE:
+                    error = f'File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB'
+                else:
+                    accepted.append((result, image_bytes))
+            if error:
+                result.update(success=False, status=400, error=error)
+        
+        # Take as many of today's slots as the batch needs (or as remain) in one atomic update
+        with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_reserve'}):
+            usage_day, granted = current_user.reserve_analyses(len(accepted))
+        for result, _ in accepted[granted:]:
+            result.update(success=False, status=429, error='Daily analysis limit reached')
+        accepted = accepted[:granted]
+        
+        if accepted:
+            def analyze(image_bytes):
+                with app.app_context():
+                    try:
+                        return analyze_chart_with_ai(image_bytes, trading_style, risk_profile, asset_type)
+                    except Exception as e:
+                        app.logger.error(f'Batch analysis item failed: {str(e)}', exc_info=True)
+                        return {'success': False, 'error': str(e)}
+            
+            workers = max(1, min(app.config['BATCH_CONCURRENCY'], len(accepted)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-analysis') as executor:
+                outcomes = list(executor.map(analyze, [image_bytes for _, image_bytes in accepted]))
+        else:
+            outcomes = []
     
-    # Check if file type is allowed
-    if not allowed_file(file.filename):
+    succeeded = []
+    for (result, _), outcome in zip(accepted, outcomes):
+        if outcome.get('success'):
+            succeeded.append((result, outcome))
+        else:
+            result.update(success=False, status=503 if 'retry_after' in outcome else 500,
+                          error=outcome.get('error', 'Analysis failed'))
+            if 'retry_after' in outcome:
+                result['retry_after'] = outcome['retry_after']
+    
+    if succeeded:
+        try:
+            trade_analyses = save_trade_analyses(current_user.id, [
+                (outcome['analysis'], trading_style, risk_profile, asset_type) for _, outcome in succeeded
+            ])
+            for (result, outcome), trade_analysis in zip(succeeded, trade_analyses):
+                outcome['analysis']['analysis_id'] = trade_analysis.id
+                result.update(success=True, status=200, analysis=outcome['analysis'], cached=outcome.get('cached', False))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Saving batch analyses failed: {str(e)}', exc_info=True)
+            for result, _ in succeeded:
+                result.update(success=False, status=500, error='Failed to save analysis')
+            succeeded = []
+    
+    # Slots taken for analyses that did not make it to the database are given back
+    released = len(accepted) - len(succeeded)
+    if released:
+        current_user.release_analysis(usage_day, released)
+    
+    failed = len(results) - len(succeeded)
+    if succeeded:
+        status = 200
+    elif any(result['status'] == 429 for result in results):
+        status = 429
+    elif all(result['status'] == 400 for result in results):
+        status = 400
+    elif any(result['status'] == 503 for result in results):
+        status = 503
+    else:
+        status = 500
+    
+    return jsonify({
+        'success': bool(succeeded),
+        'succeeded': len(succeeded),
+        'failed': failed,
+        'results': results
+    }), status
+
+
+@app.route('/api/analyze/timeframes', methods=['POST'])
+@login_required
+@analysis_rate_limit
+def analyze_timeframes():
+    """
+    Analyze charts of one instrument on several timeframes in a single model call
+    Expects: multipart/form-data with 2 to MULTI_TIMEFRAME_MAX_CHARTS 'chart' files, a
+    'timeframe' value per chart in the same order (e.g. 5m, 1h, 4h) and the optional
+    parameters of /api/analyze
+    Returns: JSON with one confluent analysis and its per-timeframe results; uses one daily slot
+    """
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_check'}):
+        can_analyze = current_user.can_analyze()
+    if not can_analyze:
+        return daily_limit_response()
+    
+    files = request.files.getlist('chart')
+    labels = request.form.getlist('timeframe')
+    max_charts = app.config['MULTI_TIMEFRAME_MAX_CHARTS']
+    if not 2 <= len(files) <= max_charts:
         return jsonify({
             'success': False,
-            'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            'error': f'Upload between 2 and {max_charts} charts, one per timeframe'
         }), 400
+    if len(labels) != len(files):
+        return jsonify({'success': False, 'error': 'Provide one timeframe for each chart'}), 400
+    try:
+        order, timeframes = order_timeframes(labels)
+    except InvalidTimeframeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    for file in files:
+        if file.filename == '' or not allowed_file(file.filename):
+            return jsonify({
+                'success': False,
+                'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+            }), 400
     
-    # Get optional parameters
     trading_style = request.form.get('trading_style', 'Day Trade')
     risk_profile = request.form.get('risk_profile', 'Balanced')
     asset_type = request.form.get('asset_type', 'Crypto')
     
-    try:
-        # Save the uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+    with ExitStack() as buffers:
+        with metrics.timer('analysis_stage_duration_seconds', {'stage': 'read_upload'}):
+            charts = [buffers.enter_context(read_upload(files[index])) for index in order]
+        if not all(charts):
+            return jsonify({'success': False, 'error': 'Uploaded file is empty'}), 400
+        if any(chart.nbytes > MAX_FILE_SIZE for chart in charts):
+            return jsonify({
+                'success': False,
+                'error': f'File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB'
+            }), 400
         
-        # Analyze the chart
-        result = analyze_chart_with_ai(filepath, trading_style, risk_profile, asset_type)
+        with metrics.timer('analysis_stage_duration_seconds', {'stage': 'quota_reserve'}):
+            usage_day = current_user.reserve_analysis()
+        if usage_day is None:
+            return daily_limit_response()
         
-        # Clean up uploaded file
         try:
-            os.remove(filepath)
-        except:
-            pass
-        
-        if result['success']:
-            analysis = result['analysis']
-            
-            # Safely extract trade_setup with null checks
-            trade_setup = analysis.get('trade_setup') or {}
+            result = analyze_chart_with_ai(charts, trading_style, risk_profile, asset_type, timeframes=timeframes)
             
-            # Save analysis to database
-            trade_analysis = TradeAnalysis(
-                user_id=current_user.id,
-                market_type=analysis.get('market_type'),
-                trading_style=trading_style,
-                risk_profile=risk_profile,
-                asset_type=asset_type,
-                patterns=json.dumps(analysis.get('patterns', [])),
-                indicators=json.dumps(analysis.get('indicators', [])),
-                trade_direction=trade_setup.get('direction'),
-                entry_price=trade_setup.get('entry'),
-                stop_loss=trade_setup.get('stop_loss'),
-                take_profit=json.dumps(trade_setup.get('take_profit', [])),
-                pattern_explanation=analysis.get('pattern_explanation'),
-                reasoning=analysis.get('reasoning'),
-                confidence_score=analysis.get('confidence_score'),
-                risk_factors=json.dumps(analysis.get('risk_factors', [])),
-                outcome='pending'
+            if result['success']:
+                trade_analysis = save_trade_analysis(current_user.id, result['analysis'], trading_style, risk_profile, asset_type)
+                result['analysis']['analysis_id'] = trade_analysis.id
+                return jsonify(result), 200
+            else:
+                current_user.release_analysis(usage_day)
+                return analysis_failure_response(result)
+        
+        except Exception as e:
+            db.session.rollback()
+            current_user.release_analysis(usage_day)
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def read_chart_upload():
+    """
+    Validate the 'chart' file of an upload and read it
+    Returns (image_bytes, None), or (None, error response) for a missing, empty or disallowed file
+    """
+    # Check if file is present
+    if 'chart' not in request.files:
+        return None, (jsonify({'success': False, 'error': 'No file uploaded'}), 400)
+    
+    file = request.files['chart']
+    
+    # Check if file is selected
+    if file.filename == '':
+        return None, (jsonify({'success': False, 'error': 'No file selected'}), 400)
+    
+    # Check if file type is allowed
+    if not allowed_file(file.filename):
+        return None, (jsonify({
+            'success': False,
+            'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+        }), 400)
+    
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'read_upload'}):
+        image_bytes = read_upload(file)
+    if not image_bytes:
+        return None, (jsonify({'success': False, 'error': 'Uploaded file is empty'}), 400)
+    return image_bytes, None
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def daily_limit_response():
+    return jsonify({
+        'success': False,
+        'error': f'Daily analysis limit reached ({FREE_USER_DAILY_LIMIT} analyses per day for free users). Upgrade to premium for unlimited access.'
+    }), 429
+
+
+def save_trade_analysis(user_id, analysis, trading_style, risk_profile, asset_type):
+    """Persist an AI analysis result as a TradeAnalysis row"""
+    return save_trade_analyses(user_id, [(analysis, trading_style, risk_profile, asset_type)])[0]
+
+
+def build_trade_analysis(user_id, analysis, trading_style, risk_profile, asset_type):
+    # Safely extract trade_setup with null checks
+    trade_setup = analysis.get('trade_setup') or {}
+    
+    return TradeAnalysis(
+        user_id=user_id,
+        market_type=analysis.get('market_type'),
+        trading_style=trading_style,
+        risk_profile=risk_profile,
+        asset_type=asset_type,
+        patterns=analysis.get('patterns', []),
+        indicators=analysis.get('indicators', []),
+        trade_direction=trade_setup.get('direction'),
+        entry_price=trade_setup.get('entry'),
+        stop_loss=trade_setup.get('stop_loss'),
+        take_profit=trade_setup.get('take_profit', []),
+        pattern_explanation=analysis.get('pattern_explanation'),
+        reasoning=analysis.get('reasoning'),
+        confidence_score=analysis.get('confidence_score'),
+        risk_factors=analysis.get('risk_factors', []),
+        outcome='pending'
+    )
+
+
+def build_timeframe_results(analysis_id, analysis):
+    """AnalysisTimeframe rows for the per-timeframe results of a multi-timeframe analysis"""
+    results = analysis.get('timeframes')
+    if not isinstance(results, list):
+        return []
+    return [
+        AnalysisTimeframe(
+            analysis_id=analysis_id,
+            position=position,
+            timeframe=result.get('timeframe'),
+            trend=result.get('trend'),
+            direction=result.get('direction'),
+            patterns=result.get('patterns', []),
+            indicators=result.get('indicators', []),
+            confidence_score=result.get('confidence_score'),
+            summary=result.get('summary')
+        )
+        for position, result in enumerate(results)
+        if isinstance(result, dict) and result.get('timeframe')
+    ]
+
+
+def save_trade_analyses(user_id, items):
+    """
+    Persist several (analysis, trading_style, risk_profile, asset_type) results in one transaction
+    Returns the TradeAnalysis rows in the same order
+    """
+    trade_analyses = [build_trade_analysis(user_id, *item) for item in items]
+    
+    with metrics.timer('analysis_stage_duration_seconds', {'stage': 'db_commit'}):
+        db.session.add_all(trade_analyses)
+        db.session.flush()
+        for (analysis, *_), trade_analysis in zip(items, trade_analyses):
+            db.session.add_all(
+                AnalysisPattern(analysis_id=trade_analysis.id, user_id=user_id, tag=tag)
+                for tag in pattern_tags(trade_analysis.patterns)
             )
-            
-            db.session.add(trade_analysis)
-            db.session.commit()
-            
-            # Add analysis ID to response
-            result['analysis']['analysis_id'] = trade_analysis.id
-            
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+            db.session.add_all(build_timeframe_results(trade_analysis.id, analysis))
+            UserStatsRollup.apply(trade_analysis, 1)
+        bump_analyses_version(user_id)
+        db.session.commit()
+    return trade_analyses
+
+
+def run_analysis_job(job):
+    """Job queue handler: analyze the uploaded chart and persist the result"""
+    payload = job.payload
+    with app.app_context():
+        try:
+            result = analyze_chart_with_ai(
+                payload['image_bytes'],
+                payload['trading_style'],
+                payload['risk_profile'],
+                payload['asset_type']
+            )
+            if result['success']:
+                trade_analysis = save_trade_analysis(
+                    job.user_id,
+                    result['analysis'],
+                    payload['trading_style'],
+                    payload['risk_profile'],
+                    payload['asset_type']
+                )
+                result['analysis']['analysis_id'] = trade_analysis.id
+            else:
+                DailyUsage.decrement(job.user_id, payload['usage_day'])
+            return result
+        except Exception:
+            db.session.rollback()
+            DailyUsage.decrement(job.user_id, payload['usage_day'])
+            raise
+
+
+analysis_jobs = create_job_queue(
+    run_analysis_job,
+    workers=app.config['ANALYSIS_JOB_WORKERS'],
+    max_queue=app.config['ANALYSIS_JOB_QUEUE_SIZE'],
+    result_ttl=app.config['ANALYSIS_JOB_RESULT_TTL']
+)
+
+
+def submit_analysis_job(image_bytes, trading_style, risk_profile, asset_type, usage_day):
+    """Queue an uploaded chart for the worker pool"""
+    try:
+        # Copy out of the request buffer, which is released when the request ends
+        job = analysis_jobs.submit(current_user.id, {
+            'image_bytes': bytes(image_bytes),
+            'trading_style': trading_style,
+            'risk_profile': risk_profile,
+            'asset_type': asset_type,
+            'usage_day': usage_day
+        })
+    except QueueFullError:
+        current_user.release_analysis(usage_day)
+        response = jsonify({
+            'success': False,
+            'error': 'The analysis queue is full. Please try again in a few moments.'
+        })
+        response.headers['Retry-After'] = str(app.config['ANALYSIS_JOB_RETRY_AFTER'])
+        return response, 503
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('get_analysis_job', job_id=job.id),
+        'events_url': url_for('stream_analysis_job', job_id=job.id)
+    }), 202
+
+
+def get_user_job(job_id):
+    """Look up a job owned by the current user"""
+    job = analysis_jobs.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+
+@app.route('/api/analysis/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_analysis_job(job_id):
+    """Poll the status and result of an async analysis job"""
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()}), 200
+
+
+@app.route('/api/analysis/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def stream_analysis_job(job_id):
+    """Stream status changes of an async analysis job as Server-Sent Events"""
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    keepalive = app.config['ANALYSIS_JOB_SSE_KEEPALIVE']
+    
+    def generate():
+        version = None
+        while True:
+            if version == job.version:
+                # No change within the keepalive window; keep proxies from closing the stream
+                yield ': keepalive\n\n'
+            else:
+                version = job.version
+                yield sse_event('status', job.to_dict())
+                if job.finished:
+                    return
+            job.wait_for_change(version, timeout=keepalive)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, {
+            'method': request.method,
+            'route': route,
+            'status': response.status_code
+        })
+    return response
+
+
+@app.after_request
+def cache_versioned_assets(response):
+    # Only the exact hashed URL is immutable; a stale ?v= falls back to revalidation
+    if request.endpoint == 'static' and response.status_code in (200, 304) and request.args.get('v'):
+        filename = request.view_args.get('filename', '')
+        if request.args['v'] == static_assets.content_hash(filename):
+            response.headers['Cache-Control'] = IMMUTABLE_ASSET
+    return response
+
+
+@app.after_request
+def compress(response):
+    if app.config['COMPRESSION_ENABLED']:
+        compress_response(
+            response,
+            request.accept_encodings,
+            min_size=app.config['COMPRESSION_MIN_SIZE'],
+            gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+            brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY']
+        )
+    return response
+
+
+def collect_component_metrics():
+    """Expose the counters kept by the cache, job queue, OpenAI pool and image pipeline"""
+    if analysis_cache is not None:
+        cache_stats = analysis_cache.stats()
+        for name in ('hits', 'misses', 'evictions'):
+            yield f'analysis_cache_{name}_total', None, cache_stats[name]
+        yield 'analysis_cache_entries', None, cache_stats['size']
+    
+    job_stats = analysis_jobs.stats()
+    yield 'analysis_jobs_pending', None, job_stats['pending']
+    for status, count in job_stats['jobs'].items():
+        yield 'analysis_jobs', {'status': status}, count
+    
+    openai_pool_stats = openai_clients.stats()
+    for name in ('requests', 'connections_opened', 'connections_reused'):
+        yield f'openai_pool_{name}_total', None, openai_pool_stats[name]
+    
+    image_stats = image_pipeline_stats.stats()
+    yield 'image_pipeline_images_total', None, image_stats['images']
+    yield 'image_pipeline_bytes_in_total', None, image_stats['bytes_in']
+    yield 'image_pipeline_bytes_out_total', None, image_stats['bytes_out']
+    
+    user_cache_stats = user_identity_cache.stats()
+    for name in ('hits', 'misses'):
+        yield f'user_cache_{name}_total', None, user_cache_stats[name]
+    
+    fragment_stats = analysis_fragments.stats()
+    yield 'json_fragment_cache_hits_total', None, fragment_stats['hits']
+    yield 'json_fragment_cache_misses_total', None, fragment_stats['misses']
+    
+    circuit_stats = openai_circuit.stats()
+    yield 'openai_circuit_open', None, 1 if circuit_stats['state'] == 'open' else 0
+    for name in ('opened', 'short_circuited'):
+        yield f'openai_circuit_{name}_total', None, circuit_stats[name]
+    
+    for rule, counters in rate_limiter.stats()['rules'].items():
+        for outcome, count in counters.items():
+            yield 'rate_limit_requests_total', {'rule': rule, 'outcome': outcome}, count
+    
+    replica_stats = replica_router.stats()
+    yield 'db_read_requests_total', {'target': 'replica'}, replica_stats['replica_reads']
+    yield 'db_read_requests_total', {'target': 'primary_sticky'}, replica_stats['sticky_reads']
+    
+    for bind, engine in (('primary', db.engine), *((key, db.engines[key]) for key in replica_router.bind_keys)):
+        engine_pool = pool_stats(engine)
+        if 'size' in engine_pool:
+            yield 'db_pool_size', {'bind': bind}, engine_pool['size']
+            for state in ('checked_in', 'checked_out', 'overflow'):
+                yield 'db_pool_connections', {'bind': bind, 'state': state}, engine_pool[state]
+    
+    password_stats = password_hasher.stats()
+    for operation, name in (('hash', 'hashes'), ('verify', 'verifications'), ('rehash', 'rehashes')):
+        yield 'password_hash_operations_total', {'operation': operation}, password_stats[name]
+    yield 'password_hash_rejected_total', None, password_stats['rejected']
+    yield 'password_rehashes_skipped_total', None, password_stats['rehashes_skipped']
+    yield 'password_rehashes_pending', None, password_stats['rehashes_pending']
+    
+    for usage in analysis_prompts.stats()['usage']:
+        labels = {'template': usage['template'], 'version': usage['version']}
+        yield 'prompt_calls_total', labels, usage['calls']
+        for kind in ('prompt_tokens', 'completion_tokens', 'estimated_prompt_tokens'):
+            yield 'prompt_tokens_total', {**labels, 'kind': kind}, usage[kind]
+
+
+metrics.add_collector(collect_component_metrics)
+for counter_name in ('analysis_cache_hits_total', 'analysis_cache_misses_total', 'analysis_cache_evictions_total',
+                     'openai_pool_requests_total', 'openai_pool_connections_opened_total',
+                     'openai_pool_connections_reused_total', 'image_pipeline_images_total',
+                     'image_pipeline_bytes_in_total', 'image_pipeline_bytes_out_total',
+                     'json_fragment_cache_hits_total', 'json_fragment_cache_misses_total',
+                     'prompt_calls_total', 'prompt_tokens_total', 'openai_circuit_opened_total',
+                     'openai_circuit_short_circuited_total', 'rate_limit_requests_total',
+                     'user_cache_hits_total', 'user_cache_misses_total', 'db_read_requests_total',
+                     'password_hash_operations_total', 'password_hash_rejected_total',
+                     'password_rehashes_skipped_total'):
+    metrics.describe(counter_name, 'counter', '')
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint, for scrapers holding METRICS_TOKEN"""
+    token = app.config['METRICS_TOKEN']
+    if not app.config['METRICS_ENABLED'] or not token:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        response = jsonify({'success': False, 'error': 'A valid metrics token is required'})
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness check; component internals are only reported at /api/metrics"""
+    circuit_stats = openai_circuit.stats()
     return jsonify({
-        'status': 'healthy',
-        'service': 'Trading Chart Analyzer'
+        # Still serving (history, cached analyses), but new analyses fail fast until upstream recovers
+        'status': 'degraded' if circuit_stats['state'] == 'open' else 'healthy',
+        'service': 'Trading Chart Analyzer',
+        'openai_circuit': {'state': circuit_stats['state'], 'retry_in': circuit_stats['retry_in']}
     }), 200
 
 
+# Fields a client can ask for with ?fields=, in response order
+ANALYSIS_DETAIL_FIELDS = (
+    'id', 'market_type', 'trading_style', 'risk_profile', 'asset_type', 'patterns', 'indicators',
+    'trade_direction', 'entry_price', 'stop_loss', 'take_profit', 'pattern_explanation', 'reasoning',
+    'confidence_score', 'risk_factors', 'outcome', 'notes', 'created_at'
+)
+# What a dashboard history card shows
+ANALYSIS_HISTORY_FIELDS = (
+    'id', 'market_type', 'trading_style', 'risk_profile', 'asset_type', 'trade_direction',
+    'entry_price', 'stop_loss', 'take_profit', 'confidence_score', 'outcome', 'created_at'
+)
+JSON_LIST_FIELDS = frozenset(('patterns', 'indicators', 'take_profit', 'risk_factors'))
+# Related records the detail endpoint can include alongside the analysis columns
+ANALYSIS_DETAIL_RELATED_FIELDS = ('timeframes',)
+
+
+def load_analysis_fields(fields):
+    """Loader option that selects only the columns behind the requested fields"""
+    # created_at and version key the fragment cache and validators; created_at also builds cursors
+    columns = {getattr(TradeAnalysis, name) for name in (*fields, 'created_at', 'version', 'updated_at')}
+    # raiseload turns an accidental access to an unloaded column into an error instead of a query per row
+    return db.load_only(*columns, raiseload=True)
+
+
+def serialize_analysis(analysis, fields):
+    """Dictionary of the requested fields; JSON columns come back already decoded"""
+    item = {}
+    for field in fields:
+        value = getattr(analysis, field)
+        if field in JSON_LIST_FIELDS:
+            value = value if value is not None else []
+        elif field == 'created_at':
+            value = value.isoformat() if value else None
+        item[field] = value
+    return item
+
+
+def analysis_json(analysis, fields):
+    """Serialized JSON object for an analysis, from the fragment cache when possible"""
+    # version changes on every update, and created_at guards against SQLite reusing a deleted row's id
+    return analysis_fragments.get_or_build(
+        (analysis.id, analysis.created_at, analysis.version, fields),
+        lambda: app.json.dumps_bytes(serialize_analysis(analysis, fields))
+    )
+
+
+def timeframe_results_json(analysis):
+    """Serialized per-timeframe results of an analysis ([] for single-chart analyses)"""
+    # Sub-results never change after they are saved, so id and created_at are enough of a key
+    return analysis_fragments.get_or_build(
+        (analysis.id, analysis.created_at, 'timeframes'),
+        lambda: app.json.dumps_bytes([
+            result.to_dict() for result in AnalysisTimeframe.query
+                .filter_by(analysis_id=analysis.id).order_by(AnalysisTimeframe.position)
+        ])
+    )
+
+
+def conditional_json(etag, build, last_modified=None):
+    """
+    Answer a conditional GET with 304 when the client's copy is current, otherwise
+    build the response and attach the validators
+    """
+    if is_not_modified(request, etag, last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = PRIVATE_REVALIDATE
+    return response
+
+
+def user_analyses_etag(kind):
+    """ETag for a response derived from all of the current user's analyses and the query string"""
+    version = db.session.scalar(db.select(User.analyses_version).where(User.id == current_user.id))
+    return make_etag(kind, current_user.id, version, sorted(request.args.items(multi=True)))
+
+
+def history_filters(args):
+    """Build WHERE clauses from the outcome/asset_type/date_from/date_to query parameters"""
+    filters = [TradeAnalysis.user_id == current_user.id]
+    
+    outcome = args.get('outcome')
+    if outcome and outcome != 'all':
+        if outcome not in ['win', 'loss', 'pending']:
+            raise InvalidFilterError('Invalid outcome. Must be win, loss, or pending')
+        filters.append(TradeAnalysis.outcome == outcome)
+    
+    asset_type = args.get('asset_type')
+    if asset_type:
+        filters.append(TradeAnalysis.asset_type == asset_type)
+    
+    pattern = args.get('pattern')
+    if pattern:
+        tag = normalize_pattern_tag(pattern)
+        if not tag:
+            raise InvalidFilterError('Invalid pattern')
+        filters.append(TradeAnalysis.id.in_(
+            db.select(AnalysisPattern.analysis_id)
+            .where(AnalysisPattern.user_id == current_user.id, AnalysisPattern.tag == tag)
+        ))
+    
+    date_from = parse_date_bound(args.get('date_from'))
+    if date_from:
+        filters.append(TradeAnalysis.created_at >= date_from)
+    
+    date_to = parse_date_bound(args.get('date_to'), end=True)
+    if date_to:
+        filters.append(TradeAnalysis.created_at < date_to)
+    
+    return filters
+
+
 @app.route('/api/history', methods=['GET'])
 @login_required
+@read_replica
 def get_analysis_history():
-    """Get user's analysis history"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    """
+    Get user's analysis history
+    Pass cursor (empty for the first page) for keyset pagination; page keeps the
+    classic numbered pages. Both accept the same filters and page size cap.
+    """
+    per_page = clamp_per_page(request.args.get('per_page', type=int), app.config['HISTORY_MAX_PER_PAGE'])
+    cursor_mode = 'cursor' in request.args
+    # Numbered pages keep reporting the total; cursor pages skip the COUNT unless asked
+    include_total = request.args.get('include_total', 'false' if cursor_mode else 'true').lower() in ('true', '1', 'yes')
     
+    try:
+        filters = history_filters(request.args)
+        fields = parse_fields(request.args.get('fields'), ANALYSIS_DETAIL_FIELDS, ANALYSIS_HISTORY_FIELDS)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (InvalidFilterError, InvalidCursorError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    # Any new or updated analysis changes the ETag, so a repeat poll is a single version lookup
+    etag = user_analyses_etag('history')
+    if cursor_mode:
+        return conditional_json(etag, lambda: get_history_page_after_cursor(filters, fields, cursor, per_page, include_total))
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    return conditional_json(etag, lambda: get_history_page(filters, fields, page, per_page, include_total))
+
+
+def get_history_page(filters, fields, page, per_page, include_total):
+    """Numbered page ordered by (created_at, id) descending"""
     # Get user's analyses with pagination
-    pagination = TradeAnalysis.query.filter_by(user_id=current_user.id)\
-        .order_by(TradeAnalysis.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    analyses = []
-    for analysis in pagination.items:
-        analyses.append({
-            'id': analysis.id,
-            'market_type': analysis.market_type,
-            'trading_style': analysis.trading_style,
-            'risk_profile': analysis.risk_profile,
-            'asset_type': analysis.asset_type,
-            'trade_direction': analysis.trade_direction,
-            'entry_price': analysis.entry_price,
-            'stop_loss': analysis.stop_loss,
-            'take_profit': json.loads(analysis.take_profit) if analysis.take_profit else [],
-            'confidence_score': analysis.confidence_score,
-            'outcome': analysis.outcome,
-            'created_at': analysis.created_at.isoformat()
-        })
+    pagination = TradeAnalysis.query.filter(*filters)\
+        .options(load_analysis_fields(fields))\
+        .order_by(TradeAnalysis.created_at.desc(), TradeAnalysis.id.desc())\
+        .paginate(page=page, per_page=per_page, error_out=False, count=include_total)
     
-    return jsonify({
+    response = {
         'success': True,
-        'analyses': analyses,
-        'total': pagination.total,
         'page': page,
+        'per_page': per_page
+    }
+    if include_total:
+        response['total'] = pagination.total
+        response['pages'] = pagination.pages
+    analyses = json_array([analysis_json(analysis, fields) for analysis in pagination.items])
+    return app.json.raw_response(embed(app.json.dumps_bytes(response), 'analyses', analyses))
+
+
+def get_history_page_after_cursor(filters, fields, cursor, per_page, include_total):
+    """Keyset page ordered by (created_at, id) descending"""
+    query = db.select(TradeAnalysis).options(load_analysis_fields(fields)).where(*filters)
+    
+    if cursor:
+        created_at, analysis_id = cursor
+        query = query.where(db.or_(
+            TradeAnalysis.created_at < created_at,
+            db.and_(TradeAnalysis.created_at == created_at, TradeAnalysis.id < analysis_id)
+        ))
+    
+    # One extra row tells us whether another page exists without a COUNT
+    rows = db.session.scalars(
+        query.order_by(TradeAnalysis.created_at.desc(), TradeAnalysis.id.desc()).limit(per_page + 1)
+    ).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    response = {
+        'success': True,
         'per_page': per_page,
-        'pages': pagination.pages
-    }), 200
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    }
+    if include_total:
+        response['total'] = db.session.scalar(
+            db.select(db.func.count()).select_from(TradeAnalysis).where(*filters)
+        )
+    analyses = json_array([analysis_json(analysis, fields) for analysis in rows])
+    return app.json.raw_response(embed(app.json.dumps_bytes(response), 'analyses', analyses))
 
 
 @app.route('/api/analysis/<int:analysis_id>', methods=['GET'])
 @login_required
+@read_replica
 def get_analysis_detail(analysis_id):
     """Get detailed information about a specific analysis"""
-    analysis = TradeAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+    allowed_fields = ANALYSIS_DETAIL_FIELDS + ANALYSIS_DETAIL_RELATED_FIELDS
+    try:
+        fields = parse_fields(request.args.get('fields'), allowed_fields, allowed_fields)
+    except InvalidFilterError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    columns = tuple(field for field in fields if field not in ANALYSIS_DETAIL_RELATED_FIELDS)
+    
+    analysis = TradeAnalysis.query.options(load_analysis_fields(columns))\
+        .filter_by(id=analysis_id, user_id=current_user.id).first()
     
     if not analysis:
         return jsonify({'success': False, 'error': 'Analysis not found'}), 404
     
-    return jsonify({
-        'success': True,
-        'analysis': {
-            'id': analysis.id,
-            'market_type': analysis.market_type,
-            'trading_style': analysis.trading_style,
-            'risk_profile': analysis.risk_profile,
-            'asset_type': analysis.asset_type,
-            'patterns': json.loads(analysis.patterns) if analysis.patterns else [],
-            'indicators': json.loads(analysis.indicators) if analysis.indicators else [],
-            'trade_direction': analysis.trade_direction,
-            'entry_price': analysis.entry_price,
-            'stop_loss': analysis.stop_loss,
-            'take_profit': json.loads(analysis.take_profit) if analysis.take_profit else [],
-            'pattern_explanation': analysis.pattern_explanation,
-            'reasoning': analysis.reasoning,
-            'confidence_score': analysis.confidence_score,
-            'risk_factors': json.loads(analysis.risk_factors) if analysis.risk_factors else [],
-            'outcome': analysis.outcome,
-            'notes': analysis.notes,
-            'created_at': analysis.created_at.isoformat()
-        }
-    }), 200
+    def build():
+        body = analysis_json(analysis, columns)
+        if 'timeframes' in fields:
+            body = embed(body, 'timeframes', timeframe_results_json(analysis))
+        return app.json.raw_response(embed(app.json.dumps_bytes({'success': True}), 'analysis', body))
+    
+    etag = make_etag('analysis', analysis.id, analysis.created_at, analysis.version, fields)
+    return conditional_json(etag, build, last_modified=analysis.updated_at or analysis.created_at)
 
 
 @app.route('/api/analysis/<int:analysis_id>/outcome', methods=['PUT'])
@@ -661,54 +2339,114 @@ def update_analysis_outcome(analysis_id):
     if outcome not in ['win', 'loss', 'pending']:
         return jsonify({'success': False, 'error': 'Invalid outcome. Must be win, loss, or pending'}), 400
     
-    analysis.outcome = outcome
-    analysis.notes = notes
-    
     try:
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Outcome updated successfully'}), 200
+        for _ in range(OUTCOME_UPDATE_ATTEMPTS):
+            if set_analysis_outcome(analysis, outcome, notes):
+                db.session.commit()
+                return jsonify({'success': True, 'message': 'Outcome updated successfully'}), 200
+            # Another request changed the outcome first; reload and apply ours on top of it
+            db.session.rollback()
+            analysis = TradeAnalysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+            if not analysis:
+                return jsonify({'success': False, 'error': 'Analysis not found'}), 404
+        return jsonify({'success': False, 'error': 'Analysis is being updated, please try again'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+OUTCOME_UPDATE_ATTEMPTS = 3
+
+
+def set_analysis_outcome(analysis, outcome, notes):
+    """
+    Change the outcome only if it is still the one the rollup delta is computed from
+    Returns False, with nothing written, when a concurrent update got there first
+    """
+    previous = analysis.outcome
+    updated = db.session.execute(
+        db.update(TradeAnalysis)
+        .where(TradeAnalysis.id == analysis.id, TradeAnalysis.outcome == previous)
+        .values(outcome=outcome, notes=notes, version=TradeAnalysis.version + 1, updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    if updated != 1:
+        return False
+    if outcome != previous:
+        UserStatsRollup.apply(analysis, -1)
+        UserStatsRollup.apply(analysis, 1, outcome=outcome)
+    bump_analyses_version(analysis.user_id)
+    return True
+
+
+@app.route('/api/patterns', methods=['GET'])
+@login_required
+@read_replica
+def get_pattern_tags():
+    """List the pattern tags found in the user's analyses with how often each appears"""
+    return conditional_json(user_analyses_etag('patterns'), build_pattern_tags_response)
+
+
+def build_pattern_tags_response():
+    rows = db.session.execute(
+        db.select(AnalysisPattern.tag, db.func.count())
+        .where(AnalysisPattern.user_id == current_user.id)
+        .group_by(AnalysisPattern.tag)
+        .order_by(db.func.count().desc(), AnalysisPattern.tag)
+    ).all()
+    
+    return jsonify({
+        'success': True,
+        'patterns': [{'tag': tag, 'count': count} for tag, count in rows]
+    })
+
+
 @app.route('/api/stats', methods=['GET'])
 @login_required
+@read_replica
 def get_user_stats():
     """Get user's trading statistics"""
-    total_analyses = TradeAnalysis.query.filter_by(user_id=current_user.id).count()
-    
-    wins = TradeAnalysis.query.filter_by(user_id=current_user.id, outcome='win').count()
-    losses = TradeAnalysis.query.filter_by(user_id=current_user.id, outcome='loss').count()
-    pending = TradeAnalysis.query.filter_by(user_id=current_user.id, outcome='pending').count()
-    
-    # Calculate win rate
-    win_rate = 0
-    if wins + losses > 0:
-        win_rate = round((wins / (wins + losses)) * 100, 2)
-    
-    # Get average confidence score
-    avg_confidence = db.session.query(db.func.avg(TradeAnalysis.confidence_score))\
-        .filter(TradeAnalysis.user_id == current_user.id).scalar()
-    avg_confidence = round(avg_confidence, 2) if avg_confidence else 0
+    return conditional_json(user_analyses_etag('stats'), build_user_stats_response)
+
+
+def build_user_stats_response():
+    if app.config['STATS_ROLLUP_ENABLED']:
+        query = db.select(
+            UserStatsRollup.asset_type,
+            UserStatsRollup.trading_style,
+            UserStatsRollup.risk_profile,
+            UserStatsRollup.outcome,
+            UserStatsRollup.analysis_count,
+            UserStatsRollup.confidence_sum,
+            UserStatsRollup.confidence_count
+        ).where(UserStatsRollup.user_id == current_user.id)
+    else:
+        # One grouped aggregate instead of a query per figure
+        query = db.select(
+            TradeAnalysis.asset_type,
+            TradeAnalysis.trading_style,
+            TradeAnalysis.risk_profile,
+            TradeAnalysis.outcome,
+            db.func.count(TradeAnalysis.id),
+            db.func.sum(TradeAnalysis.confidence_score),
+            db.func.count(TradeAnalysis.confidence_score)
+        ).where(TradeAnalysis.user_id == current_user.id).group_by(
+            TradeAnalysis.asset_type,
+            TradeAnalysis.trading_style,
+            TradeAnalysis.risk_profile,
+            TradeAnalysis.outcome
+        )
     
     return jsonify({
         'success': True,
-        'stats': {
-            'total_analyses': total_analyses,
-            'wins': wins,
-            'losses': losses,
-            'pending': pending,
-            'win_rate': win_rate,
-            'avg_confidence': avg_confidence
-        }
-    }), 200
+        'stats': summarize_stats(db.session.execute(query).all())
+    })
 
 
 if __name__ == '__main__':
     # Initialize database
     with app.app_context():
-        db.create_all()
+        init_db()
         print("Database initialized successfully")
     
     # Check if API key is set
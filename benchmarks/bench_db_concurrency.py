@@ -0,0 +1,160 @@
+"""
+Concurrency load test for the database engine settings
+Runs simultaneous analysis inserts (the save path of /api/analyze) and /api/history reads
+against a scratch SQLite database and reports throughput, latency and "database is locked"
+errors. Each configuration runs in its own process so the engine is built from its settings.
+
+Usage: python benchmarks/bench_db_concurrency.py [--writers 8] [--readers 8] [--seconds 5]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONFIGURATIONS = {
+    'rollback_journal': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '0',
+                         'SQLITE_MMAP_SIZE': '0'},
+    'wal_default': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL', 'SQLITE_BUSY_TIMEOUT': '5000',
+                    'SQLITE_MMAP_SIZE': str(256 * 1024 * 1024)}
+}
+
+ANALYSIS = {
+    'market_type': 'Crypto',
+    'patterns': ['Bull Flag', 'Ascending Triangle'],
+    'indicators': ['RSI', 'MACD'],
+    'trade_setup': {'direction': 'Long', 'entry': '42150', 'stop_loss': '41800', 'take_profit': ['42600', '43100']},
+    'pattern_explanation': 'Price compressed into an ascending triangle. ' * 10,
+    'reasoning': 'Momentum and volume confirm the breakout. ' * 10,
+    'confidence_score': 70,
+    'risk_factors': ['Low liquidity']
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else None
+
+
+def run_worker(args):
+    """Run one configuration in this process (engine settings come from the environment)"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from sqlalchemy.exc import OperationalError
+    from app import app, db, init_db, User, rate_limiter, save_trade_analysis
+
+    rate_limiter.enabled = False
+    with app.app_context():
+        init_db()
+        for i in range(args.writers):
+            user = User(username=f'bench{i}', email=f'bench{i}@example.com', full_name='Bench User')
+            user.set_password('benchpass')
+            db.session.add(user)
+        db.session.commit()
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+
+    write_times, read_times = [], []
+    errors = {'locked': 0, 'other': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def record(bucket, seconds):
+        with lock:
+            bucket.append(seconds * 1000)
+
+    def record_error(error):
+        with lock:
+            errors['locked' if 'locked' in str(error) else 'other'] += 1
+
+    def writer(user_id):
+        with app.app_context():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    save_trade_analysis(user_id, dict(ANALYSIS), 'Day Trade', 'Balanced', 'Crypto')
+                    record(write_times, time.perf_counter() - started)
+                except OperationalError as e:
+                    db.session.rollback()
+                    record_error(e)
+
+    def reader(index):
+        with app.test_client() as client:
+            client.post('/api/login', json={'username': f'bench{index % args.writers}', 'password': 'benchpass'})
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = client.get('/api/history?per_page=20')
+                if response.status_code == 200:
+                    record(read_times, time.perf_counter() - started)
+                else:
+                    record_error(response.get_data(as_text=True))
+
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        'writes_per_second': round(len(write_times) / args.seconds, 1),
+        'reads_per_second': round(len(read_times) / args.seconds, 1),
+        'write_p50_ms': round(statistics.median(write_times), 1) if write_times else None,
+        'write_p95_ms': round(percentile(write_times, 95), 1) if write_times else None,
+        'read_p95_ms': round(percentile(read_times, 95), 1) if read_times else None,
+        'locked_errors': errors['locked'],
+        'other_errors': errors['other']
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--config', choices=sorted(CONFIGURATIONS), action='append',
+                        help='configuration(s) to run (default: all)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {}
+    for name in args.config or CONFIGURATIONS:
+        tmpdir = tempfile.mkdtemp(prefix='bench_db_')
+        try:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}", **CONFIGURATIONS[name])
+            print(f"Running {name}...", file=sys.stderr)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', '--writers', str(args.writers),
+                 '--readers', str(args.readers), '--seconds', str(args.seconds)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{args.writers} writers + {args.readers} history readers for {args.seconds:g}s")
+    print(f"  {'configuration':<20}{'writes/s':>10}{'reads/s':>10}{'write p95':>12}{'read p95':>11}{'locked':>8}")
+    for name, result in results.items():
+        write_p95 = f"{result['write_p95_ms']:.1f}ms" if result['write_p95_ms'] is not None else '-'
+        read_p95 = f"{result['read_p95_ms']:.1f}ms" if result['read_p95_ms'] is not None else '-'
+        print(f"  {name:<20}{result['writes_per_second']:>10.1f}{result['reads_per_second']:>10.1f}"
+              f"{write_p95:>12}{read_p95:>11}{result['locked_errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
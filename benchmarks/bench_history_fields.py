@@ -0,0 +1,132 @@
+"""
+Benchmark for lean history loading and sparse fieldsets
+Seeds one user with many full-size analyses, then measures latency and peak Python
+memory per /api/history page when loading every column, the default card fields,
+and a minimal fields= list
+
+Usage: python benchmarks/bench_history_fields.py [--rows 10000] [--per-page 50]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix='bench_history_')
+atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, init_db, User, TradeAnalysis, ANALYSIS_DETAIL_FIELDS  # noqa: E402
+
+VARIANTS = {
+    'all_columns': ','.join(ANALYSIS_DETAIL_FIELDS),
+    'default_fields': None,
+    'minimal_fields': 'outcome,confidence_score,created_at'
+}
+
+
+def seed(rows, batch_size=2000):
+    """One user with analyses carrying realistic amounts of model text"""
+    user = User(username='bench', email='bench@example.com', full_name='Bench User')
+    user.set_password('benchpass')
+    db.session.add(user)
+    db.session.commit()
+
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for n in range(rows):
+        batch.append({
+            'user_id': user.id,
+            'market_type': 'Crypto',
+            'trading_style': 'Day Trade',
+            'risk_profile': 'Balanced',
+            'asset_type': 'Crypto',
+            'patterns': ['Ascending Triangle', 'Bull Flag', 'Double Bottom'],
+            'indicators': ['RSI divergence', 'MACD cross', 'Volume spike'],
+            'trade_direction': random.choice(('Long', 'Short')),
+            'entry_price': '42150.00',
+            'stop_loss': '41800.00',
+            'take_profit': ['42600.00', '43100.00'],
+            'pattern_explanation': 'Price compressed into an ascending triangle. ' * 30,
+            'reasoning': 'Momentum and volume confirm the breakout above resistance. ' * 40,
+            'confidence_score': random.randint(10, 95),
+            'risk_factors': ['Low liquidity during the session open'] * 5,
+            'outcome': random.choice(('win', 'loss', 'pending')),
+            'created_at': start + timedelta(seconds=n * 365 * 86400 // rows)
+        })
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(TradeAnalysis), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TradeAnalysis), batch)
+    db.session.commit()
+
+
+def measure(client, fields, per_page, pages):
+    """Walk the first pages with cursors, timing each request and tracking peak allocation"""
+    samples = []
+    peaks = []
+    cursor = ''
+    for _ in range(pages):
+        url = f'/api/history?per_page={per_page}&cursor={cursor}'
+        if fields:
+            url += f'&fields={fields}'
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        data = response.get_json()
+        cursor = data['next_cursor'] or ''
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(statistics.quantiles(samples, n=20)[-1], 3),
+        'peak_kib': round(statistics.median(peaks) / 1024, 1),
+        'response_kib': round(len(response.get_data()) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    with app.app_context():
+        init_db()
+        print(f"Seeding {args.rows} analyses...", file=sys.stderr)
+        seed(args.rows)
+
+    results = {}
+    with app.test_client() as client:
+        client.post('/api/login', json={'username': 'bench', 'password': 'benchpass'})
+        for name, fields in VARIANTS.items():
+            # Warm up statement caches so the first variant is not penalised
+            measure(client, fields, args.per_page, 2)
+            results[name] = measure(client, fields, args.per_page, args.pages)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n/api/history, {args.per_page} rows per page, {args.rows} analyses")
+    for name, result in results.items():
+        print(f"  {name:<16} p50 {result['p50_ms']:>8.3f} ms   p95 {result['p95_ms']:>8.3f} ms"
+              f"   peak {result['peak_kib']:>8.1f} KiB   body {result['response_kib']:>7.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
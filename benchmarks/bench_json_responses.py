@@ -0,0 +1,137 @@
+"""
+Micro-benchmark for JSON response serialization
+Compares requests per second for /api/history and /api/analysis/<id> with the stdlib
+encoder, orjson, orjson plus cached fragments, and all of that with gzip
+
+Usage: python benchmarks/bench_json_responses.py [--rows 2000] [--requests 300]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix='bench_json_')
+atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_provider import orjson  # noqa: E402
+from app import app, db, init_db, User, TradeAnalysis, analysis_fragments  # noqa: E402
+
+CONFIGURATIONS = {
+    'stdlib': {'orjson': False, 'fragments': False, 'gzip': False},
+    'orjson': {'orjson': True, 'fragments': False, 'gzip': False},
+    'orjson+fragments': {'orjson': True, 'fragments': True, 'gzip': False},
+    'orjson+fragments+gzip': {'orjson': True, 'fragments': True, 'gzip': True}
+}
+
+
+def seed(rows, batch_size=2000):
+    """One user with full-size analyses"""
+    user = User(username='bench', email='bench@example.com', full_name='Bench User')
+    user.set_password('benchpass')
+    db.session.add(user)
+    db.session.commit()
+
+    start = datetime.utcnow() - timedelta(days=365)
+    batch = []
+    for n in range(rows):
+        batch.append({
+            'user_id': user.id,
+            'market_type': 'Crypto',
+            'trading_style': 'Day Trade',
+            'risk_profile': 'Balanced',
+            'asset_type': 'Crypto',
+            'patterns': ['Ascending Triangle', 'Bull Flag', 'Double Bottom'],
+            'indicators': ['RSI divergence', 'MACD cross', 'Volume spike'],
+            'trade_direction': random.choice(('Long', 'Short')),
+            'entry_price': '42150.00',
+            'stop_loss': '41800.00',
+            'take_profit': ['42600.00', '43100.00'],
+            'pattern_explanation': 'Price compressed into an ascending triangle. ' * 30,
+            'reasoning': 'Momentum and volume confirm the breakout above resistance. ' * 40,
+            'confidence_score': random.randint(10, 95),
+            'risk_factors': ['Low liquidity during the session open'] * 5,
+            'outcome': random.choice(('win', 'loss', 'pending')),
+            'created_at': start + timedelta(seconds=n * 365 * 86400 // rows)
+        })
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(TradeAnalysis), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TradeAnalysis), batch)
+    db.session.commit()
+    return [row.id for row in TradeAnalysis.query.with_entities(TradeAnalysis.id).limit(200)]
+
+
+def throughput(client, urls, headers):
+    for url in urls[:20]:
+        client.get(url, headers=headers)
+    start = time.perf_counter()
+    size = 0
+    for url in urls:
+        size += len(client.get(url, headers=headers).get_data())
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_second': round(len(urls) / elapsed, 1),
+        'avg_body_kib': round(size / len(urls) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; the orjson rows will use the stdlib encoder", file=sys.stderr)
+
+    with app.app_context():
+        init_db()
+        print(f"Seeding {args.rows} analyses...", file=sys.stderr)
+        analysis_ids = seed(args.rows)
+
+    endpoints = {
+        'history_100': ['/api/history?per_page=100'] * args.requests,
+        'analysis_detail': [f'/api/analysis/{random.choice(analysis_ids)}' for _ in range(args.requests)]
+    }
+    fragment_cache_size = analysis_fragments.max_entries or 4096
+    orjson_available = app.json.use_orjson
+
+    results = {}
+    with app.test_client() as client:
+        client.post('/api/login', json={'username': 'bench', 'password': 'benchpass'})
+        for name, config in CONFIGURATIONS.items():
+            app.json.use_orjson = orjson_available and config['orjson']
+            analysis_fragments.clear()
+            analysis_fragments.max_entries = fragment_cache_size if config['fragments'] else 0
+            headers = {'Accept-Encoding': 'gzip'} if config['gzip'] else {}
+            results[name] = {
+                endpoint: throughput(client, urls, headers) for endpoint, urls in endpoints.items()
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\nRequests per second ({args.requests} requests each, {args.rows} analyses)")
+    print(f"  {'configuration':<24}{'history_100':>14}{'body':>10}{'analysis_detail':>18}{'body':>10}")
+    for name, result in results.items():
+        history = result['history_100']
+        detail = result['analysis_detail']
+        print(f"  {name:<24}{history['requests_per_second']:>14.1f}{history['avg_body_kib']:>8.1f}K"
+              f"{detail['requests_per_second']:>18.1f}{detail['avg_body_kib']:>8.1f}K")
+
+
+if __name__ == '__main__':
+    main()
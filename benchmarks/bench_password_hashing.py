@@ -0,0 +1,141 @@
+"""
+Benchmark for password hashing cost and login bursts
+Times hash parameters on this machine against a target latency, then fires a burst of
+concurrent logins while polling /api/health, with verification inline on the request
+threads and on a bounded worker pool
+
+Usage: python benchmarks/bench_password_hashing.py [--target-ms 250] [--logins 40] [--concurrency 8]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Point the app at a scratch database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix='bench_passwords_')
+atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import patch  # noqa: E402
+
+from passwords import PasswordHasher, below_floor, calibrate  # noqa: E402
+from app import app, db, init_db, User, password_hasher, rate_limiter  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def login_burst(hasher, logins, concurrency):
+    """Concurrent logins plus a health poller; returns latency summaries in milliseconds"""
+    login_times = []
+    health_times = []
+    statuses = []
+    done = threading.Event()
+    lock = threading.Lock()
+    remaining = iter(range(logins))
+
+    def login_worker():
+        with app.test_client() as client:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                started = time.perf_counter()
+                response = client.post('/api/login', json={'username': 'bench', 'password': 'benchpass'})
+                with lock:
+                    login_times.append((time.perf_counter() - started) * 1000)
+                    statuses.append(response.status_code)
+
+    def health_poller():
+        with app.test_client() as client:
+            while not done.is_set():
+                started = time.perf_counter()
+                client.get('/api/health')
+                health_times.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.005)
+
+    with patch('app.password_hasher', hasher), patch.object(rate_limiter, 'enabled', False):
+        poller = threading.Thread(target=health_poller)
+        poller.start()
+        started = time.perf_counter()
+        workers = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        poller.join()
+
+    return {
+        'logins_per_second': round(len(login_times) / elapsed, 1),
+        'login_p50_ms': round(statistics.median(login_times), 1),
+        'login_p95_ms': round(percentile(login_times, 95), 1),
+        'health_p95_ms': round(percentile(health_times, 95), 1) if health_times else None,
+        'rejected': statuses.count(503)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-ms', type=float, default=250)
+    parser.add_argument('--algorithm', choices=('scrypt', 'pbkdf2'), default='scrypt')
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    print(f"Calibrating {args.algorithm} for ~{args.target_ms:g} ms...", file=sys.stderr)
+    candidates, recommended = calibrate(args.target_ms / 1000, args.algorithm)
+
+    with app.app_context():
+        init_db()
+        user = User(username='bench', email='bench@example.com', full_name='Bench User')
+        user.password_hash = PasswordHasher(recommended).hash('benchpass')
+        db.session.add(user)
+        db.session.commit()
+
+    configurations = {
+        'inline': PasswordHasher(recommended, max_pending=args.logins),
+        f'thread_pool_{args.pool_workers}': PasswordHasher(recommended, workers=args.pool_workers,
+                                                           max_pending=args.logins),
+    }
+    results = {name: login_burst(hasher, args.logins, args.concurrency) for name, hasher in configurations.items()}
+
+    if args.json:
+        print(json.dumps({
+            'candidates': [{'method': method, 'ms': round(seconds * 1000, 1)} for method, seconds in candidates],
+            'recommended': recommended,
+            'below_floor': below_floor(candidates, recommended, args.target_ms / 1000),
+            'bursts': results
+        }, indent=2))
+        return
+
+    print("\nHash parameters")
+    for method, seconds in candidates:
+        marker = '  <- recommended' if method == recommended else ''
+        print(f"  {method:<28}{seconds * 1000:>10.1f} ms{marker}")
+    print(f"  (configured: {password_hasher.method})")
+    if below_floor(candidates, recommended, args.target_ms / 1000):
+        print(f"  (the minimum cost is already slower than {args.target_ms:g} ms here)")
+
+    print(f"\nLogin burst ({args.logins} logins, {args.concurrency} concurrent clients)")
+    print(f"  {'configuration':<20}{'logins/s':>10}{'p50':>10}{'p95':>10}{'health p95':>12}{'503s':>6}")
+    for name, result in results.items():
+        print(f"  {name:<20}{result['logins_per_second']:>10.1f}{result['login_p50_ms']:>8.1f}ms"
+              f"{result['login_p95_ms']:>8.1f}ms{result['health_p95_ms']:>10.1f}ms{result['rejected']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark for the composite indexes on trade_analysis
+Seeds a throwaway SQLite database, then compares query plans and latency of the
+history, stats and legacy quota queries with and without the indexes
+
+Usage: python benchmarks/bench_trade_analysis_indexes.py [--users 50] [--rows-per-user 4000]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the app at a scratch database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix='bench_indexes_')
+atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+import migrations  # noqa: E402
+from app import app, db, init_db, User, TradeAnalysis  # noqa: E402
+
+OUTCOMES = ('win', 'loss', 'pending')
+
+
+def seed(users, rows_per_user, batch_size=5000):
+    """Insert users and their analyses in bulk, interleaved like real traffic"""
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password_hash': 'x'}
+        for i in range(1, users + 1)
+    ])
+    start = datetime.utcnow() - timedelta(days=365)
+    total = users * rows_per_user
+    batch = []
+    for n in range(total):
+        batch.append({
+            'user_id': random.randint(1, users),
+            'trading_style': 'Day Trade',
+            'risk_profile': 'Balanced',
+            'asset_type': random.choice(('Crypto', 'Forex', 'Stocks')),
+            'trade_direction': random.choice(('Long', 'Short')),
+            'confidence_score': random.randint(10, 95),
+            'outcome': random.choice(OUTCOMES),
+            'take_profit': [],
+            'created_at': start + timedelta(seconds=n * 365 * 86400 // total)
+        })
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(TradeAnalysis), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TradeAnalysis), batch)
+    db.session.commit()
+
+
+def queries(user_id):
+    today = datetime.utcnow().date()
+    return {
+        'history_page': lambda: TradeAnalysis.query.filter_by(user_id=user_id)
+            .order_by(TradeAnalysis.created_at.desc()).limit(10).all(),
+        'stats_wins': lambda: TradeAnalysis.query.filter_by(user_id=user_id, outcome='win').count(),
+        'stats_total': lambda: TradeAnalysis.query.filter_by(user_id=user_id).count(),
+        'legacy_quota_count': lambda: TradeAnalysis.query.filter(
+            TradeAnalysis.user_id == user_id,
+            db.func.date(TradeAnalysis.created_at) == today
+        ).count()
+    }
+
+
+def explain(user_id):
+    """EXPLAIN QUERY PLAN for the history and stats queries (SQLite only)"""
+    plans = {}
+    statements = {
+        'history_page': 'SELECT id FROM trade_analysis WHERE user_id = :u ORDER BY created_at DESC LIMIT 10',
+        'stats_wins': "SELECT COUNT(*) FROM trade_analysis WHERE user_id = :u AND outcome = 'win'"
+    }
+    for name, sql in statements.items():
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), {'u': user_id}).all()
+        plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def measure(user_ids, repeat):
+    results = {}
+    for name in queries(user_ids[0]):
+        samples = []
+        for _ in range(repeat):
+            for user_id in user_ids:
+                query = queries(user_id)[name]
+                start = time.perf_counter()
+                query()
+                samples.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(statistics.quantiles(samples, n=20)[-1], 3)
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rows-per-user', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    with app.app_context():
+        init_db()
+        print(f"Seeding {args.users * args.rows_per_user} analyses for {args.users} users...", file=sys.stderr)
+        seed(args.users, args.rows_per_user)
+        sample_users = random.sample(range(1, args.users + 1), min(10, args.users))
+
+        with db.engine.begin() as conn:
+            for name, _ in migrations.TRADE_ANALYSIS_INDEXES:
+                conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+            conn.execute(text('ANALYZE'))
+        db.session.remove()
+        before = {'plans': explain(sample_users[0]), 'latency': measure(sample_users, args.repeat)}
+
+        with db.engine.begin() as conn:
+            migrations.add_trade_analysis_indexes(conn)
+            conn.execute(text('ANALYZE'))
+        db.session.remove()
+        after = {'plans': explain(sample_users[0]), 'latency': measure(sample_users, args.repeat)}
+
+    if args.json:
+        print(json.dumps({'before': before, 'after': after}, indent=2))
+        return
+
+    for label, result in (('Without indexes', before), ('With indexes', after)):
+        print(f"\n{label}")
+        for name, plan in result['plans'].items():
+            print(f"  plan {name}: {' | '.join(plan)}")
+        for name, latency in result['latency'].items():
+            print(f"  {name:<20} p50 {latency['p50_ms']:>9.3f} ms   p95 {latency['p95_ms']:>9.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
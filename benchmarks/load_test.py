@@ -0,0 +1,381 @@
+"""
+Load test for the full API
+Seeds a scratch database with users and a large volume of analyses, points the app at a
+local fake OpenAI server with configurable latency, and drives three scenarios from
+concurrent clients:
+
+  dashboard  logged-in users browsing /api/user, /api/stats, /api/history, /api/patterns
+             and /api/analysis/<id>
+  upload     bursts of chart uploads to /api/analyze
+  login      a login storm across many accounts
+
+Reports throughput and p50/p95/p99 latency per scenario and endpoint. With --baseline the
+results are compared against a stored run, and the exit status is 1 on any regression (2,
+without running anything, if the baseline was recorded with different settings).
+
+Usage: python benchmarks/load_test.py [--scenario dashboard] [--clients 8] [--duration 10]
+       python benchmarks/load_test.py --baseline            # compare with load_test_baseline.json
+       python benchmarks/load_test.py --save-baseline       # record a new baseline
+"""
+
+import argparse
+import atexit
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai_server import FakeOpenAIServer  # noqa: E402
+
+SCENARIOS = ('dashboard', 'upload', 'login')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_test_baseline.json')
+PASSWORD = 'benchpass'
+PATTERNS = (['Bull Flag'], ['Head and Shoulders', 'Double Top'], ['Ascending Triangle'], ['Cup and Handle'], [])
+OUTCOMES = ('win', 'loss', 'pending')
+
+
+def start_environment(args):
+    """Start the fake OpenAI server and point the app at it and at a scratch database"""
+    tmpdir = tempfile.mkdtemp(prefix='bench_load_')
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    server = FakeOpenAIServer(latency=args.openai_latency, jitter=args.openai_jitter).start()
+    atexit.register(server.stop)
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+        'OPENAI_API_KEY': 'bench-key',
+        'OPENAI_BASE_URL': server.base_url,
+        # The scenarios measure the app, not the per-user limits
+        'RATE_LIMIT_ENABLED': 'False'
+    })
+    return server
+
+
+def seed(users, analyses_per_user, batch_size=5000):
+    """
+    Create premium users sharing one password and bulk-insert their analyses, then build the
+    pattern tags and stats rollup the app maintains on write
+    Returns {user_id: [analysis ids]} for the dashboard scenario
+    """
+    import migrations
+    from app import db, password_hasher, User, TradeAnalysis
+
+    password_hash = password_hasher.hash(PASSWORD)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com', 'full_name': f'Bench User {i}',
+         'password_hash': password_hash, 'is_premium': True}
+        for i in range(1, users + 1)
+    ])
+    start = datetime.utcnow() - timedelta(days=365)
+    total = users * analyses_per_user
+    batch = []
+    for n in range(total):
+        batch.append({
+            'user_id': n % users + 1,
+            'trading_style': random.choice(('Scalping', 'Day Trade', 'Swing')),
+            'risk_profile': random.choice(('Conservative', 'Balanced', 'Aggressive')),
+            'asset_type': random.choice(('Crypto', 'Forex', 'Stocks')),
+            'market_type': 'Crypto',
+            'patterns': random.choice(PATTERNS),
+            'indicators': ['RSI', 'MACD'],
+            'trade_direction': random.choice(('Long', 'Short')),
+            'entry_price': '100',
+            'stop_loss': '95',
+            'take_profit': ['105', '110'],
+            'pattern_explanation': 'Seeded analysis for load testing. ' * 4,
+            'reasoning': 'Seeded reasoning for load testing. ' * 4,
+            'confidence_score': random.randint(10, 95),
+            'risk_factors': ['Seeded risk'],
+            'outcome': random.choice(OUTCOMES),
+            'created_at': start + timedelta(seconds=n * 365 * 86400 // max(total, 1))
+        })
+        if len(batch) >= batch_size:
+            db.session.execute(db.insert(TradeAnalysis), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TradeAnalysis), batch)
+    db.session.commit()
+
+    with db.engine.begin() as conn:
+        migrations.backfill_pattern_tags(conn)
+        migrations.rebuild_stats_rollup(conn)
+
+    analysis_ids = {}
+    for user_id, analysis_id in db.session.execute(db.select(TradeAnalysis.user_id, TradeAnalysis.id)):
+        analysis_ids.setdefault(user_id, []).append(analysis_id)
+    return analysis_ids
+
+
+def chart_png(rng):
+    """A small candlestick-like PNG; random bars keep every upload distinct for the analysis cache"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (640, 400), 'white')
+    draw = ImageDraw.Draw(image)
+    price = 200
+    for x in range(20, 620, 12):
+        move = rng.randint(-20, 20)
+        top, bottom = sorted((price, price + move))
+        draw.rectangle((x, top, x + 8, bottom + 1), fill='green' if move >= 0 else 'red')
+        price = min(max(price + move, 40), 360)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(samples, elapsed):
+    """samples are (latency ms, status) pairs"""
+    latencies = [latency for latency, _ in samples]
+    errors = sum(1 for _, status in samples if status >= 400)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0
+    }
+    if latencies:
+        summary.update({
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2)
+        })
+    return summary
+
+
+class Recorder:
+    """Thread-safe latency samples keyed by endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def request(self, client, method, url, endpoint, **kwargs):
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        latency = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((latency, response.status_code))
+        return response
+
+    def results(self, elapsed):
+        all_samples = [sample for samples in self.samples.values() for sample in samples]
+        result = summarize(all_samples, elapsed)
+        result['endpoints'] = {endpoint: summarize(samples, elapsed) for endpoint, samples in sorted(self.samples.items())}
+        return result
+
+
+def run_clients(clients, duration, setup, step):
+    """Run step(client, state, rng, recorder) in a loop on each client for duration seconds"""
+    from app import app
+
+    recorder = Recorder()
+    deadline = threading.Event()
+    ready = threading.Barrier(clients + 1)
+
+    def worker(index):
+        rng = random.Random(index)
+        with app.test_client() as client:
+            state = setup(client, index, rng)
+            ready.wait()
+            while not deadline.is_set():
+                step(client, state, rng, recorder)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    time.sleep(duration)
+    deadline.set()
+    for thread in threads:
+        thread.join()
+    # In-flight requests finish after the deadline and count towards the elapsed time
+    return recorder.results(time.perf_counter() - started)
+
+
+def login(client, user_id):
+    response = client.post('/api/login', json={'username': f'bench{user_id}', 'password': PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def dashboard_scenario(args, analysis_ids):
+    def setup(client, index, rng):
+        user_id = index % args.users + 1
+        login(client, user_id)
+        return {'ids': analysis_ids.get(user_id, [0])}
+
+    def step(client, state, rng, recorder):
+        # One dashboard visit: profile and stats, a couple of history pages, then a detail view
+        recorder.request(client, 'GET', '/api/user', 'GET /api/user')
+        recorder.request(client, 'GET', '/api/stats', 'GET /api/stats')
+        recorder.request(client, 'GET', '/api/patterns', 'GET /api/patterns')
+        page = rng.randint(1, 10)
+        recorder.request(client, 'GET', f'/api/history?page={page}&per_page=20', 'GET /api/history')
+        response = recorder.request(client, 'GET', '/api/history?cursor=&per_page=20', 'GET /api/history?cursor')
+        cursor = (response.get_json(silent=True) or {}).get('next_cursor')
+        if cursor:
+            recorder.request(client, 'GET', f'/api/history?cursor={cursor}&per_page=20', 'GET /api/history?cursor')
+        analysis_id = rng.choice(state['ids'])
+        recorder.request(client, 'GET', f'/api/analysis/{analysis_id}', 'GET /api/analysis/<id>')
+
+    return run_clients(args.clients, args.duration, setup, step)
+
+
+def upload_scenario(args, analysis_ids):
+    def setup(client, index, rng):
+        login(client, index % args.users + 1)
+        return {}
+
+    def step(client, state, rng, recorder):
+        data = {
+            'chart': (io.BytesIO(chart_png(rng)), 'chart.png'),
+            'trading_style': 'Day Trade',
+            'risk_profile': 'Balanced',
+            'asset_type': 'Crypto'
+        }
+        recorder.request(client, 'POST', '/api/analyze', 'POST /api/analyze', data=data,
+                         content_type='multipart/form-data')
+
+    return run_clients(args.clients, args.duration, setup, step)
+
+
+def login_scenario(args, analysis_ids):
+    def setup(client, index, rng):
+        return {}
+
+    def step(client, state, rng, recorder):
+        user_id = rng.randint(1, args.users)
+        recorder.request(client, 'POST', '/api/login', 'POST /api/login',
+                         json={'username': f'bench{user_id}', 'password': PASSWORD})
+        client.post('/api/logout')
+
+    return run_clients(args.clients, args.duration, setup, step)
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Regressions of results against baseline: a p95/p99 latency or error rate above, or a
+    throughput below, the baseline by more than tolerance (latency also by min_delta_ms)
+    """
+    regressions = []
+
+    def check(name, current, previous):
+        for key in ('p95_ms', 'p99_ms'):
+            if key in current and key in previous and current[key] > previous[key] * (1 + tolerance) \
+                    and current[key] - previous[key] > min_delta_ms:
+                regressions.append(f'{name} {key}: {previous[key]} -> {current[key]}')
+        if previous.get('throughput_rps') and current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name} throughput_rps: {previous['throughput_rps']} -> {current['throughput_rps']}")
+        if current['error_rate'] > previous.get('error_rate', 0) + 0.01:
+            regressions.append(f"{name} error_rate: {previous.get('error_rate', 0)} -> {current['error_rate']}")
+
+    for scenario, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None:
+            continue
+        check(scenario, current, previous)
+        for endpoint, endpoint_result in current['endpoints'].items():
+            if endpoint in previous.get('endpoints', {}):
+                check(f'{scenario} {endpoint}', endpoint_result, previous['endpoints'][endpoint])
+    return regressions
+
+
+def print_results(results):
+    config = results['config']
+    print(f"\n{config['users']} users x {config['analyses_per_user']} analyses, {config['clients']} clients, "
+          f"{config['duration']:g}s per scenario, OpenAI latency {config['openai_latency'] * 1000:g}"
+          f"+{config['openai_jitter'] * 1000:g}ms")
+    header = f"  {'endpoint':<32}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}"
+    for scenario, result in results['scenarios'].items():
+        print(f"\n{scenario}")
+        print(header)
+        rows = [('(all)', result)] + list(result['endpoints'].items())
+        for name, row in rows:
+            print(f"  {name:<32}{row['throughput_rps']:>9.1f}{row.get('p50_ms', 0):>8.1f}ms"
+                  f"{row.get('p95_ms', 0):>8.1f}ms{row.get('p99_ms', 0):>8.1f}ms{row['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                        help='scenario(s) to run (default: all)')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--analyses-per-user', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario')
+    parser.add_argument('--openai-latency', type=float, default=0.3, help='fake OpenAI response time in seconds')
+    parser.add_argument('--openai-jitter', type=float, default=0.2, help='random extra OpenAI latency in seconds')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='compare against a stored run (default file: benchmarks/load_test_baseline.json)')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative change before a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=5, help='ignore latency changes smaller than this')
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in ('users', 'analyses_per_user', 'clients', 'duration',
+                                                  'openai_latency', 'openai_jitter')}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Numbers from another workload would show up as meaningless regressions
+        if baseline.get('config') != config:
+            differences = ', '.join(f"{key}={baseline.get('config', {}).get(key)!r} (now {value!r})"
+                                    for key, value in config.items() if baseline.get('config', {}).get(key) != value)
+            print(f"Baseline {args.baseline} was recorded with different settings: {differences}. "
+                  f"Rerun with the same settings or record a new baseline with --save-baseline.", file=sys.stderr)
+            sys.exit(2)
+
+    start_environment(args)
+    from app import app, init_db
+
+    with app.app_context():
+        init_db()
+        print(f"Seeding {args.users * args.analyses_per_user} analyses for {args.users} users...", file=sys.stderr)
+        analysis_ids = seed(args.users, args.analyses_per_user)
+
+    runners = {'dashboard': dashboard_scenario, 'upload': upload_scenario, 'login': login_scenario}
+    results = {'config': config, 'scenarios': {}}
+    for scenario in args.scenario or SCENARIOS:
+        print(f"Running {scenario}...", file=sys.stderr)
+        results['scenarios'][scenario] = runners[scenario](args, analysis_ids)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        results['regressions'] = regressions
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+        if args.baseline:
+            print(f"\nCompared with {args.baseline}: " + ('no regressions' if not regressions else 'REGRESSIONS'))
+            for regression in regressions:
+                print(f"  {regression}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Response compression negotiated via Accept-Encoding
+gzip is always available; Brotli is used when the brotli package is installed and the
+client prefers it. Small bodies, streamed responses and file passthroughs are left alone.
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json',
+    'text/plain',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'application/javascript'
+))
+
+
+def available_encodings():
+    """Encodings this server can produce, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_body(body, encoding, gzip_level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=4):
+    """Compress a response in place if it is large enough and the client accepts it"""
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    # The body differs by Accept-Encoding from here on, so caches must key on it
+    response.vary.add('Accept-Encoding')
+    encoding = accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    compressed = compress_body(body, encoding, gzip_level, brotli_quality)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names exact bytes; the compressed body is only semantically equivalent
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
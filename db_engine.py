@@ -0,0 +1,91 @@
+"""
+Database engine settings
+Server databases (PostgreSQL, MySQL) get a sized connection pool with pre-ping and recycling.
+SQLite gets pragmas applied to every new connection: WAL lets dashboard reads run while an
+analysis is being committed, busy_timeout makes a writer wait for the lock instead of failing
+with "database is locked", and synchronous=NORMAL with mmap cuts the cost of each commit and read.
+"""
+
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(url):
+    url = make_url(url)
+    return is_sqlite(url) and (url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL"""
+    if is_memory_sqlite(url):
+        # One shared connection (Flask-SQLAlchemy picks StaticPool); pool sizing does not apply
+        return {}
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout
+    }
+    if not is_sqlite(url):
+        # Drop connections the server or a proxy may have closed while idle
+        options['pool_recycle'] = pool_recycle
+        options['pool_pre_ping'] = pool_pre_ping
+    return options
+
+
+def sqlite_pragmas(journal_mode='WAL', busy_timeout=5000, synchronous='NORMAL', mmap_size=268435456):
+    """Validated PRAGMA statements for new SQLite connections (busy_timeout in milliseconds)"""
+    journal_mode = journal_mode.upper()
+    synchronous = synchronous.upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f'Unknown SQLite journal mode: {journal_mode}')
+    if synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+        raise ValueError(f'Unknown SQLite synchronous level: {synchronous}')
+    return [
+        f'PRAGMA busy_timeout={int(busy_timeout)}',
+        f'PRAGMA journal_mode={journal_mode}',
+        f'PRAGMA synchronous={synchronous}',
+        f'PRAGMA mmap_size={int(mmap_size)}'
+    ]
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run the pragmas on every connection the engine opens; no-op for other databases"""
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return True
+
+
+def pool_stats(engine):
+    """Connection pool occupancy for the health endpoint"""
+    pool = engine.pool
+    stats = {'dialect': engine.dialect.name, 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        })
+    return stats
@@ -0,0 +1,204 @@
+"""
+Local stub of the OpenAI chat completions API for tests and benchmarks
+Serves canned completions over keep-alive HTTP/1.1 with configurable latency and random
+jitter; requests with "stream": true get the content back as chat.completion.chunk Server-Sent Events.
+fail_next() and delay_next() script errors and slow responses for the next requests.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANALYSIS = {
+    'market_type': 'Crypto',
+    'patterns': ['ascending triangle'],
+    'indicators': ['RSI', 'Support Level'],
+    'chart_quality': 'clear',
+    'chart_issues': [],
+    'trade_setup': {
+        'direction': 'Long',
+        'entry': '100',
+        'stop_loss': '95',
+        'take_profit': ['105', '110', '115']
+    },
+    'pattern_explanation': 'Price is coiling under flat resistance with higher lows.',
+    'reasoning': 'Breakout above resistance with rising volume.',
+    'confidence_score': 72,
+    'risk_factors': ['False breakout']
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a slow response (timeouts, hedged calls) have closed the socket
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.fake.record_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        fake.record_request(self.path, body)
+        fault = fake.next_fault()
+
+        if fault and fault.get('delay') is not None:
+            time.sleep(fault['delay'])
+        elif fake.latency or fake.jitter:
+            time.sleep(fake.latency + random.uniform(0, fake.jitter))
+
+        if fault and fault.get('status'):
+            headers = {}
+            if fault.get('retry_after') is not None:
+                headers['Retry-After'] = str(fault['retry_after'])
+            error_type = 'rate_limit_error' if fault['status'] == 429 else 'server_error'
+            self._send_json(fault['status'], {'error': {'message': 'Injected failure', 'type': error_type}}, headers)
+            return
+
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        if body.get('stream'):
+            self._send_stream(fake, body)
+            return
+
+        self._send_json(200, fake.completion(body))
+
+    def _write_chunk(self, data):
+        # Chunked transfer encoding keeps the connection reusable without a Content-Length
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_stream(self, fake, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in fake.completion_chunks(body):
+            self._write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            if fake.chunk_delay:
+                time.sleep(fake.chunk_delay)
+        self._write_chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+class FakeOpenAIServer:
+    """Threaded stub server; use as a context manager and point base_url at it"""
+
+    def __init__(self, content=None, latency=0.0, host='127.0.0.1', port=0, stream_chunks=8, chunk_delay=0.0,
+                 jitter=0.0):
+        self.content = content if content is not None else json.dumps(DEFAULT_ANALYSIS)
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.connections = 0
+        self._faults = deque()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record_request(self, path, body):
+        with self._lock:
+            self.requests.append({'path': path, 'body': body})
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """Answer the next `count` requests with an HTTP error (optionally with Retry-After)"""
+        with self._lock:
+            self._faults.extend({'status': status, 'retry_after': retry_after} for _ in range(count))
+
+    def delay_next(self, seconds, count=1):
+        """Hold the next `count` responses for `seconds` instead of the default latency"""
+        with self._lock:
+            self._faults.extend({'delay': seconds} for _ in range(count))
+
+    def next_fault(self):
+        with self._lock:
+            return self._faults.popleft() if self._faults else None
+
+    def completion(self, body):
+        """Build a chat.completion response carrying the configured content"""
+        return {
+            'id': f'chatcmpl-fake-{len(self.requests)}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 1200, 'completion_tokens': 300, 'total_tokens': 1500}
+        }
+
+    def completion_chunks(self, body):
+        """Split the configured content into chat.completion.chunk payloads"""
+        base = {
+            'id': f'chatcmpl-fake-{len(self.requests)}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o')
+        }
+        size = max(1, -(-len(self.content) // self.stream_chunks))
+        pieces = [self.content[i:i + size] for i in range(0, len(self.content), size)]
+        yield dict(base, choices=[{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+        for piece in pieces:
+            yield dict(base, choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+        yield dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        if (body.get('stream_options') or {}).get('include_usage'):
+            yield dict(base, choices=[], usage={'prompt_tokens': 1200, 'completion_tokens': 300, 'total_tokens': 1500})
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,113 @@
+"""
+HTTP caching helpers: validators for conditional GETs and content-hashed static assets
+API responses carry a strong ETag derived from record versions, so a repeat request
+can be answered with 304 before the body is built. HTML pages reference their CSS and
+JS with a ?v=<content hash> query, which lets those files be cached for a year.
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+# Cache-Control for per-user API data: browsers keep a copy but revalidate every time
+PRIVATE_REVALIDATE = 'private, no-cache'
+# Cache-Control for HTML pages, whose asset URLs change when the assets do
+PAGE_REVALIDATE = 'no-cache'
+# Cache-Control for asset URLs carrying a content hash
+IMMUTABLE_ASSET = 'public, max-age=31536000, immutable'
+
+_ASSET_REFERENCE = re.compile(r'''(?P<attr>\b(?:href|src))=(?P<quote>["'])(?P<path>[^"':?#]+\.(?:css|js))(?P=quote)''')
+
+
+def make_etag(*parts):
+    """Short hex digest identifying a representation built from the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """
+    Whether a conditional GET can be answered with 304
+    If-None-Match uses weak comparison, so it also matches the W/ form that
+    compressed responses are sent with
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+class StaticAssets:
+    """Content hashes for files in the static folder and HTML pages rewritten to use them"""
+
+    def __init__(self, static_folder, hash_length=12):
+        self.static_folder = static_folder
+        self.hash_length = hash_length
+        self._hashes = {}
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def content_hash(self, filename):
+        """Hash of a static file's contents, or None if it does not exist"""
+        path = os.path.join(self.static_folder, filename)
+        mtime = self._mtime(path)
+        if mtime is None:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:self.hash_length]
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+    def url(self, filename):
+        """Versioned URL for a static file; unknown files keep their plain URL"""
+        digest = self.content_hash(filename)
+        if digest is None:
+            return f'/{filename}'
+        return f'/{filename}?v={digest}'
+
+    def render_page(self, filename):
+        """Return (html bytes, etag) for a page with its asset references versioned"""
+        path = os.path.join(self.static_folder, filename)
+        mtime = self._mtime(path)
+        with self._lock:
+            cached = self._pages.get(filename)
+        if cached is not None and cached[0] == mtime:
+            # The page is unchanged, but the assets it links to may not be
+            if all(self.content_hash(asset) == digest for asset, digest in cached[3]):
+                return cached[1], cached[2]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        assets = []
+
+        def versioned(match):
+            asset = match.group('path').lstrip('/')
+            digest = self.content_hash(asset)
+            assets.append((asset, digest))
+            if digest is None:
+                return match.group(0)
+            return f"{match.group('attr')}={match.group('quote')}/{asset}?v={digest}{match.group('quote')}"
+
+        body = _ASSET_REFERENCE.sub(versioned, html).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._pages[filename] = (mtime, body, etag, tuple(assets))
+        return body, etag
@@ -0,0 +1,91 @@
+"""
+Short-lived cache of logged-in user identities
+Flask-Login loads the user on every authenticated request. Caching the user's profile
+columns for a few seconds turns that lookup into a dictionary read for active users;
+entries are dropped as soon as the user row is updated in this process, and the TTL
+bounds how long a change made by another worker can go unnoticed. A per-user generation,
+bumped on every invalidation, stops a request that read the row before an update from
+caching that stale snapshot afterwards.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdentityCache:
+    """TTL + LRU map of user id to a snapshot of column values, with hit/miss counters"""
+
+    def __init__(self, ttl=30, max_entries=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._generations = {}
+        # Bumped when the generation map is pruned, so tokens taken before still go stale
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0, 'evictions': 0, 'stale_skipped': 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, user_id):
+        """Return the cached column values for a user, or None"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            values, expires_at = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._counters['hits'] += 1
+            return values
+
+    def generation(self, user_id):
+        """Token to take before reading the user row and pass to set()"""
+        with self._lock:
+            return self._epoch, self._generations.get(user_id, 0)
+
+    def set(self, user_id, values, generation=None):
+        """Cache values; skipped if the user was invalidated since generation was taken"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(user_id, 0)):
+                self._counters['stale_skipped'] += 1
+                return
+            self._entries[user_id] = (dict(values), self._clock() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if len(self._generations) >= self.max_entries and user_id not in self._generations:
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if self._entries.pop(user_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 2) if lookups else 0
+        stats['ttl'] = self.ttl
+        return stats
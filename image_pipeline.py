@@ -0,0 +1,168 @@
+"""
+Chart image preprocessing before it is sent to the vision model
+Decodes the upload once, caps the resolution to what the model actually looks at,
+drops metadata and re-encodes to a compact format
+"""
+
+import io
+import threading
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png')
+}
+
+# Formats the vision API accepts as-is when re-encoding would not help
+PASSTHROUGH_MIME_TYPES = {
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif'
+}
+
+
+class ImagePreprocessingError(Exception):
+    """Raised when the uploaded file cannot be decoded as an image"""
+
+
+class PreparedImage:
+    """Result of preprocessing: the bytes to upload plus sizes and per-stage timings"""
+
+    def __init__(self, data, mime_type, width, height, original_bytes, timings):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_bytes = original_bytes
+        self.timings = timings
+
+    @property
+    def final_bytes(self):
+        return len(self.data)
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.final_bytes
+
+
+def target_size(width, height, max_dimension=2048, max_short_side=768):
+    """
+    Size the vision model downsamples to in high-detail mode:
+    fit within max_dimension square, then shortest side at most max_short_side
+    """
+    scale = min(1.0, max_dimension / max(width, height))
+    scale = min(scale, max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def detect_mime_type(image_bytes, default='image/jpeg'):
+    """Identify the image format from its header without decoding the pixels"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return PASSTHROUGH_MIME_TYPES.get(image.format, default)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        return default
+
+
+def _has_metadata(image):
+    return any(key in image.info for key in ('exif', 'icc_profile', 'xmp', 'comment'))
+
+
+def _encode(image, pil_format, quality):
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no alpha channel; flatten onto white like most chart backgrounds
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.split()[-1])
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=quality, optimize=True)
+    elif pil_format == 'WEBP':
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_image(image_bytes, max_dimension=2048, max_short_side=768, quality=85, output_format='webp'):
+    """
+    Decode, downscale and re-encode an uploaded chart
+    Returns a PreparedImage; raises ImagePreprocessingError for undecodable input
+    """
+    pil_format, mime_type = OUTPUT_FORMATS[output_format.lower()]
+    timings = {}
+
+    start = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        source_format = image.format
+        has_metadata = _has_metadata(image)
+        # Apply the EXIF orientation before the EXIF block is dropped
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImagePreprocessingError(f'Could not decode image: {str(e)}') from e
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    width, height = image.size
+    new_size = target_size(width, height, max_dimension, max_short_side)
+    resized = new_size != image.size
+    if resized:
+        image = image.resize(new_size, Image.LANCZOS)
+    timings['resize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Re-encoding without passing exif/icc/pnginfo drops all metadata
+    data = _encode(image, pil_format, quality)
+    timings['encode'] = time.perf_counter() - start
+
+    # Small, clean uploads can already be smaller than any re-encode
+    passthrough_mime = PASSTHROUGH_MIME_TYPES.get(source_format)
+    if not resized and not has_metadata and passthrough_mime and len(image_bytes) <= len(data):
+        data = bytes(image_bytes)
+        mime_type = passthrough_mime
+
+    return PreparedImage(data, mime_type, image.size[0], image.size[1], len(image_bytes), timings)
+
+
+class ImagePipelineStats:
+    """Running totals of bytes and stage timings across all preprocessed images"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._seconds = {}
+
+    def record(self, prepared):
+        with self._lock:
+            self._images += 1
+            self._bytes_in += prepared.original_bytes
+            self._bytes_out += prepared.final_bytes
+            for stage, seconds in prepared.timings.items():
+                self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def stats(self):
+        with self._lock:
+            images = self._images
+            return {
+                'images': images,
+                'bytes_in': self._bytes_in,
+                'bytes_out': self._bytes_out,
+                'bytes_saved': self._bytes_in - self._bytes_out,
+                'savings_percent': round((1 - self._bytes_out / self._bytes_in) * 100, 2) if self._bytes_in else 0,
+                'avg_stage_ms': {
+                    stage: round(seconds / images * 1000, 2)
+                    for stage, seconds in self._seconds.items()
+                }
+            }
@@ -0,0 +1,190 @@
+"""
+Background job queue for chart analysis
+Uploads submitted in async mode return a job id immediately while a bounded pool
+of worker threads runs the OpenAI call and persists the result
+"""
+
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at its depth limit and cannot accept more jobs"""
+
+
+class AnalysisJob:
+    """A single queued analysis and its current state"""
+
+    def __init__(self, user_id, payload):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.payload = payload
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def update(self, status, result=None, error=None):
+        """Move the job to a new status and wake up anyone waiting on it"""
+        with self._changed:
+            self.status = status
+            if status == JOB_RUNNING:
+                self.started_at = datetime.utcnow()
+            if status in FINISHED_STATES:
+                self.finished_at = datetime.utcnow()
+                self.result = result
+                self.error = error
+                # The payload (image bytes, file paths) is no longer needed
+                self.payload = None
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the job version differs from `version`; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class LocalJobQueue:
+    """
+    In-process job queue backend with a fixed pool of worker threads
+    Jobs are only visible to the process that accepted them
+    """
+
+    def __init__(self, handler, workers=2, max_queue=20, result_ttl=3600):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """(Re)create the queue and worker threads, e.g. in a freshly forked worker process"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._threads = []
+        self._jobs = {}
+
+    def _ensure_workers(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f'analysis-worker-{index}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                job.update(JOB_RUNNING)
+                result = self.handler(job)
+                if result.get('success'):
+                    job.update(JOB_COMPLETED, result=result)
+                else:
+                    job.update(JOB_FAILED, result=result, error=result.get('error'))
+            except Exception as e:
+                logger.error(f'Unexpected error in analysis job {job.id}: {str(e)}', exc_info=True)
+                job.update(JOB_FAILED, error='An unexpected error occurred while analyzing the chart. Please try again.')
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        """Drop finished jobs older than the result TTL"""
+        now = datetime.utcnow()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and (now - job.finished_at).total_seconds() > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, user_id, payload):
+        """Queue a job for the worker pool; raises QueueFullError when at capacity"""
+        with self._lock:
+            self._ensure_workers()
+            self._prune()
+            job = AnalysisJob(user_id, payload)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f'Analysis queue is full ({self.max_queue} jobs pending)')
+            self._jobs[job.id] = job
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self._queue.qsize(),
+                'jobs': counts
+            }
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads once the jobs already queued have run"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def create_job_queue(handler, backend='local', workers=2, max_queue=20, result_ttl=3600):
+    """Build the analysis job queue for the given backend name"""
+    backend = (backend or 'local').lower()
+    if backend == 'local':
+        return LocalJobQueue(handler, workers=workers, max_queue=max_queue, result_ttl=result_ttl)
+    raise ValueError(f'Unknown analysis job queue backend: {backend}')
@@ -0,0 +1,128 @@
+"""
+Fast JSON serialization for API responses
+FastJSONProvider uses orjson when it is installed and falls back to the stdlib encoder
+otherwise (or for values orjson cannot encode). JSONFragmentCache keeps the serialized
+bytes of immutable records so list and detail responses can be spliced together
+without re-encoding every row.
+"""
+
+import threading
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the default provider's behaviour as fallback"""
+
+    use_orjson = orjson is not None
+
+    def _orjson_options(self):
+        # Hand datetimes to Flask's default() so they keep the HTTP date format
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj):
+        """Serialize to UTF-8 bytes, the form responses are sent in"""
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+            except TypeError:
+                # orjson.JSONEncodeError, e.g. integers wider than 64 bits
+                pass
+        return super().dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # Let the stdlib raise its usual error (and accept what it accepts, e.g. NaN)
+                pass
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self.raw_response(self.dumps_bytes(obj))
+
+    def raw_response(self, body, status=None):
+        """Response for an already serialized JSON body"""
+        return self._app.response_class(body + b'\n', status=status, mimetype=self.mimetype)
+
+
+def merge_objects(first, second):
+    """Concatenate two serialized JSON objects into one"""
+    if second.strip() == b'{}':
+        return first
+    if first.strip() == b'{}':
+        return second
+    return first.rstrip()[:-1] + b',' + second.lstrip()[1:]
+
+
+def embed(envelope, key, raw_value):
+    """Add a pre-serialized value under key to a serialized JSON object"""
+    return merge_objects(envelope, b'{"' + key.encode('utf-8') + b'":' + raw_value + b'}')
+
+
+def json_array(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+
+class JSONFragmentCache:
+    """In-process LRU of serialized JSON fragments; max_entries=0 disables caching"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        """Return the cached bytes for key, calling build() to create them on a miss"""
+        if self.max_entries <= 0:
+            return build()
+
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = build()
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.max_entries > 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_entries': self.max_entries
+            }
@@ -0,0 +1,181 @@
+"""
+Lightweight request and stage metrics rendered in Prometheus text format
+Each thread records into its own shard so the hot path takes no locks;
+shards are only merged when the metrics endpoint is scraped
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Shard:
+    """Counters and histograms recorded by a single thread"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def merge_into(self, counters, histograms):
+        for key, value in list(self.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, (buckets, total, count) in list(self.histograms.items()):
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(buckets), total, count]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+                merged[2] += count
+
+
+class MetricsRegistry:
+    """Counters and histograms with per-thread aggregation"""
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._descriptions = {}
+        self._collectors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        # Totals from threads that have exited
+        self._retired = _Shard()
+
+    def describe(self, name, metric_type, help_text):
+        """Register the TYPE and HELP lines for a metric"""
+        self._descriptions[name] = (metric_type, help_text)
+
+    def add_collector(self, collector):
+        """
+        Register a callable returning (name, labels, value) gauge samples,
+        evaluated on every scrape (e.g. cache sizes kept elsewhere)
+        """
+        self._collectors.append(collector)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def inc(self, name, amount=1, labels=None):
+        """Increment a counter"""
+        if not self.enabled:
+            return
+        counters = self._shard().counters
+        key = (name, _label_key(labels))
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        """Record a histogram observation"""
+        if not self.enabled:
+            return
+        histograms = self._shard().histograms
+        key = (name, _label_key(labels))
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+        buckets = entry[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                buckets[index] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """Observe the duration of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def snapshot(self):
+        """Merge all thread shards into (counters, histograms)"""
+        counters = {}
+        histograms = {}
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    shard.merge_into(self._retired.counters, self._retired.histograms)
+            self._shards = live
+            self._retired.merge_into(counters, histograms)
+            for _, shard in live:
+                shard.merge_into(counters, histograms)
+        return counters, histograms
+
+    def get_counter(self, name, labels=None):
+        counters, _ = self.snapshot()
+        return counters.get((name, _label_key(labels)), 0)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        counters, histograms = self.snapshot()
+        gauges = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges[(name, _label_key(labels))] = value
+
+        families = {}
+        for (name, key), value in counters.items():
+            families.setdefault(name, []).append(('counter', key, value))
+        for (name, key), value in histograms.items():
+            families.setdefault(name, []).append(('histogram', key, value))
+        for (name, key), value in gauges.items():
+            families.setdefault(name, []).append(('gauge', key, value))
+
+        lines = []
+        for name in sorted(families):
+            samples = families[name]
+            metric_type, help_text = self._descriptions.get(name, (samples[0][0], ''))
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for kind, key, value in sorted(samples, key=lambda sample: sample[1]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+                    continue
+                buckets, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_format_labels(key)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
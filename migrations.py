@@ -0,0 +1,207 @@
+"""
+Versioned schema migrations
+db.create_all() only creates missing tables and never alters existing ones, so every
+schema change to an existing table is recorded here as a numbered migration.
+Migrations must be idempotent: on a fresh database create_all() has already built
+the latest schema and the migrations only get stamped as applied.
+"""
+
+import json
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from pattern_tags import pattern_tags
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function taking a SQLAlchemy connection"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+
+def column_exists(conn, table, column):
+    return column in {col['name'] for col in inspect(conn).get_columns(table)}
+
+
+def index_exists(conn, table, name):
+    return name in {index['name'] for index in inspect(conn).get_indexes(table)}
+
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if not column_exists(conn, table, column):
+        quoted = conn.dialect.identifier_preparer.quote(table)
+        conn.execute(text(f'ALTER TABLE {quoted} ADD COLUMN {column} {ddl}'))
+
+
+def create_index(conn, name, table, columns):
+    """CREATE INDEX unless an index with that name already exists"""
+    if not index_exists(conn, table, name):
+        conn.execute(text(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})'))
+
+
+def ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        ' version INTEGER PRIMARY KEY,'
+        ' description VARCHAR(255),'
+        ' applied_at TIMESTAMP)'
+    ))
+
+
+def get_schema_version(conn):
+    ensure_version_table(conn)
+    return conn.execute(text('SELECT MAX(version) FROM schema_migrations')).scalar() or 0
+
+
+def upgrade(engine, target=None):
+    """Apply pending migrations in order; returns the versions applied"""
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        # One transaction per migration so a failure leaves earlier ones recorded
+        with engine.begin() as conn:
+            if version <= get_schema_version(conn):
+                continue
+            func(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append(version)
+    return applied
+
+
+@migration(1, 'Backfill daily_usage counters from trade_analysis')
+def backfill_daily_usage(conn):
+    if conn.execute(text('SELECT COUNT(*) FROM daily_usage')).scalar():
+        return
+    conn.execute(text(
+        'INSERT INTO daily_usage (user_id, day, analysis_count) '
+        'SELECT user_id, date(created_at), COUNT(*) FROM trade_analysis '
+        'WHERE created_at IS NOT NULL '
+        'GROUP BY user_id, date(created_at)'
+    ))
+
+
+TRADE_ANALYSIS_INDEXES = (
+    ('ix_trade_analysis_user_created', ('user_id', 'created_at')),
+    ('ix_trade_analysis_user_outcome', ('user_id', 'outcome')),
+)
+
+
+@migration(2, 'Composite indexes on trade_analysis for history, stats and quota queries')
+def add_trade_analysis_indexes(conn):
+    for name, columns in TRADE_ANALYSIS_INDEXES:
+        create_index(conn, name, 'trade_analysis', columns)
+
+
+def rebuild_stats_rollup(conn):
+    """Recompute user_stats_rollup from trade_analysis"""
+    conn.execute(text('DELETE FROM user_stats_rollup'))
+    conn.execute(text(
+        'INSERT INTO user_stats_rollup (user_id, asset_type, trading_style, risk_profile, outcome,'
+        ' analysis_count, confidence_sum, confidence_count) '
+        "SELECT user_id, COALESCE(asset_type, ''), COALESCE(trading_style, ''), COALESCE(risk_profile, ''),"
+        " COALESCE(outcome, ''), COUNT(*), COALESCE(SUM(confidence_score), 0), COUNT(confidence_score) "
+        'FROM trade_analysis '
+        "GROUP BY user_id, COALESCE(asset_type, ''), COALESCE(trading_style, ''), COALESCE(risk_profile, ''),"
+        " COALESCE(outcome, '')"
+    ))
+
+
+@migration(3, 'Populate user_stats_rollup from trade_analysis')
+def populate_stats_rollup(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS user_stats_rollup ('
+        ' user_id INTEGER NOT NULL REFERENCES "user" (id) ON DELETE CASCADE,'
+        ' asset_type VARCHAR(50) NOT NULL,'
+        ' trading_style VARCHAR(50) NOT NULL,'
+        ' risk_profile VARCHAR(50) NOT NULL,'
+        ' outcome VARCHAR(20) NOT NULL,'
+        ' analysis_count INTEGER NOT NULL,'
+        ' confidence_sum FLOAT NOT NULL,'
+        ' confidence_count INTEGER NOT NULL,'
+        ' PRIMARY KEY (user_id, asset_type, trading_style, risk_profile, outcome))'
+    ))
+    if not conn.execute(text('SELECT COUNT(*) FROM user_stats_rollup')).scalar():
+        rebuild_stats_rollup(conn)
+
+
+TRADE_ANALYSIS_JSON_COLUMNS = ('patterns', 'indicators', 'take_profit', 'risk_factors')
+
+
+@migration(4, 'JSON list columns on trade_analysis and analysis_pattern tag table')
+def add_json_columns_and_pattern_tags(conn):
+    if conn.dialect.name == 'postgresql':
+        for column in TRADE_ANALYSIS_JSON_COLUMNS:
+            conn.execute(text(
+                f'ALTER TABLE trade_analysis ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb'
+            ))
+    # SQLite stores JSON as text already, so existing values are read as-is by the JSON type
+
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS analysis_pattern ('
+        ' analysis_id INTEGER NOT NULL REFERENCES trade_analysis (id) ON DELETE CASCADE,'
+        ' tag VARCHAR(100) NOT NULL,'
+        ' user_id INTEGER NOT NULL REFERENCES "user" (id) ON DELETE CASCADE,'
+        ' PRIMARY KEY (analysis_id, tag))'
+    ))
+    create_index(conn, 'ix_analysis_pattern_user_tag', 'analysis_pattern', ('user_id', 'tag'))
+    if not conn.execute(text('SELECT COUNT(*) FROM analysis_pattern')).scalar():
+        backfill_pattern_tags(conn)
+
+
+def backfill_pattern_tags(conn, batch_size=1000):
+    """Build analysis_pattern rows from the patterns column of every analysis"""
+    rows = conn.execute(text('SELECT id, user_id, patterns FROM trade_analysis WHERE patterns IS NOT NULL'))
+    batch = []
+    for analysis_id, user_id, patterns in rows:
+        if isinstance(patterns, str):
+            try:
+                patterns = json.loads(patterns)
+            except ValueError:
+                continue
+        batch.extend({'a': analysis_id, 'u': user_id, 't': tag} for tag in pattern_tags(patterns))
+        if len(batch) >= batch_size:
+            _insert_pattern_tags(conn, batch)
+            batch = []
+    if batch:
+        _insert_pattern_tags(conn, batch)
+
+
+def _insert_pattern_tags(conn, batch):
+    conn.execute(text('INSERT INTO analysis_pattern (analysis_id, user_id, tag) VALUES (:a, :u, :t)'), batch)
+
+
+@migration(5, 'Version columns for HTTP caching validators')
+def add_version_columns(conn):
+    add_column(conn, 'trade_analysis', 'version', 'INTEGER NOT NULL DEFAULT 1')
+    add_column(conn, 'trade_analysis', 'updated_at', 'TIMESTAMP')
+    conn.execute(text('UPDATE trade_analysis SET updated_at = created_at WHERE updated_at IS NULL'))
+    add_column(conn, 'user', 'analyses_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+@migration(6, 'analysis_timeframe table for multi-timeframe sub-results')
+def add_analysis_timeframe_table(conn):
+    json_type = 'JSONB' if conn.dialect.name == 'postgresql' else 'JSON'
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS analysis_timeframe ('
+        ' analysis_id INTEGER NOT NULL REFERENCES trade_analysis (id) ON DELETE CASCADE,'
+        ' position INTEGER NOT NULL,'
+        ' timeframe VARCHAR(20) NOT NULL,'
+        ' trend VARCHAR(50),'
+        ' direction VARCHAR(20),'
+        f' patterns {json_type},'
+        f' indicators {json_type},'
+        ' confidence_score INTEGER,'
+        ' summary TEXT,'
+        ' PRIMARY KEY (analysis_id, position))'
+    ))
@@ -0,0 +1,111 @@
+"""
+Process-wide OpenAI client with a shared keep-alive connection pool
+Reusing one client avoids a new TCP/TLS handshake on every analysis; the pool is
+rebuilt automatically in forked worker processes (e.g. gunicorn prefork)
+"""
+
+import os
+import threading
+import weakref
+
+import httpx
+import openai
+
+_managers = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for manager in list(_managers):
+        manager._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class OpenAIClientManager:
+    """Lazily builds one pooled OpenAI client per process and tracks connection reuse"""
+
+    def __init__(self, api_key=None, base_url=None, max_connections=20, max_keepalive=10,
+                 keepalive_expiry=30.0, timeout=60.0, connect_timeout=10.0, max_retries=2):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self._reset()
+        _managers.add(self)
+
+    def _reset(self):
+        """Forget the client without closing it; its sockets belong to the parent process"""
+        self._pid = os.getpid()
+        self._client = None
+        self._http_client = None
+        self._counters = {'clients_created': 0, 'requests': 0, 'connections_opened': 0}
+        # Locks held by another thread at fork time would stay locked forever in the child
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def _trace(self, event_name, info):
+        # httpcore only runs connect_tcp for new connections; reused ones skip it
+        if event_name == 'connection.connect_tcp.complete':
+            self._count('connections_opened')
+
+    def _on_request(self, request):
+        self._count('requests')
+        request.extensions['trace'] = self._trace
+
+    def _build(self):
+        self._http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            event_hooks={'request': [self._on_request]}
+        )
+        self._client = openai.OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=self._http_client,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            max_retries=self.max_retries
+        )
+        self._count('clients_created')
+
+    def get_client(self):
+        """Return the shared client for this process, creating it on first use"""
+        if self._pid != os.getpid():
+            self._reset()
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                self._build()
+            return self._client
+
+    def close(self):
+        """Close the pooled connections; the next get_client() builds a fresh pool"""
+        with self._lock:
+            if self._http_client is not None and self._pid == os.getpid():
+                self._http_client.close()
+            self._client = None
+            self._http_client = None
+
+    def stats(self):
+        """Return request and connection counters for this process"""
+        with self._stats_lock:
+            stats = dict(self._counters)
+        stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+        stats['reuse_rate'] = round(stats['connections_reused'] / stats['requests'] * 100, 2) if stats['requests'] else 0
+        stats['max_connections'] = self.max_connections
+        return stats
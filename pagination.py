@@ -0,0 +1,75 @@
+"""
+Keyset (cursor) pagination and query parameter helpers for /api/history
+A cursor encodes the (created_at, id) of the last row on a page, so the next page is
+an indexed range scan instead of an OFFSET that reads and discards every earlier row.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor the server did not issue"""
+
+
+class InvalidFilterError(ValueError):
+    """Raised when a history filter or fields value cannot be parsed"""
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor pointing just past the given row"""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor made by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(row_id, int):
+            raise ValueError('cursor id must be an integer')
+        return datetime.fromisoformat(created_at), row_id
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError('Invalid cursor') from e
+
+
+def clamp_per_page(per_page, max_per_page, default=10):
+    """Keep the requested page size between 1 and max_per_page"""
+    if per_page is None:
+        per_page = default
+    return max(1, min(per_page, max_per_page))
+
+
+def parse_date_bound(value, end=False):
+    """
+    Parse an ISO date or datetime filter value
+    A bare date used as an upper bound covers the whole day, so it is returned as
+    midnight of the following day and compared with '<'
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as e:
+        raise InvalidFilterError(f'Invalid date: {value}') from e
+    if end and len(value) == 10:
+        return parsed + timedelta(days=1)
+    return parsed
+
+
+def parse_fields(value, allowed, default):
+    """
+    Parse a comma-separated ?fields= list against the allowed field names
+    The id is always included so clients can address what they receive
+    """
+    if not value:
+        return tuple(default)
+    requested = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise InvalidFilterError(f"Unknown fields: {', '.join(unknown)}")
+    fields = ['id'] + [name for name in allowed if name in requested and name != 'id']
+    return tuple(fields)
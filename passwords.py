@@ -0,0 +1,206 @@
+"""
+Password hashing policy
+Hashes use werkzeug's formats with a configurable method and cost (e.g. scrypt:32768:8:1 or
+pbkdf2:sha256:600000). A stored hash made with other parameters still verifies, and
+needs_rehash() tells the caller to replace it. Hashing and verification are a concurrency
+cap, not an offload: the request thread still waits for its derivation, but at most max_pending
+run or wait at once per process (more are rejected rather than piling up during a login burst),
+and with workers > 0 only that many burn CPU at once on a thread or process pool.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+SCRYPT_DEFAULTS = (2 ** 15, 8, 1)
+# calibrate() never recommends less than these, whatever the target time
+SCRYPT_MIN_N = 2 ** 14
+PBKDF2_MIN_ITERATIONS = 100000
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when more password hashes are pending than the pool accepts"""
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults, e.g. 'scrypt' -> 'scrypt:32768:8:1'"""
+    name, *args = (method or 'scrypt').strip().lower().split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else SCRYPT_DEFAULTS
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Unknown password hash method: {method}')
+
+
+def hash_method(password_hash):
+    """The method and parameters a stored hash was made with"""
+    return password_hash.split('$', 1)[0] if password_hash else None
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+def time_method(method, rounds=3):
+    """Median seconds one hash takes with the given method"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        _hash('benchmark-password', method)
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate(target_seconds, algorithm='scrypt', max_memory=256 * 1024 * 1024):
+    """
+    Pick the strongest parameters whose hash takes about target_seconds on this machine
+    Returns a list of (method, seconds) candidates tried and the recommended method.
+    The recommendation is never below SCRYPT_MIN_N / PBKDF2_MIN_ITERATIONS: if even that
+    floor is slower than the target, the floor is returned (see below_floor())
+    """
+    candidates = []
+    if algorithm == 'pbkdf2':
+        # pbkdf2 cost is linear in iterations: measure once, scale, then confirm
+        probe = f'pbkdf2:sha256:{PBKDF2_MIN_ITERATIONS}'
+        seconds = time_method(probe)
+        candidates.append((probe, seconds))
+        iterations = max(PBKDF2_MIN_ITERATIONS,
+                         int(PBKDF2_MIN_ITERATIONS * target_seconds / seconds) // 10000 * 10000)
+        method = f'pbkdf2:sha256:{iterations}'
+        candidates.append((method, time_method(method)))
+        return candidates, method
+
+    # scrypt cost doubles with n; stop before the target or the memory budget is exceeded
+    n, r, p = SCRYPT_MIN_N, 8, 1
+    recommended = None
+    while 132 * n * r * p <= max_memory:
+        method = f'scrypt:{n}:{r}:{p}'
+        seconds = time_method(method)
+        candidates.append((method, seconds))
+        if seconds > target_seconds and recommended is not None:
+            break
+        recommended = method
+        if seconds * 2 > target_seconds * 1.5:
+            break
+        n *= 2
+    return candidates, recommended
+
+
+def below_floor(candidates, recommended, target_seconds):
+    """Whether the target was faster than the minimum cost, so the floor was recommended anyway"""
+    return dict(candidates).get(recommended, 0) > target_seconds and recommended == candidates[0][0]
+
+
+class PasswordHasher:
+    """Configured hashing policy with a cap on concurrent derivations, optionally on a worker pool"""
+
+    def __init__(self, method='scrypt', workers=0, executor='thread', max_pending=32):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.executor_type = executor
+        self.max_pending = max_pending
+        self._executor = None
+        self._executor_pid = None
+        self._background = None
+        self._background_pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._rehashes_pending = 0
+        self._counters = {'hashes': 0, 'verifications': 0, 'rehashes': 0, 'rehashes_skipped': 0, 'rejected': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _get_executor(self):
+        # Pools do not survive fork (e.g. gunicorn prefork); build one per process on first use
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                if self.executor_type == 'process':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        # The caller blocks either way; the slots bound how many callers do, inline or pooled
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PasswordHasherBusyError('Too many password operations pending')
+        try:
+            if self.workers <= 0:
+                return func(*args)
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        self._count('hashes')
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        self._count('verifications')
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with parameters other than the configured ones"""
+        method = hash_method(password_hash)
+        if not method:
+            return True
+        try:
+            return normalize_method(method) != self.method
+        except ValueError:
+            return True
+
+    def rehash_in_background(self, password, store):
+        """
+        Hash password with the current parameters off the request thread, then call store(new_hash)
+        At most max_pending rehashes (and so plaintext passwords) wait at once; beyond that the
+        rehash is skipped and None returned, since the next login tries again
+        """
+        def rehash():
+            try:
+                store(self.hash(password))
+                self._count('rehashes')
+            except PasswordHasherBusyError:
+                # Not urgent: the next login tries again
+                pass
+            finally:
+                with self._lock:
+                    self._rehashes_pending -= 1
+
+        with self._lock:
+            if self._background is None or self._background_pid != os.getpid():
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash')
+                self._background_pid = os.getpid()
+                # Rehashes queued in a parent process never run here
+                self._rehashes_pending = 0
+            if self._rehashes_pending >= self.max_pending:
+                self._counters['rehashes_skipped'] += 1
+                return None
+            self._rehashes_pending += 1
+            background = self._background
+        return background.submit(rehash)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['rehashes_pending'] = self._rehashes_pending
+        # No method: the cost parameters stay out of anything exported (e.g. /api/metrics)
+        stats.update({
+            'executor': self.executor_type if self.workers > 0 else 'inline',
+            'workers': self.workers,
+            'max_pending': self.max_pending
+        })
+        return stats
@@ -0,0 +1,30 @@
+"""
+Normalized chart pattern tags
+The model names patterns freely ("Head and Shoulders", "head & shoulders"), so each
+name is reduced to a lowercase hyphenated tag and stored one row per pattern in the
+analysis_pattern table, where an index on (user_id, tag) answers pattern searches.
+"""
+
+import re
+
+_SEPARATORS = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_pattern_tag(name):
+    """'Head & Shoulders' -> 'head-and-shoulders'; returns None for blank or non-string names"""
+    if not isinstance(name, str):
+        return None
+    tag = _SEPARATORS.sub('-', name.lower().replace('&', ' and ')).strip('-')
+    return tag[:100] or None
+
+
+def pattern_tags(patterns):
+    """Distinct tags for a list of pattern names, in first-seen order"""
+    if not isinstance(patterns, (list, tuple)):
+        return []
+    tags = []
+    for name in patterns:
+        tag = normalize_pattern_tag(name)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
@@ -0,0 +1,259 @@
+"""
+Prompt templates for chart analysis
+Each (trading style, risk profile, asset type) variant of the analysis prompt is rendered
+once at startup and reused, together with an estimate of its prompt tokens. A template's
+version is a hash of its text, so editing a template changes the analysis cache key and
+retires results produced by the old wording. Token usage reported by the API is
+accumulated per template version for cost and latency analysis.
+"""
+
+import hashlib
+import itertools
+import math
+import threading
+from collections import OrderedDict, namedtuple
+from string import Template
+
+STYLE_ADJUSTMENTS = {
+    'Scalping': 'Focus on very short-term price movements (minutes to hours). Tighter stop losses and quicker profit targets.',
+    'Day Trade': 'Focus on intraday movements. Positions closed within the same trading day.',
+    'Swing': 'Focus on multi-day to multi-week price movements. Wider stop losses and larger profit targets.'
+}
+
+RISK_ADJUSTMENTS = {
+    'Conservative': 'Recommend tighter stop losses and smaller position sizing. Risk-reward ratio of at least 1:2.',
+    'Balanced': 'Moderate risk approach with standard risk-reward ratio of 1:1.5 to 1:2.',
+    'Aggressive': 'Accept higher risk for potentially higher rewards. Risk-reward ratio of 1:1 to 1:1.5 is acceptable.'
+}
+
+ASSET_TYPES = ('Crypto', 'Forex', 'Stocks')
+
+_CONTEXT = """Trading Context:
+- Asset Type: $asset_type
+- Trading Style: $trading_style - $style_adjustment
+- Risk Profile: $risk_profile - $risk_adjustment"""
+
+_ITEMS = """Your analysis should include:
+1. Market type identification (crypto/forex/stocks)
+2. Identified chart patterns (e.g., head and shoulders, double top, triangles, flags, etc.)
+3. Key technical indicators visible (e.g., moving averages, RSI, MACD, support/resistance levels)
+4. Chart quality assessment - if the chart is unclear, blurry, missing timeframe, or lacks key information, note this
+5. Suggested trade setup:
+   - Trade direction (Long/Short)
+   - Entry price level
+   - Stop loss level
+   - Multiple take profit levels (TP1, TP2, TP3) for partial exits
+6. Pattern explanation (brief, 2-3 sentences)
+7. Trading reasoning (why this setup, key factors)
+8. Confidence score (0-100%) - lower confidence if chart is unclear
+9. Specific reasons if chart quality is poor"""
+
+_GUIDELINES = """Important guidelines:
+- Only analyze what is clearly visible in the chart
+- If chart is unclear, blurry, or missing critical information (like timeframe), set confidence below 30% and explain issues
+- Be specific with price levels when visible
+- Use neutral, educational tone
+- Include risk factors
+- Emphasize this is educational analysis, not financial advice
+- Adjust recommendations based on the trading style and risk profile provided"""
+
+_FORMAT = """Format your response as JSON with this structure:
+{
+  "market_type": "string",
+  "patterns": ["array", "of", "patterns"],
+  "indicators": ["array", "of", "indicators"],
+  "chart_quality": "clear/moderate/poor",
+  "chart_issues": ["array of issues if quality is poor"],
+  "trade_setup": {
+    "direction": "Long or Short",
+    "entry": "price level or description",
+    "stop_loss": "price level or description",
+    "take_profit": ["TP1", "TP2", "TP3"]
+  },
+  "pattern_explanation": "string",
+  "reasoning": "string",
+  "confidence_score": number,
+  "risk_factors": ["array", "of", "risks"]"""
+
+CHART_ANALYSIS_TEXT = f"""You are an expert technical analyst. Analyze this trading chart image and provide a structured trade setup.
+
+{_CONTEXT}
+
+{_ITEMS}
+
+{_GUIDELINES}
+
+{_FORMAT}
+}}"""
+
+MULTI_TIMEFRAME_ANALYSIS_TEXT = f"""You are an expert technical analyst. The $timeframe_count attached charts show the same instrument on different timeframes ($timeframes), each labelled before its image. Read every timeframe, then combine them into one structured trade setup that is confluent across timeframes: take trend and key levels from the higher timeframes and entry timing from the lower ones.
+
+{_CONTEXT}
+
+{_ITEMS}
+10. For each timeframe: trend, directional bias, patterns, indicators, confidence and a one-sentence summary
+11. Confluence: where the timeframes agree or conflict (lower the overall confidence when they conflict)
+
+{_GUIDELINES}
+
+{_FORMAT},
+  "timeframes": [
+    {{
+      "timeframe": "label as given",
+      "trend": "Bullish/Bearish/Sideways",
+      "direction": "Long/Short/Neutral",
+      "patterns": ["array", "of", "patterns"],
+      "indicators": ["array", "of", "indicators"],
+      "confidence_score": number,
+      "summary": "string"
+    }}
+  ],
+  "confluence": "string"
+}}"""
+
+RenderedPrompt = namedtuple('RenderedPrompt', 'text template version estimated_tokens')
+
+
+def estimate_tokens(text):
+    """Rough prompt token count: about four characters per token for English text"""
+    return math.ceil(len(text) / 4)
+
+
+class PromptTemplate:
+    """A named prompt template; its version is a hash of the template text"""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.template = Template(text)
+        self.version = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+
+class PromptRegistry:
+    """
+    Rendered prompt variants and per-version token usage
+    Precompiled variants are kept for the life of the process; anything else (custom
+    styles, timeframe combinations) is rendered on first use and kept in a bounded LRU
+    """
+
+    def __init__(self, templates, max_variants=256):
+        self.templates = {template.name: template for template in templates}
+        self.max_variants = max_variants
+        self._precompiled = {}
+        self._variants = OrderedDict()
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def _render(self, name, params):
+        template = self.templates[name]
+        text = template.template.substitute(params)
+        return RenderedPrompt(text, name, template.version, estimate_tokens(text))
+
+    def precompile(self, name, param_sets):
+        """Render every variant of a template up front; returns how many were added"""
+        added = 0
+        for params in param_sets:
+            key = (name, tuple(sorted(params.items())))
+            if key not in self._precompiled:
+                self._precompiled[key] = self._render(name, params)
+                added += 1
+        return added
+
+    def render(self, name, **params):
+        """Rendered prompt for the given template parameters"""
+        key = (name, tuple(sorted(params.items())))
+        prompt = self._precompiled.get(key)
+        if prompt is not None:
+            return prompt
+        with self._lock:
+            prompt = self._variants.get(key)
+            if prompt is not None:
+                self._variants.move_to_end(key)
+                return prompt
+        prompt = self._render(name, params)
+        with self._lock:
+            self._variants[key] = prompt
+            while len(self._variants) > self.max_variants:
+                self._variants.popitem(last=False)
+        return prompt
+
+    def record_usage(self, prompt, usage):
+        """Add the token usage of one API call made with this prompt"""
+        # Streamed responses report usage as a plain dict
+        if isinstance(usage, dict):
+            prompt_tokens, completion_tokens = usage.get('prompt_tokens'), usage.get('completion_tokens')
+        else:
+            prompt_tokens = getattr(usage, 'prompt_tokens', None)
+            completion_tokens = getattr(usage, 'completion_tokens', None)
+        with self._lock:
+            totals = self._usage.setdefault((prompt.template, prompt.version), {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'estimated_prompt_tokens': 0
+            })
+            totals['calls'] += 1
+            totals['estimated_prompt_tokens'] += prompt.estimated_tokens
+            if isinstance(prompt_tokens, int):
+                totals['prompt_tokens'] += prompt_tokens
+            if isinstance(completion_tokens, int):
+                totals['completion_tokens'] += completion_tokens
+
+    def variants(self):
+        """All rendered variants, precompiled first"""
+        with self._lock:
+            dynamic = list(self._variants.items())
+        return list(self._precompiled.items()) + dynamic
+
+    def stats(self):
+        with self._lock:
+            usage = [
+                {'template': name, 'version': version, **totals}
+                for (name, version), totals in sorted(self._usage.items())
+            ]
+            dynamic = len(self._variants)
+        templates = {}
+        for name, template in self.templates.items():
+            estimates = [prompt.estimated_tokens for (key_name, _), prompt in self._precompiled.items()
+                         if key_name == name]
+            templates[name] = {
+                'version': template.version,
+                'estimated_tokens_min': min(estimates) if estimates else None,
+                'estimated_tokens_max': max(estimates) if estimates else None
+            }
+        return {
+            'templates': templates,
+            'precompiled_variants': len(self._precompiled),
+            'dynamic_variants': dynamic,
+            'usage': usage
+        }
+
+
+def analysis_prompt(registry, trading_style, risk_profile, asset_type, timeframes=None):
+    """Prompt for a single chart, or for one chart per timeframe when timeframes is given"""
+    params = {
+        'trading_style': trading_style,
+        'style_adjustment': STYLE_ADJUSTMENTS.get(trading_style, ''),
+        'risk_profile': risk_profile,
+        'risk_adjustment': RISK_ADJUSTMENTS.get(risk_profile, ''),
+        'asset_type': asset_type
+    }
+    if not timeframes:
+        return registry.render('chart_analysis', **params)
+    return registry.render('multi_timeframe_analysis', timeframes=', '.join(timeframes),
+                           timeframe_count=str(len(timeframes)), **params)
+
+
+def create_prompt_registry(max_variants=256):
+    """Registry with the analysis templates and every known single-chart variant precompiled"""
+    registry = PromptRegistry((
+        PromptTemplate('chart_analysis', CHART_ANALYSIS_TEXT),
+        PromptTemplate('multi_timeframe_analysis', MULTI_TIMEFRAME_ANALYSIS_TEXT)
+    ), max_variants=max_variants)
+    registry.precompile('chart_analysis', (
+        {
+            'trading_style': style,
+            'style_adjustment': STYLE_ADJUSTMENTS[style],
+            'risk_profile': risk,
+            'risk_adjustment': RISK_ADJUSTMENTS[risk],
+            'asset_type': asset
+        }
+        for style, risk, asset in itertools.product(STYLE_ADJUSTMENTS, RISK_ADJUSTMENTS, ASSET_TYPES)
+    ))
+    return registry
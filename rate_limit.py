@@ -0,0 +1,271 @@
+"""
+Token-bucket rate limiting for API routes
+Each rule names a bucket per client (user id, IP address or one global key) that holds up to
+`limit` tokens and refills continuously over its period. A request takes one token from every
+bucket its route uses, all or nothing, and is rejected with a retry-after hint when any of
+them is empty. Buckets live in process memory or, for multi-worker deployments, in a SQLite
+file shared by all workers on one host.
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class RateLimit(namedtuple('RateLimit', 'limit period')):
+    """`limit` requests per `period` seconds; also the bucket's capacity"""
+    __slots__ = ()
+
+    @property
+    def rate(self):
+        """Tokens added per second"""
+        return self.limit / self.period
+
+
+Decision = namedtuple('Decision', 'allowed retry_after rule limit remaining')
+
+
+class InvalidRateLimitError(ValueError):
+    """Raised for a rate limit string that is not '<count>/<second|minute|hour|day>'"""
+
+
+def parse_rate_limit(value):
+    """Parse '10/minute' (or '10/min', '100/hour') into a RateLimit; blank or '0' disables it"""
+    value = (value or '').strip().lower()
+    if value in ('', '0', 'none', 'off'):
+        return None
+    count, _, period = value.partition('/')
+    period = period.strip().rstrip('s') or 'second'
+    matches = [seconds for name, seconds in PERIODS.items() if name.startswith(period)]
+    try:
+        limit = int(count)
+    except ValueError:
+        limit = 0
+    if limit <= 0 or len(matches) != 1:
+        raise InvalidRateLimitError(f'Invalid rate limit: {value!r}')
+    return RateLimit(limit, matches[0])
+
+
+def _take(tokens, updated, limit, rate, cost, now):
+    """Refill a bucket up to now; returns (tokens after refill, seconds until cost is available)"""
+    # A request never needs more than a full bucket, or it could never be allowed
+    cost = min(cost, limit)
+    if tokens is None:
+        tokens = float(limit)
+    else:
+        tokens = min(float(limit), tokens + (now - updated) * rate)
+    return tokens, (0.0 if tokens >= cost else (cost - tokens) / rate)
+
+
+class MemoryRateLimitBackend:
+    """In-process buckets (per worker); least recently used keys are dropped above max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, requests, now):
+        """
+        Take `cost` tokens from each (key, RateLimit, cost) bucket only if all of them have enough
+        Returns a list of (retry_after, remaining) per bucket; retry_after is 0 when allowed
+        """
+        with self._lock:
+            state = []
+            for key, rate_limit, cost in requests:
+                tokens, updated = self._buckets.get(key, (None, now))
+                tokens, wait = _take(tokens, updated, rate_limit.limit, rate_limit.rate, cost, now)
+                state.append((key, rate_limit, tokens, wait, cost))
+            allowed = all(wait == 0 for _, _, _, wait, _ in state)
+            results = []
+            for key, rate_limit, tokens, wait, cost in state:
+                if allowed:
+                    tokens -= min(cost, rate_limit.limit)
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                results.append((wait, tokens))
+            # A dropped bucket comes back full, which only ever errs on the side of allowing
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return results
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class SQLiteRateLimitBackend:
+    """
+    Buckets in a SQLite file shared by every worker process on one host
+    Each acquire is one short IMMEDIATE transaction, so concurrent workers never double-spend
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._calls = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Connections do not survive fork (e.g. gunicorn --preload); open one per process on first use
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        """This process's connection; call with self._lock held"""
+        if self._conn is None or self._pid != os.getpid():
+            # A handle inherited from the parent is abandoned, not closed: it belongs to the parent.
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                ' key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' updated REAL NOT NULL,'
+                ' full_at REAL NOT NULL)'
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def acquire(self, requests, now):
+        """Same contract as MemoryRateLimitBackend.acquire"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                state = []
+                for key, rate_limit, cost in requests:
+                    row = conn.execute(
+                        'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+                    ).fetchone()
+                    tokens, updated = row if row is not None else (None, now)
+                    tokens, wait = _take(tokens, updated, rate_limit.limit, rate_limit.rate, cost, now)
+                    state.append((key, rate_limit, tokens, wait, cost))
+                allowed = all(wait == 0 for _, _, _, wait, _ in state)
+                results = []
+                for key, rate_limit, tokens, wait, cost in state:
+                    if allowed:
+                        tokens -= min(cost, rate_limit.limit)
+                    full_at = now + (rate_limit.limit - tokens) / rate_limit.rate
+                    conn.execute(
+                        'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated, full_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, tokens, now, full_at)
+                    )
+                    results.append((wait, tokens))
+                self._calls += 1
+                if self._calls % self.PRUNE_EVERY == 0:
+                    # A bucket that has refilled completely carries no state
+                    conn.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return results
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute('DELETE FROM rate_limit_buckets')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM rate_limit_buckets').fetchone()[0]
+
+
+class RateLimiter:
+    """Applies named rules to requests on top of a bucket backend, with per-rule counters"""
+
+    def __init__(self, backend, enabled=True, clock=time.time):
+        self.backend = backend
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _count(self, rule, name):
+        with self._lock:
+            counters = self._counters.setdefault(rule, {'allowed': 0, 'limited': 0})
+            counters[name] += 1
+
+    def hit(self, checks, cost=1):
+        """
+        Take a token for each (rule name, key, RateLimit) check
+        Returns the Decision of the bucket that blocked the request, or an allowed Decision
+        """
+        checks = [(rule, key, rate_limit) for rule, key, rate_limit in checks
+                  if key is not None and rate_limit is not None]
+        if not self.enabled or not checks:
+            return Decision(True, 0, None, None, None)
+
+        results = self.backend.acquire(
+            [(f'{rule}:{key}', rate_limit, cost) for rule, key, rate_limit in checks], self._clock()
+        )
+        blocked = [(wait, check) for (wait, _), check in zip(results, checks) if wait > 0]
+        for rule, _, _ in (check for _, check in blocked) if blocked else checks:
+            self._count(rule, 'limited' if blocked else 'allowed')
+        if blocked:
+            wait, (rule, _, rate_limit) = max(blocked, key=lambda item: item[0])
+            return Decision(False, wait, rule, rate_limit.limit, 0)
+        remaining = min(int(tokens) for _, tokens in results)
+        return Decision(True, 0, None, None, remaining)
+
+    def limit(self, *rules, on_limited, cost=None):
+        """
+        Route decorator applying rules given as (name, key_func, RateLimit or callable returning one)
+        key_func() returns the bucket key for the current request, or None to skip that rule;
+        on_limited(decision) builds the response for a rejected request and cost(), if given,
+        the number of tokens the request takes
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    decision = self.hit([
+                        (name, key_func(), rate_limit() if callable(rate_limit) else rate_limit)
+                        for name, key_func, rate_limit in rules
+                    ], cost=cost() if cost is not None else 1)
+                    if not decision.allowed:
+                        return on_limited(decision)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        self.backend.clear()
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self):
+        with self._lock:
+            rules = {rule: dict(counters) for rule, counters in sorted(self._counters.items())}
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'buckets': len(self.backend),
+            'rules': rules
+        }
+
+
+def create_rate_limiter(backend='memory', path='instance/rate_limits.db', enabled=True, max_keys=100000):
+    """Build a RateLimiter for the given backend name ('memory' or 'sqlite')"""
+    backend = (backend or 'memory').lower()
+    if backend == 'memory':
+        return RateLimiter(MemoryRateLimitBackend(max_keys), enabled=enabled)
+    if backend == 'sqlite':
+        return RateLimiter(SQLiteRateLimitBackend(path), enabled=enabled)
+    raise ValueError(f'Unknown rate limit backend: {backend}')
@@ -0,0 +1,108 @@
+"""
+Read-replica routing
+Read-only endpoints send their SELECTs to a replica engine (one of the SQLALCHEMY_BINDS
+built from DATABASE_REPLICA_URLS); flushes and INSERT/UPDATE/DELETE statements always go to
+the primary. Replicas lag behind the primary, so a user who has just written is kept on the
+primary for sticky_seconds and sees their own analyses and outcomes straight away.
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+def replica_urls(value):
+    """Parse a comma-separated DATABASE_REPLICA_URLS value"""
+    return [url.strip() for url in (value or '').split(',') if url.strip()]
+
+
+def replica_binds(urls, options=None):
+    """SQLALCHEMY_BINDS entries replica_0, replica_1, ... with per-URL engine options"""
+    options = options or (lambda url: {})
+    return {f'{REPLICA_BIND_PREFIX}{index}': {'url': url, **options(url)} for index, url in enumerate(urls)}
+
+
+class ReplicaRouter:
+    """Round-robin choice of replica bind plus per-user read-your-writes stickiness"""
+
+    def __init__(self, bind_keys=(), sticky_seconds=10, max_users=10000, clock=time.time):
+        self.bind_keys = list(bind_keys)
+        self.sticky_seconds = sticky_seconds
+        self.max_users = max_users
+        # Wall clock: write times are also carried in the session cookie to other workers
+        self._clock = clock
+        self._writes = OrderedDict()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._counters = {'replica_reads': 0, 'sticky_reads': 0, 'writes': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.bind_keys)
+
+    def record_write(self, user_id):
+        """Keep the user on the primary for sticky_seconds; returns the write time"""
+        now = self._clock()
+        with self._lock:
+            self._writes[str(user_id)] = now
+            self._writes.move_to_end(str(user_id))
+            while len(self._writes) > self.max_users:
+                self._writes.popitem(last=False)
+            self._counters['writes'] += 1
+        return now
+
+    def is_sticky(self, user_id, written_at=None):
+        """Whether the user wrote within sticky_seconds, here or (written_at) on another worker"""
+        with self._lock:
+            last_write = self._writes.get(str(user_id)) if user_id is not None else None
+        last_write = max(filter(None, (last_write, written_at)), default=None)
+        return last_write is not None and self._clock() - last_write < self.sticky_seconds
+
+    def choose(self, user_id=None, written_at=None):
+        """Replica bind key for a read-only request, or None to stay on the primary"""
+        if not self.bind_keys:
+            return None
+        if self.is_sticky(user_id, written_at):
+            with self._lock:
+                self._counters['sticky_reads'] += 1
+            return None
+        with self._lock:
+            self._counters['replica_reads'] += 1
+            return self.bind_keys[next(self._next) % len(self.bind_keys)]
+
+    def clear(self):
+        with self._lock:
+            self._writes.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['sticky_users'] = len(self._writes)
+        stats.update({'replicas': list(self.bind_keys), 'sticky_seconds': self.sticky_seconds})
+        return stats
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends reads on the default bind to read_bind(), a callable
+    returning a replica bind key (or None) for the current request
+    """
+
+    def __init__(self, db, read_bind=None, **kwargs):
+        super().__init__(db, **kwargs)
+        self._read_bind = read_bind
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._read_bind is None or self._flushing or isinstance(clause, UpdateBase):
+            return engine
+        if engine is not self._db.engines.get(None):
+            return engine
+        key = self._read_bind()
+        return self._db.engines[key] if key is not None else engine
@@ -0,0 +1,243 @@
+"""
+Retry, deadline and circuit-breaker policy for upstream API calls
+A call gets an overall deadline; each attempt's timeout is capped by what is left of it.
+Transient failures (timeouts, connection errors, 429 and 5xx responses) are retried with
+full-jitter exponential backoff, waiting at least as long as the server's Retry-After.
+A circuit breaker counts those failures and, once upstream looks degraded, fails calls
+immediately instead of tying up workers until it is probed again. An optional hedge
+starts a second attempt when the first is slow and keeps whichever answers first.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+import openai
+
+RETRYABLE_STATUS_CODES = frozenset((408, 409, 429, 500, 502, 503, 504))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Upstream circuit is open; retry in {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a call's deadline leaves no time for another attempt"""
+
+
+def is_retryable(error):
+    """Whether an error is transient and worth another attempt"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error):
+    """Seconds the server asked us to wait (retry-after-ms or Retry-After), or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_deadlines(value):
+    """Parse per-call deadlines written as 'analyze=90,openai_call=30'"""
+    deadlines = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        name, seconds = item.split('=', 1)
+        deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+class RetryPolicy:
+    """Attempt limit and full-jitter exponential backoff"""
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before the attempt after `attempt` (1-based), never shorter than retry_after"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and consecutive failures are counted
+    Open: calls fail fast with CircuitOpenError for recovery_timeout seconds
+    Half-open: one probe call is let through; success closes the circuit, failure reopens it
+    """
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._counters = {'opened': 0, 'short_circuited': 0, 'failures': 0, 'successes': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == 'open' and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = 'half_open'
+            self._probing = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now"""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            state = self._current_state()
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return
+            self._counters['short_circuited'] += 1
+            if state == 'open':
+                retry_after = self.recovery_timeout - (self._clock() - self._opened_at)
+            else:
+                retry_after = 1.0
+        raise CircuitOpenError(max(retry_after, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self._counters['successes'] += 1
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._counters['failures'] += 1
+            self._failures += 1
+            state = self._current_state()
+            if state == 'half_open' or (state == 'closed' and self._failures >= self.failure_threshold > 0):
+                self._state = 'open'
+                self._opened_at = self._clock()
+                self._probing = False
+                self._counters['opened'] += 1
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            stats = {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_in': None
+            }
+            if state == 'open':
+                stats['retry_in'] = round(max(self.recovery_timeout - (self._clock() - self._opened_at), 0.0), 2)
+            stats.update(self._counters)
+        return stats
+
+
+def _run_hedged(attempt, timeout, hedge_after):
+    """Run attempt(timeout); if it is still running after hedge_after seconds, race a second copy"""
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='hedged-call')
+    try:
+        pending = {executor.submit(attempt, timeout)}
+        done, pending = wait(pending, timeout=hedge_after)
+        hedged = False
+        if not done:
+            pending.add(executor.submit(attempt, max(timeout - hedge_after, 0.001)))
+            hedged = True
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), hedged
+                error = future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    finally:
+        # A losing attempt cannot be interrupted; it finishes (or times out) in the background
+        executor.shutdown(wait=False)
+
+
+def call_with_retries(attempt, policy, breaker=None, deadline=None, attempt_timeout=None, hedge_after=None,
+                      on_retry=None, on_hedge=None, sleep=time.sleep):
+    """
+    Call attempt(timeout) until it succeeds, a non-retryable error is raised, the attempts
+    run out or the deadline leaves no room for another try
+    on_retry(error, delay) is called before each backoff sleep. With hedge_after set, an
+    attempt still running after that many seconds is raced by a second one (on_hedge())
+    """
+    started = time.monotonic()
+    attempt_number = 0
+    while True:
+        attempt_number += 1
+        remaining = None if deadline is None else deadline - (time.monotonic() - started)
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f'Deadline of {deadline}s exceeded after {attempt_number - 1} attempts')
+        limits = [limit for limit in (attempt_timeout, remaining) if limit is not None]
+        timeout = min(limits) if limits else None
+
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            if hedge_after is not None and timeout is not None and hedge_after < timeout:
+                result, hedged = _run_hedged(attempt, timeout, hedge_after)
+                if hedged and on_hedge is not None:
+                    on_hedge()
+            else:
+                result = attempt(timeout)
+        except Exception as error:
+            retryable = is_retryable(error)
+            if breaker is not None:
+                # Errors such as a bad request or an invalid key say nothing about upstream health
+                breaker.record_failure() if retryable else breaker.record_success()
+            if not retryable or attempt_number >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt_number, retry_after_seconds(error))
+            if deadline is not None and time.monotonic() - started + delay >= deadline:
+                raise
+            if on_retry is not None:
+                on_retry(error, delay)
+            sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -7,6 +7,8 @@ const loadingIndicator = document.getElementById('loadingIndicator');
 const resultsSection = document.getElementById('resultsSection');
 const errorMessage = document.getElementById('errorMessage');
 const analyzeAnotherBtn = document.getElementById('analyzeAnotherBtn');
+const loadingMessage = document.getElementById('loadingMessage');
+const streamPreview = document.getElementById('streamPreview');
 
 let selectedFile = null;
 
@@ -100,16 +102,29 @@ async function analyzeChart() {
     formData.append('asset_type', document.getElementById('assetType').value);
     
     try {
-        // Send request to backend
-        const response = await fetch('/api/analyze', {
+        // Stream the analysis so output shows up while the model is still writing
+        let response = await fetch('/api/analyze/stream', {
             method: 'POST',
             body: formData
         });
         
-        const data = await response.json();
+        let data;
+        if ((response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            data = await readAnalysisStream(response);
+        } else if (response.status === 404) {
+            // Streaming is turned off on the server
+            response = await fetch('/api/analyze', {
+                method: 'POST',
+                body: formData
+            });
+            data = await response.json();
+        } else {
+            data = await response.json();
+        }
         
         // Hide loading indicator
         loadingIndicator.style.display = 'none';
+        resetStreamPreview();
         
         if (data.success) {
             displayResults(data.analysis);
@@ -120,12 +135,63 @@ async function analyzeChart() {
         
     } catch (error) {
         loadingIndicator.style.display = 'none';
+        resetStreamPreview();
         showError('Failed to connect to the server. Please check your connection and try again.');
         analyzeBtn.disabled = false;
         console.error('Error:', error);
     }
 }
 
+// Read Server-Sent Events from a streamed analysis; resolves with the final result
+async function readAnalysisStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let payload = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) payload += line.slice(6);
+            });
+            if (!payload) continue;
+            const data = JSON.parse(payload);
+            
+            if (event === 'status') {
+                loadingMessage.textContent = 'Reading your chart...';
+            } else if (event === 'delta') {
+                loadingMessage.textContent = 'Writing the analysis...';
+                streamPreview.style.display = 'block';
+                streamPreview.textContent += data.text;
+                streamPreview.scrollTop = streamPreview.scrollHeight;
+            } else if (event === 'result') {
+                result = data;
+            }
+        }
+    }
+    
+    return result || { success: false, error: 'The analysis stream ended unexpectedly. Please try again.' };
+}
+
+// Clear the partial output shown while streaming
+function resetStreamPreview() {
+    streamPreview.textContent = '';
+    streamPreview.style.display = 'none';
+    loadingMessage.textContent = 'Analyzing your chart... This may take a few moments.';
+}
+
 // Display results function
 function displayResults(analysis) {
     // Market type and confidence
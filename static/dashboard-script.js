@@ -1,6 +1,7 @@
 // Dashboard functionality
+const HISTORY_PAGE_SIZE = 20;
 let currentFilter = 'all';
-let allAnalyses = [];
+let nextCursor = null;
 
 // Load user data on page load
 document.addEventListener('DOMContentLoaded', async () => {
@@ -10,6 +11,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     
     // Set up event listeners
     document.getElementById('logoutBtn').addEventListener('click', handleLogout);
+    document.getElementById('loadMoreBtn').addEventListener('click', () => loadHistory(true));
     
     // Filter buttons
     document.querySelectorAll('.filter-btn').forEach(btn => {
@@ -17,7 +19,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
             e.target.classList.add('active');
             currentFilter = e.target.dataset.filter;
-            filterHistory();
+            loadHistory();
         });
     });
 });
@@ -72,26 +74,47 @@ async function loadStats() {
     }
 }
 
-async function loadHistory() {
+async function loadHistory(append = false) {
     const loadingIndicator = document.getElementById('loadingHistory');
     const noHistory = document.getElementById('noHistory');
     const historyContainer = document.getElementById('historyContainer');
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
     
     loadingIndicator.style.display = 'block';
     noHistory.style.display = 'none';
-    historyContainer.innerHTML = '';
+    loadMoreBtn.style.display = 'none';
+    if (!append) {
+        historyContainer.innerHTML = '';
+        nextCursor = null;
+    }
+    
+    // Filtering and paging happen on the server; the cursor picks up after the last card shown
+    const params = new URLSearchParams({per_page: HISTORY_PAGE_SIZE, cursor: nextCursor || ''});
+    if (currentFilter !== 'all') {
+        params.set('outcome', currentFilter);
+    }
     
     try {
-        const response = await fetch('/api/history?per_page=20');
+        const response = await fetch(`/api/history?${params}`);
         const data = await response.json();
         
         loadingIndicator.style.display = 'none';
         
-        if (data.success && data.analyses.length > 0) {
-            allAnalyses = data.analyses;
-            filterHistory();
-        } else {
+        if (!data.success) {
             noHistory.style.display = 'block';
+            return;
+        }
+        
+        data.analyses.forEach(analysis => {
+            historyContainer.appendChild(createHistoryCard(analysis));
+        });
+        
+        nextCursor = data.next_cursor;
+        loadMoreBtn.style.display = data.has_more ? 'inline-block' : 'none';
+        
+        if (historyContainer.children.length === 0) {
+            noHistory.style.display = 'block';
+            document.querySelector('#noHistory h3').textContent = `No ${currentFilter === 'all' ? '' : currentFilter} analyses`;
         }
     } catch (error) {
         console.error('Error loading history:', error);
@@ -100,31 +123,6 @@ async function loadHistory() {
     }
 }
 
-function filterHistory() {
-    const historyContainer = document.getElementById('historyContainer');
-    const noHistory = document.getElementById('noHistory');
-    
-    let filtered = allAnalyses;
-    if (currentFilter !== 'all') {
-        filtered = allAnalyses.filter(a => a.outcome === currentFilter);
-    }
-    
-    historyContainer.innerHTML = '';
-    
-    if (filtered.length === 0) {
-        noHistory.style.display = 'block';
-        document.querySelector('#noHistory h3').textContent = `No ${currentFilter === 'all' ? '' : currentFilter} analyses`;
-        return;
-    }
-    
-    noHistory.style.display = 'none';
-    
-    filtered.forEach(analysis => {
-        const card = createHistoryCard(analysis);
-        historyContainer.appendChild(card);
-    });
-}
-
 function createHistoryCard(analysis) {
     const card = document.createElement('div');
     card.className = 'history-card';
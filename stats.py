@@ -0,0 +1,62 @@
+"""
+Trading statistics built from grouped aggregate rows
+Both the live GROUP BY over trade_analysis and the user_stats_rollup table produce
+rows of the same shape, so /api/stats is a single query either way
+"""
+
+BREAKDOWN_DIMENSIONS = ('asset_type', 'trading_style', 'risk_profile')
+
+
+class _Bucket:
+    def __init__(self):
+        self.total = 0
+        self.outcomes = {'win': 0, 'loss': 0, 'pending': 0}
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+
+    def add(self, outcome, count, confidence_sum, confidence_count):
+        self.total += count
+        if outcome in self.outcomes:
+            self.outcomes[outcome] += count
+        self.confidence_sum += confidence_sum or 0
+        self.confidence_count += confidence_count or 0
+
+    def to_dict(self):
+        wins = self.outcomes['win']
+        losses = self.outcomes['loss']
+        win_rate = round((wins / (wins + losses)) * 100, 2) if wins + losses > 0 else 0
+        avg_confidence = 0
+        if self.confidence_count:
+            avg_confidence = round(self.confidence_sum / self.confidence_count, 2)
+        return {
+            'total_analyses': self.total,
+            'wins': wins,
+            'losses': losses,
+            'pending': self.outcomes['pending'],
+            'win_rate': win_rate,
+            'avg_confidence': avg_confidence
+        }
+
+
+def summarize_stats(rows):
+    """
+    Fold rows of (asset_type, trading_style, risk_profile, outcome, count,
+    confidence_sum, confidence_count) into overall stats plus per-dimension breakdowns
+    """
+    overall = _Bucket()
+    breakdowns = {dimension: {} for dimension in BREAKDOWN_DIMENSIONS}
+
+    for asset_type, trading_style, risk_profile, outcome, count, confidence_sum, confidence_count in rows:
+        if not count:
+            continue
+        overall.add(outcome, count, confidence_sum, confidence_count)
+        for dimension, value in zip(BREAKDOWN_DIMENSIONS, (asset_type, trading_style, risk_profile)):
+            bucket = breakdowns[dimension].setdefault(value or 'Unknown', _Bucket())
+            bucket.add(outcome, count, confidence_sum, confidence_count)
+
+    stats = overall.to_dict()
+    stats['breakdowns'] = {
+        dimension: {value: bucket.to_dict() for value, bucket in sorted(buckets.items())}
+        for dimension, buckets in breakdowns.items()
+    }
+    return stats
@@ -0,0 +1,184 @@
+"""
+Tests for the content-addressed analysis cache
+Covers key derivation, TTL/LRU behaviour of both backends and cache hits on /api/analyze
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch, MagicMock
+
+from analysis_cache import (
+    AnalysisCache, MemoryCacheBackend, SQLiteCacheBackend, make_cache_key
+)
+from app import app, TradeAnalysis
+from test_support import chart_png, ensure_user, login, run_suite
+
+
+def test_cache_key_depends_on_image_and_parameters():
+    """Test that the key changes with the image bytes and every parameter"""
+    print("Testing cache key derivation...")
+
+    base = make_cache_key(b'chart', 'Day Trade', 'Balanced', 'Crypto', 'gpt-4o')
+    assert base == make_cache_key(b'chart', 'Day Trade', 'Balanced', 'Crypto', 'gpt-4o')
+    assert base != make_cache_key(b'chart2', 'Day Trade', 'Balanced', 'Crypto', 'gpt-4o')
+    assert base != make_cache_key(b'chart', 'Swing', 'Balanced', 'Crypto', 'gpt-4o')
+    assert base != make_cache_key(b'chart', 'Day Trade', 'Aggressive', 'Crypto', 'gpt-4o')
+    assert base != make_cache_key(b'chart', 'Day Trade', 'Balanced', 'Forex', 'gpt-4o')
+    assert base != make_cache_key(b'chart', 'Day Trade', 'Balanced', 'Crypto', 'gpt-4o-mini')
+    assert base != make_cache_key(b'chart', 'Day Trade', 'Balanced', 'Crypto', 'gpt-4o', prompt_version='abc123')
+
+    print("✓ Cache key derivation test passed")
+
+
+def test_memory_backend_ttl_and_lru():
+    """Test TTL expiry, LRU eviction and copy-on-read for the memory backend"""
+    print("\nTesting memory cache backend...")
+
+    cache = AnalysisCache(MemoryCacheBackend(max_entries=2), ttl=60)
+    cache.set('a', {'patterns': ['flag']})
+    cache.set('b', {'patterns': ['triangle']})
+
+    # Touch 'a' so 'b' becomes the least recently used entry
+    assert cache.get('a') == {'patterns': ['flag']}
+    cache.set('c', {'patterns': ['wedge']})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+
+    # Mutating a returned value must not change the cached copy
+    cache.get('c')['patterns'].append('mutated')
+    assert cache.get('c') == {'patterns': ['wedge']}
+
+    cache.ttl = -1
+    cache.set('d', {'patterns': []})
+    assert cache.get('d') is None
+
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert stats['expired'] == 1
+    assert stats['hits'] == 4
+    assert stats['misses'] == 2
+
+    print("✓ Memory cache backend test passed")
+
+
+def test_sqlite_backend_survives_restart():
+    """Test that the SQLite backend persists entries and evicts the least recently used"""
+    print("\nTesting SQLite cache backend...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'cache.db')
+
+        cache = AnalysisCache(SQLiteCacheBackend(path, max_entries=2), ttl=60)
+        cache.set('a', {'confidence_score': 70})
+        time.sleep(0.01)
+        cache.set('b', {'confidence_score': 80})
+        time.sleep(0.01)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.set('c', {'confidence_score': 90})
+
+        # A new backend on the same file sees the surviving entries
+        reopened = AnalysisCache(SQLiteCacheBackend(path, max_entries=2), ttl=60)
+        assert reopened.get('a') == {'confidence_score': 70}
+        assert reopened.get('c') == {'confidence_score': 90}
+        assert reopened.get('b') is None
+        assert reopened.stats()['size'] == 2
+
+    print("✓ SQLite cache backend test passed")
+
+
+def test_sqlite_backend_reconnects_after_fork():
+    """Test that a forked worker opens its own SQLite connection instead of sharing the parent's"""
+    print("\nTesting SQLite cache backend fork safety...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        backend = SQLiteCacheBackend(os.path.join(tmpdir, 'cache.db'))
+        cache = AnalysisCache(backend, ttl=60)
+        cache.set('parent', {'confidence_score': 70})
+        parent_conn = backend._conn
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: report whether it reconnected, then exit without running the parent's cleanup
+            try:
+                os.close(read_fd)
+                cache.set('child', {'confidence_score': 80})
+                reconnected = backend._conn is not parent_conn and backend._pid == os.getpid()
+                os.write(write_fd, b'1' if reconnected and cache.get('parent') else b'0')
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as pipe:
+            child_result = pipe.read()
+        os.waitpid(pid, 0)
+
+        assert child_result == b'1'
+        # The parent keeps its own connection and sees the child's write through the file
+        assert backend._conn is parent_conn
+        assert cache.get('child') == {'confidence_score': 80}
+
+    print("✓ SQLite cache backend fork safety test passed")
+
+
+def test_analyze_cache_hit_skips_openai():
+    """Test that a repeated upload is served from the cache but still recorded"""
+    print("\nTesting /api/analyze cache hits...")
+
+    with app.app_context():
+        user = ensure_user('testuser_cache', 'Cache User', is_premium=True)
+
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = '{"market_type": "Crypto", "patterns": ["flag"], "confidence_score": 70}'
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = mock_response
+
+        with app.test_client() as client, \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients.get_client', return_value=mock_client):
+            login(client, 'testuser_cache')
+
+            before = TradeAnalysis.query.filter_by(user_id=user.id).count()
+            # A unique image per run so earlier runs cannot pre-populate the cache
+            stamp = int(time.time() * 1000)
+            image = chart_png((stamp % 256, (stamp >> 8) % 256, (stamp >> 16) % 256))
+
+            results = []
+            for _ in range(2):
+                data = {
+                    'chart': (io.BytesIO(image), 'chart.png'),
+                    'trading_style': 'Swing',
+                    'risk_profile': 'Balanced',
+                    'asset_type': 'Crypto'
+                }
+                response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+                assert response.status_code == 200
+                results.append(response.get_json())
+
+            assert mock_client.chat.completions.create.call_count == 1
+            assert not results[0].get('cached')
+            assert results[1]['cached'] == True
+            assert results[1]['analysis']['patterns'] == ['flag']
+            assert results[0]['analysis']['analysis_id'] != results[1]['analysis']['analysis_id']
+            assert TradeAnalysis.query.filter_by(user_id=user.id).count() == before + 2
+
+    print("✓ /api/analyze cache hit test passed")
+
+
+def run_tests():
+    """Run all analysis cache tests"""
+    return run_suite('Analysis Cache', [
+        test_cache_key_depends_on_image_and_parameters,
+        test_memory_backend_ttl_and_lru,
+        test_sqlite_backend_survives_restart,
+        test_sqlite_backend_reconnects_after_fork,
+        test_analyze_cache_hit_skips_openai,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
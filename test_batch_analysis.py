@@ -0,0 +1,154 @@
+"""
+Tests for the batch chart analysis endpoint
+"""
+
+import io
+import sys
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from app import app, db, TradeAnalysis, DailyUsage, FREE_USER_DAILY_LIMIT
+from test_support import ensure_user, login, run_suite
+
+
+def charts(count, extension='png'):
+    return [(io.BytesIO(f'chart {i}'.encode()), f'chart{i}.{extension}') for i in range(count)]
+
+
+def post_batch(client, files, **form):
+    return client.post('/api/analyze/batch', data={'chart': files, **form}, content_type='multipart/form-data')
+
+
+def fake_analysis(image_bytes, trading_style, risk_profile, asset_type):
+    if bytes(image_bytes).endswith(b'2'):
+        return {'success': False, 'error': 'upstream failure'}
+    return {'success': True, 'analysis': {'market_type': 'Crypto', 'patterns': ['flag'], 'confidence_score': 60}}
+
+
+def test_partial_success_and_quota_release():
+    """Test per-item results, one transaction for the successes and quota refunds for failures"""
+    print("Testing batch partial success...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_batch', is_premium=True, reset_usage=True).id
+        before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+
+    with app.test_client() as client, patch('app.analyze_chart_with_ai', side_effect=fake_analysis):
+        login(client, 'testuser_batch')
+
+        files = charts(4) + [(io.BytesIO(b'not an image'), 'notes.txt'), (io.BytesIO(b''), 'empty.png')]
+        response = post_batch(client, files, asset_type='Forex')
+        assert response.status_code == 200
+        data = response.get_json()
+
+    assert data['success'] == True
+    assert (data['succeeded'], data['failed']) == (3, 3)
+    results = data['results']
+    assert [r['filename'] for r in results] == ['chart0.png', 'chart1.png', 'chart2.png', 'chart3.png',
+                                                 'notes.txt', 'empty.png']
+    assert [r['status'] for r in results] == [200, 200, 500, 200, 400, 400]
+    assert results[2]['error'] == 'upstream failure'
+    assert all(r['analysis']['analysis_id'] for r in results if r['success'])
+
+    with app.app_context():
+        assert TradeAnalysis.query.filter_by(user_id=user_id).count() == before + 3
+        assert db.session.get(TradeAnalysis, results[0]['analysis']['analysis_id']).asset_type == 'Forex'
+        # Only the three saved analyses count against today
+        assert DailyUsage.get_count(user_id, datetime.utcnow().date()) == 3
+
+    print("✓ Batch partial success test passed")
+
+
+def test_free_tier_limit_cuts_batch():
+    """Test that a free user's batch is trimmed to the remaining daily allowance"""
+    print("\nTesting free-tier limit across a batch...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_batch', is_premium=False, reset_usage=True).id
+        db.session.add(DailyUsage(user_id=user_id, day=datetime.utcnow().date(), analysis_count=2))
+        db.session.commit()
+
+    remaining = FREE_USER_DAILY_LIMIT - 2
+    with app.test_client() as client, patch('app.analyze_chart_with_ai') as mock_analyze:
+        mock_analyze.return_value = {'success': True, 'analysis': {'market_type': 'Crypto'}}
+        login(client, 'testuser_batch')
+
+        data = post_batch(client, charts(remaining + 2)).get_json()
+        assert data['succeeded'] == remaining
+        assert [r['status'] for r in data['results'][remaining:]] == [429, 429]
+        assert mock_analyze.call_count == remaining
+
+        response = post_batch(client, charts(1))
+        assert response.status_code == 429
+
+    with app.app_context():
+        assert DailyUsage.get_count(user_id, datetime.utcnow().date()) == FREE_USER_DAILY_LIMIT
+
+    print("✓ Free-tier batch limit test passed")
+
+
+def test_bounded_concurrency():
+    """Test that charts are analyzed concurrently but never above BATCH_CONCURRENCY"""
+    print("\nTesting batch concurrency...")
+
+    with app.app_context():
+        ensure_user('testuser_batch', is_premium=True, reset_usage=True)
+
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def slow_analysis(*args):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return {'success': True, 'analysis': {'market_type': 'Crypto'}}
+
+    with app.test_client() as client, \
+            patch('app.analyze_chart_with_ai', side_effect=slow_analysis), \
+            patch.dict(app.config, {'BATCH_CONCURRENCY': 3}):
+        login(client, 'testuser_batch')
+        started = time.perf_counter()
+        data = post_batch(client, charts(9)).get_json()
+        elapsed = time.perf_counter() - started
+
+    assert data['succeeded'] == 9
+    assert state['peak'] == 3
+    # Three waves of 50ms rather than nine
+    assert elapsed < 0.4, elapsed
+
+    print("✓ Batch concurrency test passed")
+
+
+def test_batch_size_limit():
+    """Test that oversized batches are rejected before any work"""
+    print("\nTesting batch size limit...")
+
+    with app.app_context():
+        ensure_user('testuser_batch', is_premium=False, reset_usage=True)
+
+    with app.test_client() as client, patch.dict(app.config, {'BATCH_MAX_FILES': 2}):
+        login(client, 'testuser_batch')
+        assert post_batch(client, charts(3)).status_code == 400
+        assert client.post('/api/analyze/batch', data={}, content_type='multipart/form-data').status_code == 400
+
+    print("✓ Batch size limit test passed")
+
+
+def run_tests():
+    """Run all batch analysis tests"""
+    return run_suite('Batch Analysis', [
+        test_partial_success_and_quota_release,
+        test_free_tier_limit_cuts_batch,
+        test_bounded_concurrency,
+        test_batch_size_limit,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
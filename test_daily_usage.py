@@ -0,0 +1,127 @@
+"""
+Tests for the per-user daily usage counter behind the free-tier quota
+"""
+
+import io
+import sys
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app import (
+    app, db, User, TradeAnalysis, DailyUsage, FREE_USER_DAILY_LIMIT, backfill_daily_usage
+)
+from test_support import ensure_user, login, run_suite
+
+
+def test_reserve_stops_at_limit():
+    """Test that reservations stop at the free-tier limit and can be released"""
+    print("Testing daily usage reservations...")
+
+    with app.app_context():
+        user = ensure_user('testuser_usage', is_premium=False, reset_usage=True)
+        days = [user.reserve_analysis() for _ in range(FREE_USER_DAILY_LIMIT)]
+        assert all(day == datetime.utcnow().date() for day in days)
+        assert user.reserve_analysis() is None
+        assert user.get_today_analysis_count() == FREE_USER_DAILY_LIMIT
+        assert not user.can_analyze()
+
+        user.release_analysis(days[0])
+        assert user.get_today_analysis_count() == FREE_USER_DAILY_LIMIT - 1
+        assert user.can_analyze()
+
+    print("✓ Daily usage reservation test passed")
+
+
+def test_concurrent_reservations_respect_limit():
+    """Test that concurrent reservations never exceed the limit"""
+    print("\nTesting concurrent reservations...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_usage', is_premium=False, reset_usage=True).id
+
+    granted = []
+
+    def reserve():
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            if user.reserve_analysis() is not None:
+                granted.append(1)
+
+    threads = [threading.Thread(target=reserve) for _ in range(FREE_USER_DAILY_LIMIT * 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert len(granted) == FREE_USER_DAILY_LIMIT, f"Granted {len(granted)} slots"
+        assert DailyUsage.get_count(user_id, datetime.utcnow().date()) == FREE_USER_DAILY_LIMIT
+
+    print("✓ Concurrent reservation test passed")
+
+
+def test_failed_analysis_releases_slot():
+    """Test that /api/analyze gives the slot back when the analysis fails"""
+    print("\nTesting slot release on failed analysis...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_usage', is_premium=False, reset_usage=True).id
+
+    with app.test_client() as client, patch('app.analyze_chart_with_ai') as mock_analyze:
+        login(client, 'testuser_usage')
+
+        mock_analyze.return_value = {'success': False, 'error': 'upstream failure'}
+        data = {'chart': (io.BytesIO(b'fake image data'), 'chart.png')}
+        response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+        assert response.status_code == 500
+
+        mock_analyze.return_value = {'success': True, 'analysis': {'market_type': 'Crypto'}}
+        data = {'chart': (io.BytesIO(b'fake image data'), 'chart.png')}
+        response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+
+        user_info = client.get('/api/user').get_json()['user']
+        assert user_info['analyses_today'] == 1
+        assert user_info['can_analyze'] == True
+
+    with app.app_context():
+        assert DailyUsage.get_count(user_id, datetime.utcnow().date()) == 1
+
+    print("✓ Slot release test passed")
+
+
+def test_backfill_from_trade_analyses():
+    """Test rebuilding counters from existing TradeAnalysis rows"""
+    print("\nTesting daily usage backfill...")
+
+    with app.app_context():
+        user = ensure_user('testuser_backfill', is_premium=False, reset_usage=True)
+        TradeAnalysis.query.filter_by(user_id=user.id).delete()
+        now = datetime.utcnow()
+        for created_at in (now, now, now - timedelta(days=1)):
+            db.session.add(TradeAnalysis(user_id=user.id, outcome='pending', created_at=created_at))
+        db.session.commit()
+
+        backfill_daily_usage()
+
+        assert DailyUsage.get_count(user.id, now.date()) == 2
+        assert DailyUsage.get_count(user.id, (now - timedelta(days=1)).date()) == 1
+        assert user.get_today_analysis_count() == 2
+
+    print("✓ Daily usage backfill test passed")
+
+
+def run_tests():
+    """Run all daily usage tests"""
+    return run_suite('Daily Usage', [
+        test_reserve_stops_at_limit,
+        test_concurrent_reservations_respect_limit,
+        test_failed_analysis_releases_slot,
+        test_backfill_from_trade_analyses,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,134 @@
+"""
+Tests for the database engine settings: pool options per backend, SQLite pragmas and
+concurrent analysis writes alongside history reads
+"""
+
+import sys
+import threading
+
+from sqlalchemy import text
+
+from db_engine import engine_options, sqlite_pragmas
+from app import app, db, TradeAnalysis, rate_limiter, save_trade_analysis
+from test_support import scrape_metrics, ensure_user, login, run_suite
+
+WRITERS = 6
+WRITES_PER_THREAD = 5
+READERS = 4
+
+ANALYSIS = {
+    'market_type': 'Crypto',
+    'patterns': ['Bull Flag'],
+    'indicators': ['RSI'],
+    'trade_setup': {'direction': 'Long', 'entry': '100', 'stop_loss': '95', 'take_profit': ['110']},
+    'pattern_explanation': 'Concurrency test',
+    'reasoning': 'Concurrency test',
+    'confidence_score': 60,
+    'risk_factors': []
+}
+
+
+def test_engine_options():
+    """Test pool options and pragma validation"""
+    print("Testing engine options...")
+
+    assert engine_options('sqlite://') == {}
+    assert engine_options('sqlite:///:memory:') == {}
+    options = engine_options('sqlite:///trading_system.db', pool_size=3, max_overflow=2, pool_timeout=7)
+    assert options == {'pool_size': 3, 'max_overflow': 2, 'pool_timeout': 7}
+    options = engine_options('postgresql://user:pw@db/trading', pool_recycle=600, pool_pre_ping=False)
+    assert options['pool_recycle'] == 600 and options['pool_pre_ping'] is False
+
+    pragmas = sqlite_pragmas(journal_mode='wal', synchronous='full', busy_timeout=250, mmap_size=0)
+    assert pragmas[0] == 'PRAGMA busy_timeout=250'
+    assert 'PRAGMA journal_mode=WAL' in pragmas and 'PRAGMA synchronous=FULL' in pragmas
+    for bad in ({'journal_mode': 'fast'}, {'synchronous': 'sometimes'}):
+        try:
+            sqlite_pragmas(**bad)
+            assert False, f'{bad} should be rejected'
+        except ValueError:
+            pass
+
+    print("✓ Engine options test passed")
+
+
+def test_sqlite_pragmas_applied():
+    """Test that every pooled connection carries the configured pragmas"""
+    print("\nTesting SQLite pragmas...")
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.execute(text('PRAGMA journal_mode')).scalar().upper() == app.config['SQLITE_JOURNAL_MODE']
+            assert connection.execute(text('PRAGMA busy_timeout')).scalar() == app.config['SQLITE_BUSY_TIMEOUT']
+            # NORMAL is reported as 1
+            assert connection.execute(text('PRAGMA synchronous')).scalar() == 1
+
+    with app.test_client() as client:
+        scraped = scrape_metrics(client).get_data(as_text=True)
+        assert f'db_pool_size{{bind="primary"}} {app.config["DB_POOL_SIZE"]}' in scraped
+        assert 'db_pool_connections{bind="primary",state="checked_out"}' in scraped
+
+    print("✓ SQLite pragmas test passed")
+
+
+def test_concurrent_writes_and_reads():
+    """Test that parallel analysis saves and history reads finish without lock errors"""
+    print("\nTesting concurrent writes and reads...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_db').id
+        before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+
+    errors = []
+    writers_done = threading.Event()
+
+    def writer():
+        try:
+            with app.app_context():
+                for _ in range(WRITES_PER_THREAD):
+                    save_trade_analysis(user_id, dict(ANALYSIS), 'Day Trade', 'Balanced', 'Crypto')
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            with app.test_client() as client:
+                login(client, 'testuser_db')
+                while not writers_done.is_set():
+                    response = client.get('/api/history?per_page=5')
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                        return
+        except Exception as e:
+            errors.append(e)
+
+    rate_limiter.reset()
+    readers = [threading.Thread(target=reader) for _ in range(READERS)]
+    writers = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors, errors
+    with app.app_context():
+        assert TradeAnalysis.query.filter_by(user_id=user_id).count() == before + WRITERS * WRITES_PER_THREAD
+
+    print("✓ Concurrent writes and reads test passed")
+
+
+def run_tests():
+    """Run all database engine tests"""
+    return run_suite('Database Engine', [
+        test_engine_options,
+        test_sqlite_pragmas_applied,
+        test_concurrent_writes_and_reads,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,226 @@
+"""
+Tests for /api/history pagination and filters
+"""
+
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from pagination import InvalidCursorError, decode_cursor, encode_cursor
+from pattern_tags import normalize_pattern_tag
+from app import app, db, TradeAnalysis, AnalysisPattern, save_trade_analysis
+from test_support import ensure_user, login, run_suite
+
+
+def setup_history_user():
+    """Create a user with 25 analyses, three of them sharing one timestamp"""
+    user = ensure_user('testuser_history')
+    AnalysisPattern.query.filter_by(user_id=user.id).delete()
+    TradeAnalysis.query.filter_by(user_id=user.id).delete()
+
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    for i in range(25):
+        # Ties on created_at must still page in a stable order
+        created_at = start if i < 3 else start + timedelta(days=i)
+        db.session.add(TradeAnalysis(
+            user_id=user.id,
+            asset_type='Crypto' if i % 2 else 'Forex',
+            outcome=['win', 'loss', 'pending'][i % 3],
+            reasoning='x' * 2000,
+            patterns=['Double Bottom'],
+            take_profit=['101.5'],
+            created_at=created_at
+        ))
+    db.session.commit()
+    return user
+
+
+def test_cursor_round_trip():
+    """Test that cursors decode to what was encoded and reject tampering"""
+    print("Testing cursor encoding...")
+
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+    for bad in ('not-a-cursor', encode_cursor(created_at, 42)[:-3], 'W10'):
+        try:
+            decode_cursor(bad)
+            assert False, f"{bad} should be rejected"
+        except InvalidCursorError:
+            pass
+
+    print("✓ Cursor encoding test passed")
+
+
+def test_cursor_pages_cover_history_once():
+    """Test that following next_cursor returns every analysis exactly once, newest first"""
+    print("\nTesting cursor pagination...")
+
+    with app.app_context():
+        user = setup_history_user()
+        expected = [a.id for a in TradeAnalysis.query.filter_by(user_id=user.id)
+                    .order_by(TradeAnalysis.created_at.desc(), TradeAnalysis.id.desc())]
+
+    with app.test_client() as client:
+        login(client, 'testuser_history')
+        seen = []
+        cursor = ''
+        while True:
+            data = client.get(f'/api/history?per_page=7&cursor={cursor}').get_json()
+            assert data['success'] == True
+            assert 'total' not in data
+            seen.extend(a['id'] for a in data['analyses'])
+            if not data['has_more']:
+                assert data['next_cursor'] is None
+                break
+            cursor = data['next_cursor']
+
+        assert seen == expected
+
+        data = client.get('/api/history?per_page=10&cursor=&include_total=true').get_json()
+        assert data['total'] == 25
+
+        response = client.get('/api/history?cursor=garbage')
+        assert response.status_code == 400
+
+    print("✓ Cursor pagination test passed")
+
+
+def test_filters_and_page_size_cap():
+    """Test server-side filters and the per_page cap in both modes"""
+    print("\nTesting history filters...")
+
+    with app.app_context():
+        setup_history_user()
+
+    with app.test_client() as client, patch.dict(app.config, {'HISTORY_MAX_PER_PAGE': 5}):
+        login(client, 'testuser_history')
+
+        data = client.get('/api/history?per_page=1000').get_json()
+        assert data['per_page'] == 5
+        assert len(data['analyses']) == 5
+        assert data['total'] == 25
+        assert data['pages'] == 5
+
+        data = client.get('/api/history?outcome=win&cursor=').get_json()
+        assert data['analyses'] and all(a['outcome'] == 'win' for a in data['analyses'])
+
+        data = client.get('/api/history?asset_type=Crypto&outcome=loss&include_total=true&cursor=').get_json()
+        assert all(a['asset_type'] == 'Crypto' and a['outcome'] == 'loss' for a in data['analyses'])
+
+        # A bare date_to includes the whole day
+        data = client.get('/api/history?date_from=2024-03-01&date_to=2024-03-04').get_json()
+        assert data['total'] == 4
+        assert all(a['created_at'] < '2024-03-05' for a in data['analyses'])
+
+        data = client.get('/api/history?page=2&include_total=false').get_json()
+        assert len(data['analyses']) == 5
+        assert 'total' not in data
+
+        assert client.get('/api/history?outcome=maybe').status_code == 400
+        assert client.get('/api/history?date_from=yesterday').status_code == 400
+
+    print("✓ History filter test passed")
+
+
+def test_sparse_fieldsets():
+    """Test that fields= trims responses and history never selects the long text columns"""
+    print("\nTesting sparse fieldsets...")
+
+    with app.app_context():
+        setup_history_user()
+        engine = db.engine
+
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM trade_analysis' in statement:
+            statements.append(statement)
+
+    with app.test_client() as client:
+        login(client, 'testuser_history')
+
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        try:
+            data = client.get('/api/history?cursor=&per_page=5').get_json()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_execute)
+        assert data['analyses'][0]['take_profit'] == ['101.5']
+        assert 'reasoning' not in data['analyses'][0]
+        assert len(statements) == 1
+        assert 'reasoning' not in statements[0] and 'pattern_explanation' not in statements[0]
+
+        data = client.get('/api/history?fields=outcome,confidence_score').get_json()
+        assert set(data['analyses'][0]) == {'id', 'outcome', 'confidence_score'}
+
+        analysis_id = data['analyses'][0]['id']
+        data = client.get(f'/api/analysis/{analysis_id}').get_json()
+        assert data['analysis']['reasoning'] == 'x' * 2000
+        assert data['analysis']['patterns'] == ['Double Bottom']
+
+        data = client.get(f'/api/analysis/{analysis_id}?fields=patterns,created_at').get_json()
+        assert set(data['analysis']) == {'id', 'patterns', 'created_at'}
+
+        assert client.get('/api/history?fields=password_hash').status_code == 400
+        assert client.get(f'/api/analysis/{analysis_id}?fields=user_id').status_code == 400
+
+    print("✓ Sparse fieldset test passed")
+
+
+def test_pattern_search():
+    """Test that pattern tags are stored on save and drive the pattern filter"""
+    print("\nTesting pattern search...")
+
+    assert normalize_pattern_tag('Head & Shoulders') == 'head-and-shoulders'
+    assert normalize_pattern_tag('  head and shoulders ') == 'head-and-shoulders'
+    assert normalize_pattern_tag('') is None
+    assert normalize_pattern_tag(None) is None
+
+    with app.app_context():
+        user = setup_history_user()
+        for patterns in (['Head and Shoulders', 'Flag'], ['head & shoulders'], ['Triangle'], None):
+            save_trade_analysis(user.id, {'patterns': patterns, 'trade_setup': {'take_profit': ['1.1']}},
+                                'Day Trading', 'Moderate', 'Forex')
+
+        saved = TradeAnalysis.query.filter_by(user_id=user.id, asset_type='Forex', trading_style='Day Trading')\
+            .order_by(TradeAnalysis.id).all()
+        assert saved[0].patterns == ['Head and Shoulders', 'Flag']
+        assert saved[0].take_profit == ['1.1']
+        assert saved[-1].patterns is None
+
+    with app.test_client() as client:
+        login(client, 'testuser_history')
+
+        data = client.get('/api/history?pattern=Head and Shoulders&include_total=true&cursor=').get_json()
+        assert data['total'] == 2
+        assert {a['id'] for a in data['analyses']} == {saved[0].id, saved[1].id}
+
+        data = client.get('/api/history?pattern=wedge').get_json()
+        assert data['total'] == 0
+
+        patterns = client.get('/api/patterns').get_json()['patterns']
+        assert patterns[0] == {'tag': 'head-and-shoulders', 'count': 2}
+        assert {p['tag'] for p in patterns} == {'head-and-shoulders', 'flag', 'triangle'}
+
+        data = client.get(f'/api/analysis/{saved[-1].id}?fields=patterns').get_json()
+        assert data['analysis']['patterns'] == []
+
+    print("✓ Pattern search test passed")
+
+
+def run_tests():
+    """Run all history tests"""
+    return run_suite('History', [
+        test_cursor_round_trip,
+        test_cursor_pages_cover_history_once,
+        test_filters_and_page_size_cap,
+        test_sparse_fieldsets,
+        test_pattern_search,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
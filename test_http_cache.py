@@ -0,0 +1,156 @@
+"""
+Tests for ETag/conditional GET support and content-hashed static assets
+"""
+
+import os
+import re
+import sys
+import tempfile
+
+from http_cache import IMMUTABLE_ASSET, StaticAssets
+from app import app, save_trade_analysis, static_assets
+from test_support import ensure_user, login, run_suite
+
+
+def test_detail_conditional_get():
+    """Test 304 for an unchanged analysis and a new ETag after an outcome update"""
+    print("Testing conditional GET on analysis detail...")
+
+    with app.app_context():
+        user = ensure_user('testuser_http_cache')
+        analysis_id = save_trade_analysis(user.id, {'reasoning': 'range breakout ' * 100},
+                                          'Day Trading', 'Moderate', 'Forex').id
+
+    with app.test_client() as client:
+        login(client, 'testuser_http_cache')
+
+        response = client.get(f'/api/analysis/{analysis_id}')
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert not etag.startswith('W/')
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        assert 'Last-Modified' in response.headers
+
+        response = client.get(f'/api/analysis/{analysis_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+
+        # Other field sets are different representations
+        response = client.get(f'/api/analysis/{analysis_id}?fields=outcome', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+        # Compressed responses carry the weak form, which still validates
+        response = client.get(f'/api/analysis/{analysis_id}', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['ETag'] == f'W/{etag}'
+        response = client.get(f'/api/analysis/{analysis_id}', headers={'If-None-Match': f'W/{etag}'})
+        assert response.status_code == 304
+
+        client.put(f'/api/analysis/{analysis_id}/outcome', json={'outcome': 'win'})
+        response = client.get(f'/api/analysis/{analysis_id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert response.get_json()['analysis']['outcome'] == 'win'
+
+    print("✓ Analysis detail conditional GET test passed")
+
+
+def test_history_and_stats_etags():
+    """Test that history and stats validators change when the user's analyses do"""
+    print("\nTesting history and stats ETags...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_http_cache').id
+
+    with app.test_client() as client:
+        login(client, 'testuser_http_cache')
+
+        etags = {}
+        for url in ('/api/history?cursor=', '/api/stats', '/api/patterns'):
+            response = client.get(url)
+            etags[url] = response.headers['ETag']
+            assert client.get(url, headers={'If-None-Match': etags[url]}).status_code == 304
+
+        # A different query is a different representation
+        response = client.get('/api/history?cursor=&outcome=win', headers={'If-None-Match': etags['/api/history?cursor=']})
+        assert response.status_code == 200
+
+        with app.app_context():
+            save_trade_analysis(user_id, {'patterns': ['wedge']}, 'Day Trading', 'Moderate', 'Forex')
+
+        for url, etag in etags.items():
+            response = client.get(url, headers={'If-None-Match': etag})
+            assert response.status_code == 200, url
+            assert response.headers['ETag'] != etag
+
+    print("✓ History and stats ETag test passed")
+
+
+def test_pages_use_hashed_assets():
+    """Test that pages link versioned assets, revalidate with 304 and hashed assets are immutable"""
+    print("\nTesting content-hashed static assets...")
+
+    with app.test_client() as client:
+        response = client.get('/login')
+        html = response.get_data(as_text=True)
+        assert response.headers['Cache-Control'] == 'no-cache'
+        match = re.search(r'href="(/auth-styles\.css\?v=([0-9a-f]{12}))"', html)
+        assert match, html[:500]
+        # References to files that do not exist are left as they were
+        assert 'src="auth-script.js"' in html
+
+        assert client.get('/login', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+        asset = client.get(match.group(1))
+        assert asset.status_code == 200
+        assert asset.headers['Cache-Control'] == IMMUTABLE_ASSET
+        asset.close()
+
+        stale = client.get('/auth-styles.css?v=000000000000')
+        assert stale.headers.get('Cache-Control') != IMMUTABLE_ASSET
+        stale.close()
+
+    assert static_assets.url('auth-styles.css') == match.group(1)
+
+    print("✓ Content-hashed static asset test passed")
+
+
+def test_asset_hash_follows_file_changes():
+    """Test that editing an asset changes the URL embedded in pages"""
+    print("\nTesting asset hash refresh...")
+
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, 'page.html'), 'w') as f:
+            f.write('<link rel="stylesheet" href="site.css"><script src="https://cdn.example.com/x.js"></script>')
+        css = os.path.join(folder, 'site.css')
+        with open(css, 'w') as f:
+            f.write('body { color: red; }')
+
+        assets = StaticAssets(folder)
+        first, first_etag = assets.render_page('page.html')
+        assert b'https://cdn.example.com/x.js' in first
+
+        with open(css, 'w') as f:
+            f.write('body { color: blue; }')
+        os.utime(css, ns=(os.stat(css).st_atime_ns, os.stat(css).st_mtime_ns + 1_000_000))
+
+        second, second_etag = assets.render_page('page.html')
+        assert first != second
+        assert first_etag != second_etag
+
+    print("✓ Asset hash refresh test passed")
+
+
+def run_tests():
+    """Run all HTTP caching tests"""
+    return run_suite('HTTP Caching', [
+        test_detail_conditional_get,
+        test_history_and_stats_etags,
+        test_pages_use_hashed_assets,
+        test_asset_hash_follows_file_changes,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,180 @@
+"""
+Tests for the identity cache behind Flask-Login's load_user
+"""
+
+import sys
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from identity_cache import IdentityCache
+from app import app, db, User, load_user, user_identity_cache
+from test_support import PASSWORD, ensure_user, login, run_suite
+
+
+def setup_identity_user():
+    """The identity test user with the name and plan the tests change put back"""
+    user = ensure_user('testuser_identity', is_premium=False)
+    user.full_name = 'Identity User'
+    db.session.commit()
+    return user.id
+
+
+@contextmanager
+def count_user_queries():
+    """Count SELECTs against the user table while the block runs"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM user' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_ttl_and_lru():
+    """Test expiry, size bound, invalidation and counters"""
+    print("Testing identity cache bookkeeping...")
+
+    now = [0.0]
+    cache = IdentityCache(ttl=30, max_entries=2, clock=lambda: now[0])
+    cache.set(1, {'id': 1, 'is_premium': False})
+    cache.set(2, {'id': 2, 'is_premium': True})
+    assert cache.get(1) == {'id': 1, 'is_premium': False}
+
+    # User 2 is least recently used and goes first
+    cache.set(3, {'id': 3})
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+    now[0] = 31
+    assert cache.get(3) is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired'], stats['invalidations'], stats['evictions']) == \
+        (2, 3, 1, 1, 1)
+    assert stats['size'] == 0
+
+    assert not IdentityCache(ttl=0).enabled
+
+    # A snapshot read before an invalidation is not cached after it
+    cache = IdentityCache(ttl=30, max_entries=2)
+    token = cache.generation(1)
+    cache.invalidate(1)
+    cache.set(1, {'id': 1, 'is_premium': False}, token)
+    assert cache.get(1) is None
+    cache.set(1, {'id': 1, 'is_premium': True}, cache.generation(1))
+    assert cache.get(1) == {'id': 1, 'is_premium': True}
+    # Pruning the generation map still outdates older tokens
+    token = cache.generation(5)
+    for user_id in (2, 3, 4):
+        cache.invalidate(user_id)
+    cache.set(5, {'id': 5}, token)
+    assert cache.get(5) is None and cache.stats()['stale_skipped'] == 2
+
+    print("✓ Identity cache bookkeeping test passed")
+
+
+def test_authenticated_requests_skip_user_query():
+    """Test that repeated requests from a logged-in user do not query the user table"""
+    print("\nTesting cached load_user...")
+
+    with app.app_context():
+        user_id = setup_identity_user()
+    user_identity_cache.clear()
+
+    with app.test_client() as client:
+        login(client, 'testuser_identity')
+
+        with count_user_queries() as first:
+            assert client.get('/api/user').get_json()['user']['id'] == user_id
+        hits = user_identity_cache.stats()['hits']
+        with count_user_queries() as second:
+            for _ in range(5):
+                data = client.get('/api/user').get_json()['user']
+        assert len(first) == 1
+        assert second == []
+        assert user_identity_cache.stats()['hits'] == hits + 5
+        assert (data['username'], data['email'], data['full_name']) == \
+            ('testuser_identity', 'test_identity@example.com', 'Identity User')
+
+        # Disabled cache: one lookup per request again
+        with patch.object(user_identity_cache, 'ttl', 0):
+            with count_user_queries() as uncached:
+                client.get('/api/user')
+                client.get('/api/user')
+            assert len(uncached) == 2
+
+    # The cached copy is attached to the session; other columns load on first access
+    with app.test_request_context():
+        user = load_user(str(user_id))
+        assert user in db.session
+        assert user.check_password(PASSWORD)
+        assert isinstance(user.analyses_version, int)
+        assert load_user('not-a-number') is None
+        assert load_user('999999') is None
+
+    print("✓ Cached load_user test passed")
+
+
+def test_profile_changes_invalidate():
+    """Test that premium and profile changes are visible on the next request"""
+    print("\nTesting identity cache invalidation...")
+
+    with app.app_context():
+        user_id = setup_identity_user()
+
+    with app.test_client() as client:
+        login(client, 'testuser_identity')
+        assert client.get('/api/user').get_json()['user']['is_premium'] == False
+        assert user_identity_cache.get(user_id) is not None
+
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            user.is_premium = True
+            user.full_name = 'Premium Identity'
+            db.session.commit()
+        assert user_identity_cache.get(user_id) is None
+
+        data = client.get('/api/user').get_json()['user']
+        assert data['is_premium'] == True
+        assert data['daily_limit'] == 'Unlimited'
+        assert data['full_name'] == 'Premium Identity'
+
+        # A load that read the row before a concurrent update committed must not cache it
+        with app.app_context():
+            token = user_identity_cache.generation(user_id)
+            stale = {'id': user_id, 'username': 'testuser_identity', 'is_premium': True}
+            user = db.session.get(User, user_id)
+            user.is_premium = False
+            db.session.commit()
+            user_identity_cache.set(user_id, stale, token)
+        assert user_identity_cache.get(user_id) is None
+        assert client.get('/api/user').get_json()['user']['is_premium'] == False
+
+    with app.app_context():
+        setup_identity_user()
+
+    print("✓ Identity cache invalidation test passed")
+
+
+def run_tests():
+    """Run all identity cache tests"""
+    return run_suite('Identity Cache', [
+        test_ttl_and_lru,
+        test_authenticated_requests_skip_user_query,
+        test_profile_changes_invalidate,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
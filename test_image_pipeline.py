@@ -0,0 +1,133 @@
+"""
+Tests for chart image preprocessing
+Checks downscaling, metadata stripping, MIME type selection and stage timings
+"""
+
+import io
+import sys
+from unittest.mock import patch
+
+from PIL import Image, ImageDraw
+
+from image_pipeline import (
+    ImagePipelineStats, ImagePreprocessingError, detect_mime_type, preprocess_image, target_size
+)
+from test_support import run_suite
+
+
+def make_image(size, fmt='PNG', mode='RGB', **save_kwargs):
+    """Render a simple striped test chart"""
+    image = Image.new(mode, size, 'white')
+    draw = ImageDraw.Draw(image)
+    for x in range(0, size[0], 16):
+        draw.line([(x, 0), (x, size[1])], fill=(30, 120, 200))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **save_kwargs)
+    return buffer.getvalue()
+
+
+def test_target_size():
+    """Test the model-equivalent size calculation"""
+    print("Testing target size calculation...")
+
+    assert target_size(3840, 2160) == (1365, 768)
+    assert target_size(4000, 1000) == (2048, 512)
+    assert target_size(800, 600) == (800, 600)
+    assert target_size(500, 300) == (500, 300)
+
+    print("✓ Target size test passed")
+
+
+def test_large_chart_is_downscaled_and_reencoded():
+    """Test that a 4K screenshot is shrunk and re-encoded as WEBP"""
+    print("\nTesting large chart preprocessing...")
+
+    original = make_image((3840, 2160))
+    prepared = preprocess_image(original, output_format='webp', quality=80)
+
+    assert (prepared.width, prepared.height) == (1365, 768)
+    assert prepared.mime_type == 'image/webp'
+    assert prepared.original_bytes == len(original)
+    assert prepared.bytes_saved > 0
+    assert set(prepared.timings) == {'decode', 'resize', 'encode'}
+    assert Image.open(io.BytesIO(prepared.data)).format == 'WEBP'
+
+    print("✓ Large chart preprocessing test passed")
+
+
+def test_metadata_is_stripped_and_alpha_flattened_for_jpeg():
+    """Test that EXIF is dropped and transparent PNGs become valid JPEGs"""
+    print("\nTesting metadata stripping...")
+
+    exif = Image.Exif()
+    exif[0x010E] = 'secret description'
+    original = make_image((900, 600), fmt='JPEG', exif=exif.tobytes())
+    assert 'exif' in Image.open(io.BytesIO(original)).info
+
+    prepared = preprocess_image(original, output_format='jpeg')
+    assert prepared.mime_type == 'image/jpeg'
+    assert 'exif' not in Image.open(io.BytesIO(prepared.data)).info
+
+    transparent = make_image((1200, 900), mode='RGBA')
+    prepared = preprocess_image(transparent, output_format='jpeg')
+    assert Image.open(io.BytesIO(prepared.data)).mode == 'RGB'
+
+    print("✓ Metadata stripping test passed")
+
+
+def test_small_clean_image_passes_through():
+    """Test that a small image is kept when re-encoding would not make it smaller"""
+    print("\nTesting small image passthrough...")
+
+    original = make_image((32, 32), fmt='PNG')
+    prepared = preprocess_image(original, output_format='png')
+    assert prepared.data == original
+    assert prepared.mime_type == 'image/png'
+
+    print("✓ Small image passthrough test passed")
+
+
+def test_invalid_image_and_stats():
+    """Test undecodable input and the aggregated pipeline stats"""
+    print("\nTesting invalid input and pipeline stats...")
+
+    try:
+        preprocess_image(b'not an image')
+        assert False, "Expected ImagePreprocessingError"
+    except ImagePreprocessingError:
+        pass
+
+    # A pixel count past Pillow's decompression bomb limit is a bad upload, not a server error
+    bomb = make_image((64, 64))
+    with patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+        try:
+            preprocess_image(bomb)
+            assert False, "Expected ImagePreprocessingError for a decompression bomb"
+        except ImagePreprocessingError:
+            pass
+        assert detect_mime_type(bomb, default='image/jpeg') == 'image/jpeg'
+
+    stats = ImagePipelineStats()
+    stats.record(preprocess_image(make_image((3000, 2000))))
+    summary = stats.stats()
+    assert summary['images'] == 1
+    assert summary['bytes_saved'] == summary['bytes_in'] - summary['bytes_out']
+    assert set(summary['avg_stage_ms']) == {'decode', 'resize', 'encode'}
+
+    print("✓ Invalid input and pipeline stats test passed")
+
+
+def run_tests():
+    """Run all image pipeline tests"""
+    return run_suite('Image Pipeline', [
+        test_target_size,
+        test_large_chart_is_downscaled_and_reencoded,
+        test_metadata_is_stripped_and_alpha_flattened_for_jpeg,
+        test_small_clean_image_passes_through,
+        test_invalid_image_and_stats,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,158 @@
+"""
+Tests for the async analysis job queue
+Uses the local in-process backend, so no external broker is needed
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+from job_queue import LocalJobQueue, QueueFullError
+from app import app, TradeAnalysis
+from test_support import ensure_user, login, run_suite
+
+
+def wait_for_job(job, timeout=5):
+    """Wait until a job reaches a finished state"""
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        job.wait_for_change(job.version, timeout=0.1)
+    return job
+
+
+def test_queue_runs_jobs_and_reports_failures():
+    """Test that workers complete successful jobs and mark failed ones"""
+    print("Testing job queue workers...")
+
+    def handler(job):
+        if job.payload == 'boom':
+            raise RuntimeError('boom')
+        if job.payload == 'error':
+            return {'success': False, 'error': 'bad chart'}
+        return {'success': True, 'analysis': {'value': job.payload}}
+
+    jobs = LocalJobQueue(handler, workers=2, max_queue=10)
+    try:
+        ok = wait_for_job(jobs.submit(1, 'ok'))
+        error = wait_for_job(jobs.submit(1, 'error'))
+        boom = wait_for_job(jobs.submit(1, 'boom'))
+
+        assert ok.status == 'completed'
+        assert ok.result['analysis'] == {'value': 'ok'}
+        assert error.status == 'failed' and error.error == 'bad chart'
+        assert boom.status == 'failed' and boom.error
+        assert jobs.get(ok.id) is ok
+        assert jobs.stats()['jobs']['completed'] == 1
+    finally:
+        jobs.shutdown()
+
+    print("✓ Job queue worker test passed")
+
+
+def test_queue_depth_limit():
+    """Test that submissions beyond the queue depth raise QueueFullError"""
+    print("\nTesting job queue backpressure...")
+
+    release = threading.Event()
+
+    def handler(job):
+        release.wait(5)
+        return {'success': True}
+
+    jobs = LocalJobQueue(handler, workers=1, max_queue=2)
+    try:
+        first = jobs.submit(1, None)
+        # Wait for the single worker to pick up the first job so the queue is empty
+        while first.status != 'running':
+            first.wait_for_change(first.version, timeout=0.1)
+        jobs.submit(1, None)
+        jobs.submit(1, None)
+
+        try:
+            jobs.submit(1, None)
+            assert False, "Expected QueueFullError"
+        except QueueFullError:
+            pass
+    finally:
+        release.set()
+        jobs.shutdown()
+
+    print("✓ Job queue backpressure test passed")
+
+
+def test_async_analyze_endpoint():
+    """Test the async mode of /api/analyze with polling and SSE"""
+    print("\nTesting async /api/analyze...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_jobs', is_premium=True).id
+
+        with app.test_client() as client, patch('app.analyze_chart_with_ai') as mock_analyze:
+            mock_analyze.return_value = {
+                'success': True,
+                'analysis': {'market_type': 'Crypto', 'patterns': ['flag'], 'confidence_score': 65}
+            }
+            login(client, 'testuser_jobs')
+            before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+
+            data = {'chart': (io.BytesIO(b'fake image data'), 'chart.png'), 'async': 'true'}
+            response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+            assert response.status_code == 202, f"Expected 202, got {response.status_code}"
+            job_id = response.get_json()['job_id']
+
+            # SSE stream ends with the final status event
+            response = client.get(f'/api/analysis/jobs/{job_id}/events')
+            assert response.mimetype == 'text/event-stream'
+            events = [
+                json.loads(line[len('data: '):])
+                for line in response.get_data(as_text=True).splitlines()
+                if line.startswith('data: ')
+            ]
+            assert events[-1]['status'] == 'completed'
+
+            response = client.get(f'/api/analysis/jobs/{job_id}')
+            job = response.get_json()['job']
+            assert job['status'] == 'completed'
+            assert job['result']['analysis']['analysis_id']
+            assert TradeAnalysis.query.filter_by(user_id=user_id).count() == before + 1
+
+            response = client.get('/api/analysis/jobs/does-not-exist')
+            assert response.status_code == 404
+
+    print("✓ Async /api/analyze test passed")
+
+
+def test_async_analyze_queue_full():
+    """Test that a full queue returns 503 with Retry-After"""
+    print("\nTesting async /api/analyze backpressure...")
+
+    with app.app_context():
+        ensure_user('testuser_jobs', is_premium=True)
+        with app.test_client() as client:
+            login(client, 'testuser_jobs')
+
+            with patch('app.analysis_jobs.submit', side_effect=QueueFullError('full')):
+                data = {'chart': (io.BytesIO(b'fake image data'), 'chart.png'), 'async': 'true'}
+                response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+                assert response.status_code == 503
+                assert response.headers['Retry-After']
+
+    print("✓ Async /api/analyze backpressure test passed")
+
+
+def run_tests():
+    """Run all job queue tests"""
+    return run_suite('Analysis Job Queue', [
+        test_queue_runs_jobs_and_reports_failures,
+        test_queue_depth_limit,
+        test_async_analyze_endpoint,
+        test_async_analyze_queue_full,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,143 @@
+"""
+Tests for the JSON provider, cached analysis fragments and response compression
+"""
+
+import gzip
+import json
+import sys
+from datetime import datetime
+from unittest.mock import patch
+
+from json_provider import FastJSONProvider, JSONFragmentCache, embed, json_array, merge_objects
+from app import app, TradeAnalysis, analysis_fragments, save_trade_analysis
+from test_support import ensure_user, login, run_suite
+
+
+def test_provider_matches_stdlib():
+    """Test that the fast provider produces the same data as the stdlib encoder"""
+    print("Testing JSON provider...")
+
+    fast = FastJSONProvider(app)
+    stdlib = FastJSONProvider(app)
+    stdlib.use_orjson = False
+
+    value = {'b': [1, 2.5, None, True], 'a': 'ünïcode', 'when': datetime(2024, 3, 1, 12, 0)}
+    assert json.loads(fast.dumps(value)) == json.loads(stdlib.dumps(value))
+    assert json.loads(fast.dumps(value))['when'] == 'Fri, 01 Mar 2024 12:00:00 GMT'
+
+    # Values orjson rejects fall back to the stdlib encoder
+    assert fast.dumps({'big': 2 ** 70}) == stdlib.dumps({'big': 2 ** 70})
+    assert fast.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+
+    assert merge_objects(b'{"a":1}', b'{"b":2}') == b'{"a":1,"b":2}'
+    assert merge_objects(b'{}', b'{"b":2}') == b'{"b":2}'
+    assert json.loads(embed(b'{"success":true}', 'items', json_array([b'{"id":1}', b'{"id":2}']))) == \
+        {'success': True, 'items': [{'id': 1}, {'id': 2}]}
+
+    print("✓ JSON provider test passed")
+
+
+def test_fragment_cache():
+    """Test LRU eviction, hit counting and disabling the fragment cache"""
+    print("\nTesting fragment cache...")
+
+    cache = JSONFragmentCache(max_entries=2)
+    builds = []
+
+    def build(value):
+        def inner():
+            builds.append(value)
+            return value
+        return inner
+
+    cache.get_or_build('a', build(b'1'))
+    cache.get_or_build('b', build(b'2'))
+    assert cache.get_or_build('a', build(b'x')) == b'1'
+    cache.get_or_build('c', build(b'3'))
+    assert cache.get_or_build('b', build(b'4')) == b'4'
+    assert builds == [b'1', b'2', b'3', b'4']
+    assert cache.stats()['hits'] == 1
+
+    disabled = JSONFragmentCache(max_entries=0)
+    disabled.get_or_build('a', build(b'5'))
+    assert disabled.stats() == {'enabled': False, 'hits': 0, 'misses': 0, 'size': 0, 'max_entries': 0}
+
+    print("✓ Fragment cache test passed")
+
+
+def test_cached_fragments_keep_outcome_fresh():
+    """Test that cached detail responses still reflect outcome updates"""
+    print("\nTesting cached analysis fragments...")
+
+    with app.app_context():
+        user = ensure_user('testuser_json')
+        analysis_id = save_trade_analysis(user.id, {'reasoning': 'breakout', 'patterns': ['flag']},
+                                          'Swing Trading', 'Moderate', 'Stocks').id
+
+    with app.test_client() as client:
+        login(client, 'testuser_json')
+
+        first = client.get(f'/api/analysis/{analysis_id}').get_json()
+        hits_before = analysis_fragments.stats()['hits']
+        assert client.get(f'/api/analysis/{analysis_id}').get_json() == first
+        # One hit for the analysis fields and one for its (empty) timeframe results
+        assert analysis_fragments.stats()['hits'] == hits_before + 2
+
+        # The outcome update bumps the version, which moves the record to a new fragment key
+        client.put(f'/api/analysis/{analysis_id}/outcome', json={'outcome': 'win', 'notes': 'TP1'})
+        second = client.get(f'/api/analysis/{analysis_id}').get_json()
+
+        assert first['analysis']['outcome'] == 'pending'
+        assert second['analysis']['outcome'] == 'win'
+        assert second['analysis']['notes'] == 'TP1'
+        assert second['analysis']['reasoning'] == 'breakout'
+        assert second['success'] == True
+
+    print("✓ Cached analysis fragment test passed")
+
+
+def test_response_compression():
+    """Test gzip negotiation and the minimum size threshold"""
+    print("\nTesting response compression...")
+
+    with app.app_context():
+        user = ensure_user('testuser_json')
+        if TradeAnalysis.query.filter_by(user_id=user.id).count() < 20:
+            for _ in range(20):
+                save_trade_analysis(user.id, {'reasoning': 'breakout'}, 'Swing Trading', 'Moderate', 'Stocks')
+
+    with app.test_client() as client:
+        login(client, 'testuser_json')
+
+        plain = client.get('/api/history?per_page=20')
+        assert 'Content-Encoding' not in plain.headers
+
+        compressed = client.get('/api/history?per_page=20', headers={'Accept-Encoding': 'gzip, deflate'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in compressed.headers['Vary']
+        assert len(compressed.get_data()) < len(plain.get_data())
+        assert json.loads(gzip.decompress(compressed.get_data())) == plain.get_json()
+
+        with patch.dict(app.config, {'COMPRESSION_MIN_SIZE': 10 ** 6}):
+            small = client.get('/api/history?per_page=20', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in small.headers
+
+        refused = client.get('/api/history?per_page=20', headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in refused.headers
+
+    print("✓ Response compression test passed")
+
+
+def run_tests():
+    """Run all JSON response tests"""
+    return run_suite('JSON Response', [
+        test_provider_matches_stdlib,
+        test_fragment_cache,
+        test_cached_fragments_keep_outcome_fresh,
+        test_response_compression,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,129 @@
+"""
+Tests for request/stage metrics and the /api/metrics endpoint
+"""
+
+import sys
+import threading
+from unittest.mock import patch
+
+from fake_openai_server import FakeOpenAIServer
+from metrics import MetricsRegistry
+from openai_client import OpenAIClientManager
+from app import app
+from test_support import METRICS_TOKEN, ensure_user, login, run_suite, scrape_metrics
+
+
+def test_registry_merges_thread_shards():
+    """Test that counters and histograms recorded on many threads add up"""
+    print("Testing per-thread metric aggregation...")
+
+    registry = MetricsRegistry()
+
+    def work():
+        for _ in range(100):
+            registry.inc('jobs_total', labels={'kind': 'test'})
+            registry.observe('latency_seconds', 0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Shards of finished threads are folded into the retired totals and still counted
+    assert registry.get_counter('jobs_total', {'kind': 'test'}) == 400
+    assert registry.get_counter('jobs_total', {'kind': 'test'}) == 400
+
+    text = registry.render()
+    assert 'jobs_total{kind="test"} 400' in text
+    assert 'latency_seconds_bucket{le="0.01"} 0' in text
+    assert 'latency_seconds_bucket{le="0.025"} 400' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 400' in text
+    assert 'latency_seconds_count 400' in text
+
+    print("✓ Per-thread metric aggregation test passed")
+
+
+def test_disabled_registry_records_nothing():
+    """Test that a disabled registry is a no-op"""
+    print("\nTesting disabled metrics...")
+
+    registry = MetricsRegistry(enabled=False)
+    registry.inc('jobs_total')
+    with registry.timer('latency_seconds'):
+        pass
+    assert registry.render() == '\n'
+
+    print("✓ Disabled metrics test passed")
+
+
+def test_metrics_endpoint_reports_routes_and_tokens():
+    """Test route latency histograms and OpenAI token counters in the scrape output"""
+    print("\nTesting /api/metrics endpoint...")
+
+    with app.app_context():
+        ensure_user('testuser_metrics')
+
+        with FakeOpenAIServer(content='pong') as server:
+            manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url)
+            with app.test_client() as client, \
+                    patch('app.OPENAI_API_KEY', 'test-key'), \
+                    patch('app.openai_clients', manager):
+                client.get('/api/health')
+                login(client, 'testuser_metrics')
+                response = client.post('/api/openai-call', json={'prompt': 'ping'})
+                assert response.status_code == 200
+
+                response = scrape_metrics(client)
+                assert response.status_code == 200
+                assert response.mimetype == 'text/plain'
+                text = response.get_data(as_text=True)
+            manager.close()
+
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}' in text
+    assert 'openai_tokens_total{call="openai_call",kind="prompt_tokens",model="gpt-4"}' in text
+    assert 'openai_request_duration_seconds_count{call="openai_call",model="gpt-4"}' in text
+    assert '# TYPE analysis_cache_hits_total counter' in text
+
+    with patch.dict(app.config, {'METRICS_ENABLED': False}):
+        with app.test_client() as client:
+            assert scrape_metrics(client).status_code == 404
+
+    print("✓ /api/metrics endpoint test passed")
+
+
+def test_metrics_and_health_are_not_public():
+    """Test that scraping needs the token and health reports only liveness and circuit state"""
+    print("\nTesting metrics access and the health payload...")
+
+    with app.test_client() as client:
+        # No token configured: the endpoint is closed to everyone
+        assert client.get('/api/metrics').status_code == 404
+
+        with patch.dict(app.config, {'METRICS_TOKEN': METRICS_TOKEN}):
+            response = client.get('/api/metrics')
+            assert response.status_code == 401
+            assert response.headers['WWW-Authenticate'] == 'Bearer'
+            assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+        health = client.get('/api/health').get_json()
+    assert set(health) == {'status', 'service', 'openai_circuit'}
+    assert set(health['openai_circuit']) == {'state', 'retry_in'}
+
+    print("✓ Metrics access and health payload test passed")
+
+
+def run_tests():
+    """Run all metrics tests"""
+    return run_suite('Metrics', [
+        test_registry_merges_thread_shards,
+        test_disabled_registry_records_nothing,
+        test_metrics_endpoint_reports_routes_and_tokens,
+        test_metrics_and_health_are_not_public,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,95 @@
+"""
+Tests for the versioned schema migrations
+Upgrades a database created with the pre-migration schema
+"""
+
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from app import app, db, init_db
+from test_support import run_suite
+
+LEGACY_SCHEMA = (
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80), email VARCHAR(120),'
+    ' password_hash VARCHAR(255), full_name VARCHAR(120), created_at DATETIME, is_premium BOOLEAN)',
+    'CREATE TABLE trade_analysis (id INTEGER PRIMARY KEY, user_id INTEGER, market_type VARCHAR(50),'
+    ' trading_style VARCHAR(50), risk_profile VARCHAR(50), asset_type VARCHAR(50), patterns TEXT,'
+    ' indicators TEXT, trade_direction VARCHAR(20), entry_price VARCHAR(100), stop_loss VARCHAR(100),'
+    ' take_profit TEXT, pattern_explanation TEXT, reasoning TEXT, confidence_score INTEGER,'
+    ' risk_factors TEXT, outcome VARCHAR(20), notes TEXT, created_at DATETIME)',
+    'CREATE TABLE daily_usage (user_id INTEGER, day DATE, analysis_count INTEGER,'
+    ' PRIMARY KEY (user_id, day))'
+)
+
+
+def test_upgrade_legacy_database():
+    """Test that migrations add indexes and backfill counters on an old database"""
+    print("Testing migration of a legacy database...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'legacy.db')}")
+        with engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                conn.execute(text(statement))
+            conn.execute(text("INSERT INTO user (id, username, email, password_hash) VALUES (1, 'a', 'a@x', 'x')"))
+            for created_at in ('2024-01-01 09:00:00', '2024-01-01 17:00:00', '2024-01-02 10:00:00'):
+                conn.execute(text("INSERT INTO trade_analysis (user_id, asset_type, outcome, confidence_score, patterns,"
+                              " created_at) VALUES (1, 'Crypto', 'pending', 70, '[\"Head & Shoulders\", \"Flag\"]', :c)"),
+                         {'c': created_at})
+
+        applied = migrations.upgrade(engine)
+        assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+
+        index_names = {index['name'] for index in inspect(engine).get_indexes('trade_analysis')}
+        for name, _ in migrations.TRADE_ANALYSIS_INDEXES:
+            assert name in index_names, f"{name} missing"
+        assert migrations.column_exists(engine.connect(), 'trade_analysis', 'version')
+        assert migrations.column_exists(engine.connect(), 'user', 'analyses_version')
+        assert 'analysis_timeframe' in inspect(engine).get_table_names()
+
+        with engine.connect() as conn:
+            counts = dict(conn.execute(text('SELECT day, analysis_count FROM daily_usage')).all())
+            assert counts == {'2024-01-01': 2, '2024-01-02': 1}
+            rollup = conn.execute(text('SELECT asset_type, trading_style, outcome, analysis_count, confidence_sum'
+                                       ' FROM user_stats_rollup')).all()
+            assert rollup == [('Crypto', '', 'pending', 3, 210)]
+            tags = conn.execute(text('SELECT tag, COUNT(*) FROM analysis_pattern GROUP BY tag ORDER BY tag')).all()
+            assert tags == [('flag', 3), ('head-and-shoulders', 3)]
+            assert migrations.get_schema_version(conn) == migrations.MIGRATIONS[-1][0]
+
+        # A second run has nothing left to do
+        assert migrations.upgrade(engine) == []
+        engine.dispose()
+
+    print("✓ Legacy database migration test passed")
+
+
+def test_init_db_stamps_app_database():
+    """Test that init_db leaves the app database at the latest version with indexes"""
+    print("\nTesting init_db on the app database...")
+
+    with app.app_context():
+        init_db()
+        with db.engine.connect() as conn:
+            assert migrations.get_schema_version(conn) == migrations.MIGRATIONS[-1][0]
+        index_names = {index['name'] for index in inspect(db.engine).get_indexes('trade_analysis')}
+        assert 'ix_trade_analysis_user_created' in index_names
+
+    print("✓ init_db test passed")
+
+
+def run_tests():
+    """Run all migration tests"""
+    return run_suite('Migration', [
+        test_upgrade_legacy_database,
+        test_init_db_stamps_app_database,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
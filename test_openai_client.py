@@ -0,0 +1,107 @@
+"""
+Tests for the shared, pooled OpenAI client
+Runs against a local stub server instead of the real API
+"""
+
+import json
+import sys
+from unittest.mock import patch
+
+from fake_openai_server import FakeOpenAIServer
+from openai_client import OpenAIClientManager
+from app import app
+from test_support import ensure_user, login, run_suite
+
+
+def make_manager(server, **kwargs):
+    return OpenAIClientManager(api_key='test-key', base_url=server.base_url, **kwargs)
+
+
+def test_client_reuses_connections():
+    """Test that sequential calls share one client and one keep-alive connection"""
+    print("Testing OpenAI connection reuse...")
+
+    with FakeOpenAIServer() as server:
+        manager = make_manager(server)
+        try:
+            for _ in range(5):
+                client = manager.get_client()
+                response = client.chat.completions.create(
+                    model='gpt-4o',
+                    messages=[{'role': 'user', 'content': 'hi'}]
+                )
+                assert json.loads(response.choices[0].message.content)['market_type'] == 'Crypto'
+
+            assert manager.get_client() is client
+            assert server.connections == 1, f"Expected 1 connection, got {server.connections}"
+
+            stats = manager.stats()
+            assert stats['clients_created'] == 1
+            assert stats['requests'] == 5
+            assert stats['connections_opened'] == 1
+            assert stats['connections_reused'] == 4
+        finally:
+            manager.close()
+
+    print("✓ OpenAI connection reuse test passed")
+
+
+def test_client_rebuilt_after_fork():
+    """Test that a forked process gets its own client instead of the parent's pool"""
+    print("\nTesting OpenAI client fork safety...")
+
+    with FakeOpenAIServer() as server:
+        manager = make_manager(server)
+        try:
+            parent_client = manager.get_client()
+
+            # Pretend we are running in a child process forked from this one
+            manager._pid = -1
+            child_client = manager.get_client()
+
+            assert child_client is not parent_client
+            assert manager.stats()['clients_created'] == 1
+        finally:
+            manager.close()
+
+    print("✓ OpenAI client fork safety test passed")
+
+
+def test_openai_call_route_uses_shared_client():
+    """Test that /api/openai-call goes through the shared pool"""
+    print("\nTesting /api/openai-call with the shared client...")
+
+    with app.app_context():
+        ensure_user('testuser_openai_pool')
+
+        with FakeOpenAIServer(content='Hello from the stub') as server:
+            manager = make_manager(server)
+            with app.test_client() as client, \
+                    patch('app.OPENAI_API_KEY', 'test-key'), \
+                    patch('app.openai_clients', manager):
+                login(client, 'testuser_openai_pool')
+
+                for _ in range(3):
+                    response = client.post('/api/openai-call', json={'prompt': 'Hello'})
+                    assert response.status_code == 200
+                    assert response.get_json()['output'] == 'Hello from the stub'
+
+            assert server.connections == 1
+            assert manager.stats()['connections_reused'] == 2
+            manager.close()
+
+    print("✓ /api/openai-call shared client test passed")
+
+
+def run_tests():
+    """Run all OpenAI client tests"""
+    return run_suite('OpenAI Client Pool', [
+        test_client_reuses_connections,
+        test_client_rebuilt_after_fork,
+        test_openai_call_route_uses_shared_client,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
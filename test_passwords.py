@@ -0,0 +1,188 @@
+"""
+Tests for the password hashing policy: tunable methods, background rehash on login and
+the bounded verification pool
+"""
+
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+from passwords import PasswordHasher, PasswordHasherBusyError, below_floor, calibrate, hash_method, normalize_method
+from app import app, db, User, password_hasher as app_password_hasher
+from test_support import scrape_metrics, PASSWORD, ensure_user, login, run_suite
+
+# Cheap parameters keep the tests fast; only the format matters here
+OLD_METHOD = 'pbkdf2:sha256:1000'
+NEW_METHOD = 'pbkdf2:sha256:2000'
+
+
+def setup_password_user(method=OLD_METHOD):
+    """The password test user with its hash made by method"""
+    user = ensure_user('testuser_passwords')
+    user.password_hash = PasswordHasher(method).hash(PASSWORD)
+    db.session.commit()
+    return user.id
+
+
+def stored_hash(user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+
+def test_methods_and_rehash_check():
+    """Test method normalization and detection of outdated hashes"""
+    print("Testing hash methods...")
+
+    assert normalize_method('scrypt') == 'scrypt:32768:8:1'
+    assert normalize_method('pbkdf2') == 'pbkdf2:sha256:600000'
+    assert normalize_method('pbkdf2:sha512') == 'pbkdf2:sha512:600000'
+    try:
+        normalize_method('md5')
+        assert False, 'unknown methods should be rejected'
+    except ValueError:
+        pass
+
+    hasher = PasswordHasher(NEW_METHOD)
+    current = hasher.hash('secret')
+    assert hash_method(current) == NEW_METHOD
+    assert hasher.verify(current, 'secret') and not hasher.verify(current, 'wrong')
+    assert not hasher.needs_rehash(current)
+
+    # Old parameters still verify but are flagged for an upgrade
+    old = PasswordHasher(OLD_METHOD).hash('secret')
+    assert hasher.verify(old, 'secret')
+    assert hasher.needs_rehash(old)
+    assert hasher.needs_rehash('') and hasher.needs_rehash('bogus$x$y')
+
+    candidates, recommended = calibrate(0.001, 'pbkdf2')
+    assert recommended.startswith('pbkdf2:sha256:')
+    assert all(seconds > 0 for _, seconds in candidates)
+
+    # A target faster than the minimum cost still gets the minimum, flagged as such
+    candidates, recommended = calibrate(0.000001, 'scrypt')
+    assert recommended == 'scrypt:16384:8:1' and len(candidates) == 1
+    assert below_floor(candidates, recommended, 0.000001)
+    assert not below_floor(candidates, recommended, 60)
+
+    print("✓ Hash method test passed")
+
+
+def test_login_rehashes_outdated_hash():
+    """Test that a login with old parameters succeeds and upgrades the stored hash"""
+    print("\nTesting background rehash on login...")
+
+    with app.app_context():
+        user_id = setup_password_user(OLD_METHOD)
+
+    hasher = PasswordHasher(NEW_METHOD)
+    with app.test_client() as client, patch('app.password_hasher', hasher):
+        login(client, 'testuser_passwords')
+
+        deadline = time.monotonic() + 5
+        while hash_method(stored_hash(user_id)) != NEW_METHOD and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert hash_method(stored_hash(user_id)) == NEW_METHOD
+        assert hasher.stats()['rehashes'] == 1
+
+        # The upgraded hash works and is not rehashed again
+        client.post('/api/logout')
+        login(client, 'testuser_passwords')
+        assert hasher.stats()['rehashes'] == 1
+
+        # A wrong password never triggers a rehash
+        with app.app_context():
+            setup_password_user(OLD_METHOD)
+        response = client.post('/api/login', json={'username': 'testuser_passwords', 'password': 'nope'})
+        assert response.status_code == 401
+        time.sleep(0.05)
+        assert hash_method(stored_hash(user_id)) == OLD_METHOD
+
+        with patch.dict(app.config, {'PASSWORD_REHASH_ENABLED': False}):
+            login(client, 'testuser_passwords')
+            time.sleep(0.05)
+            assert hash_method(stored_hash(user_id)) == OLD_METHOD
+
+    print("✓ Background rehash test passed")
+
+
+def test_bounded_pool():
+    """Test pooled verification, the pending limit and the 503 it produces at login"""
+    print("\nTesting bounded hashing pool...")
+
+    for executor in ('thread', 'process'):
+        hasher = PasswordHasher(NEW_METHOD, workers=1, executor=executor, max_pending=1)
+        assert hasher.verify(hasher.hash('secret'), 'secret')
+
+    hasher = PasswordHasher(NEW_METHOD, workers=1, max_pending=1)
+    stored = hasher.hash('secret')
+    # Hold the only slot, as a long-running derivation would
+    hasher._slots.acquire()
+    try:
+        try:
+            hasher.verify(stored, 'secret')
+            assert False, 'a full pool should reject work'
+        except PasswordHasherBusyError:
+            pass
+
+        with app.app_context():
+            setup_password_user(NEW_METHOD)
+        with app.test_client() as client, patch('app.password_hasher', hasher):
+            response = client.post('/api/login', json={'username': 'testuser_passwords', 'password': PASSWORD})
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == str(app.config['PASSWORD_HASH_RETRY_AFTER'])
+    finally:
+        hasher._slots.release()
+
+    assert hasher.verify(stored, 'secret')
+    stats = hasher.stats()
+    assert (stats['executor'], stats['rejected']) == ('thread', 2)
+
+    # Without a pool the request thread hashes inline, but max_pending still caps it
+    hasher = PasswordHasher(NEW_METHOD, max_pending=1)
+    hasher._slots.acquire()
+    try:
+        try:
+            hasher.verify(stored, 'secret')
+            assert False, 'inline hashing should respect max_pending too'
+        except PasswordHasherBusyError:
+            pass
+    finally:
+        hasher._slots.release()
+    assert hasher.verify(stored, 'secret')
+    assert (hasher.stats()['executor'], hasher.stats()['rejected']) == ('inline', 1)
+
+    with app.test_client() as client:
+        assert app_password_hasher.method not in client.get('/api/health').get_data(as_text=True)
+        text = scrape_metrics(client).get_data(as_text=True)
+    assert 'password_hash_rejected_total' in text and app_password_hasher.method not in text
+
+    # Background rehashes are bounded too, so a login storm cannot queue passwords without limit
+    hasher = PasswordHasher(NEW_METHOD, max_pending=2)
+    gate = threading.Event()
+    stored = []
+    futures = [hasher.rehash_in_background('secret', lambda new_hash: (gate.wait(5), stored.append(new_hash)))
+               for _ in range(4)]
+    assert futures[2] is None and futures[3] is None
+    assert hasher.stats()['rehashes_skipped'] == 2
+    gate.set()
+    for future in futures[:2]:
+        future.result(timeout=5)
+    assert len(stored) == 2 and hasher.stats()['rehashes_pending'] == 0
+    assert hasher.rehash_in_background('secret', stored.append) is not None
+
+    print("✓ Bounded hashing pool test passed")
+
+
+def run_tests():
+    """Run all password hashing tests"""
+    return run_suite('Password Hashing', [
+        test_methods_and_rehash_check,
+        test_login_rehashes_outdated_hash,
+        test_bounded_pool,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
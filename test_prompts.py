@@ -0,0 +1,119 @@
+"""
+Tests for the prompt template registry and per-version token accounting
+"""
+
+import sys
+from unittest.mock import patch
+
+from analysis_cache import AnalysisCache, MemoryCacheBackend
+from fake_openai_server import FakeOpenAIServer
+from openai_client import OpenAIClientManager
+from prompts import (
+    CHART_ANALYSIS_TEXT, MULTI_TIMEFRAME_ANALYSIS_TEXT, PromptRegistry, PromptTemplate,
+    analysis_prompt, create_prompt_registry
+)
+from app import app, analyze_chart_with_ai
+from test_support import scrape_metrics, chart_png, run_suite
+
+
+def test_precompiled_variants():
+    """Test that known variants are rendered once and others go through the bounded LRU"""
+    print("Testing prompt precompilation...")
+
+    registry = create_prompt_registry(max_variants=2)
+    stats = registry.stats()
+    assert stats['precompiled_variants'] == 27
+    assert stats['templates']['chart_analysis']['estimated_tokens_min'] > 0
+
+    prompt = analysis_prompt(registry, 'Swing', 'Conservative', 'Stocks')
+    assert prompt is analysis_prompt(registry, 'Swing', 'Conservative', 'Stocks')
+    assert 'Trading Style: Swing - Focus on multi-day' in prompt.text
+    assert 'Asset Type: Stocks' in prompt.text
+    assert prompt.estimated_tokens == -(-len(prompt.text) // 4)
+    assert registry.stats()['dynamic_variants'] == 0
+
+    # Unknown styles and timeframe combinations are rendered on demand
+    custom = analysis_prompt(registry, 'Position', 'Balanced', 'Crypto')
+    assert 'Trading Style: Position - \n' in custom.text
+    multi = analysis_prompt(registry, 'Swing', 'Balanced', 'Crypto', ['1h', '4h'])
+    assert multi.template == 'multi_timeframe_analysis'
+    assert 'different timeframes (1h, 4h)' in multi.text
+    assert '"confluence": "string"' in multi.text
+    analysis_prompt(registry, 'Swing', 'Balanced', 'Crypto', ['1h', '1d'])
+    assert registry.stats()['dynamic_variants'] == 2
+
+    print("✓ Prompt precompilation test passed")
+
+
+def test_template_version_follows_text():
+    """Test that editing a template changes its version"""
+    print("\nTesting template versions...")
+
+    original = PromptTemplate('chart_analysis', CHART_ANALYSIS_TEXT)
+    assert original.version == PromptTemplate('chart_analysis', CHART_ANALYSIS_TEXT).version
+    assert original.version != PromptTemplate('chart_analysis', CHART_ANALYSIS_TEXT + '\nBe concise.').version
+    assert original.version != PromptTemplate('multi_timeframe_analysis', MULTI_TIMEFRAME_ANALYSIS_TEXT).version
+
+    print("✓ Template version test passed")
+
+
+def test_usage_recorded_and_cache_keyed_by_version():
+    """Test token usage per template version and cache invalidation on a template change"""
+    print("\nTesting token accounting and prompt-versioned cache keys...")
+
+    registry = create_prompt_registry()
+    edited = PromptRegistry((
+        PromptTemplate('chart_analysis', CHART_ANALYSIS_TEXT + '\nKeep the reasoning short.'),
+        PromptTemplate('multi_timeframe_analysis', MULTI_TIMEFRAME_ANALYSIS_TEXT)
+    ))
+    cache = AnalysisCache(MemoryCacheBackend(), ttl=60)
+    chart = chart_png()
+
+    with FakeOpenAIServer() as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url)
+        with app.app_context(), \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', cache):
+            with patch('app.analysis_prompts', registry):
+                assert analyze_chart_with_ai(chart, 'Day Trade', 'Balanced', 'Crypto')['success']
+                assert analyze_chart_with_ai(chart, 'Day Trade', 'Balanced', 'Crypto').get('cached')
+            # Same chart and parameters, but a new template version misses the cache
+            with patch('app.analysis_prompts', edited):
+                result = analyze_chart_with_ai(chart, 'Day Trade', 'Balanced', 'Crypto')
+                assert result['success'] and not result.get('cached')
+
+            with app.test_client() as client, patch('app.analysis_prompts', registry):
+                text = scrape_metrics(client).get_data(as_text=True)
+        manager.close()
+
+    assert len(server.requests) == 2
+    sent = server.requests[0]['body']['messages'][0]['content'][0]['text']
+    assert sent == analysis_prompt(registry, 'Day Trade', 'Balanced', 'Crypto').text
+
+    usage = registry.stats()['usage']
+    assert len(usage) == 1
+    assert usage[0]['template'] == 'chart_analysis'
+    assert usage[0]['version'] == registry.templates['chart_analysis'].version
+    assert (usage[0]['calls'], usage[0]['prompt_tokens'], usage[0]['completion_tokens']) == (1, 1200, 300)
+    assert usage[0]['estimated_prompt_tokens'] > 0
+    assert edited.stats()['usage'][0]['version'] != usage[0]['version']
+
+    labels = f'kind="prompt_tokens",template="chart_analysis",version="{usage[0]["version"]}"'
+    assert f'prompt_tokens_total{{{labels}}} 1200' in text
+
+    print("✓ Token accounting test passed")
+
+
+def run_tests():
+    """Run all prompt registry tests"""
+    return run_suite('Prompt Registry', [
+        test_precompiled_variants,
+        test_template_version_follows_text,
+        test_usage_recorded_and_cache_keyed_by_version,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,210 @@
+"""
+Tests for token-bucket rate limiting of login, registration and OpenAI-backed routes
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from rate_limit import (
+    InvalidRateLimitError, MemoryRateLimitBackend, RateLimit, RateLimiter, SQLiteRateLimitBackend, parse_rate_limit
+)
+from app import app, rate_limiter
+from test_support import scrape_metrics, PASSWORD, ensure_user, login, run_suite
+
+
+def test_token_bucket():
+    """Test parsing, refill over time and all-or-nothing consumption"""
+    print("Testing token buckets...")
+
+    assert parse_rate_limit('10/minute') == RateLimit(10, 60)
+    assert parse_rate_limit('5/min') == RateLimit(5, 60)
+    assert parse_rate_limit('100/hours') == RateLimit(100, 3600)
+    assert parse_rate_limit('2/s') == RateLimit(2, 1)
+    assert parse_rate_limit('') is None and parse_rate_limit('0') is None
+    for bad in ('ten/minute', '5/fortnight', '-1/hour'):
+        try:
+            parse_rate_limit(bad)
+            assert False, f'{bad} should be rejected'
+        except InvalidRateLimitError:
+            pass
+
+    now = [1000.0]
+    limiter = RateLimiter(MemoryRateLimitBackend(), clock=lambda: now[0])
+    per_minute = RateLimit(3, 60)
+    decisions = [limiter.hit([('login_ip', '10.0.0.1', per_minute)]) for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert decisions[2].remaining == 0
+    assert decisions[3].retry_after == 20 and decisions[3].rule == 'login_ip' and decisions[3].limit == 3
+
+    # Other clients have their own bucket
+    assert limiter.hit([('login_ip', '10.0.0.2', per_minute)]).allowed
+
+    # One token comes back every 20 seconds
+    now[0] += 20
+    assert limiter.hit([('login_ip', '10.0.0.1', per_minute)]).allowed
+    assert not limiter.hit([('login_ip', '10.0.0.1', per_minute)]).allowed
+
+    # A request blocked by one bucket does not spend tokens from the others
+    roomy = RateLimit(5, 60)
+    for _ in range(2):
+        decision = limiter.hit([('user', 'u1', roomy), ('login_ip', '10.0.0.1', per_minute)])
+        assert not decision.allowed
+    assert limiter.hit([('user', 'u1', roomy)]).remaining == 4
+
+    # Blank limits and keys are skipped; a disabled limiter allows everything
+    assert limiter.hit([('login_ip', '10.0.0.1', None), ('login_ip', None, per_minute)]).allowed
+    limiter.enabled = False
+    assert limiter.hit([('login_ip', '10.0.0.1', per_minute)]).allowed
+
+    assert limiter.stats()['rules']['login_ip'] == {'allowed': 5, 'limited': 4}
+
+    print("✓ Token bucket test passed")
+
+
+def test_sqlite_backend_shared_between_workers():
+    """Test that limiters on one SQLite file share buckets and never over-admit"""
+    print("\nTesting shared SQLite buckets...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'rate_limits.db')
+        workers = [RateLimiter(SQLiteRateLimitBackend(path)) for _ in range(2)]
+        hourly = RateLimit(40, 3600)
+
+        allowed = []
+
+        def hammer(limiter):
+            for _ in range(25):
+                allowed.append(limiter.hit([('openai_global', 'all', hourly)]).allowed)
+
+        threads = [threading.Thread(target=hammer, args=(workers[i % 2],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert allowed.count(True) == 40, allowed.count(True)
+        assert len(workers[0].backend) == 1
+
+    print("✓ Shared SQLite bucket test passed")
+
+
+def test_sqlite_backend_reconnects_after_fork():
+    """Test that a forked worker opens its own SQLite connection and still shares the buckets"""
+    print("\nTesting SQLite bucket fork safety...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SQLiteRateLimitBackend(os.path.join(directory, 'rate_limits.db'))
+        limiter = RateLimiter(backend, clock=lambda: 1000.0)
+        hourly = RateLimit(5, 3600)
+        assert limiter.hit([('login_ip', '10.0.0.1', hourly)]).remaining == 4
+        parent_conn = backend._conn
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: report whether it reconnected, then exit without running the parent's cleanup
+            try:
+                os.close(read_fd)
+                remaining = limiter.hit([('login_ip', '10.0.0.1', hourly)]).remaining
+                reconnected = backend._conn is not parent_conn and backend._pid == os.getpid()
+                os.write(write_fd, f'{reconnected}:{remaining}'.encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as pipe:
+            child_result = pipe.read().decode()
+        os.waitpid(pid, 0)
+
+        assert child_result == 'True:3', child_result
+        # The parent keeps its own connection and sees the token the child spent
+        assert backend._conn is parent_conn
+        assert limiter.hit([('login_ip', '10.0.0.1', hourly)]).remaining == 2
+
+    print("✓ SQLite bucket fork safety test passed")
+
+
+def test_hot_path_overhead():
+    """Test that checking a request's buckets costs microseconds"""
+    print("\nTesting limiter overhead...")
+
+    limiter = RateLimiter(MemoryRateLimitBackend())
+    rules = [('analyze_user', '42', RateLimit(10 ** 9, 60)), ('openai_global', 'all', RateLimit(10 ** 9, 60))]
+    count = 20000
+    started = time.perf_counter()
+    for _ in range(count):
+        limiter.hit(rules)
+    per_call = (time.perf_counter() - started) / count
+    print(f"  {per_call * 1e6:.1f}µs per request")
+    assert per_call < 0.0005, per_call
+
+    print("✓ Limiter overhead test passed")
+
+
+def test_routes_return_429():
+    """Test 429 + Retry-After on login, the per-user OpenAI route limit and the health report"""
+    print("\nTesting rate-limited routes...")
+
+    with app.app_context():
+        ensure_user('testuser_ratelimit', is_premium=True)
+
+    limits = dict(app.config['RATE_LIMITS'], login_ip=RateLimit(4, 60), login_username=RateLimit(2, 60),
+                  openai_call_user=RateLimit(1, 60))
+    with app.test_client() as client, \
+            patch.dict(app.config, {'RATE_LIMITS': limits}), \
+            patch.object(rate_limiter, 'backend', MemoryRateLimitBackend()):
+        # Guessing one account's password is cut off before the per-IP limit
+        statuses = [client.post('/api/login', json={'username': 'testuser_ratelimit', 'password': 'wrong'}).status_code
+                    for _ in range(3)]
+        assert statuses == [401, 401, 429]
+        response = client.post('/api/login', json={'username': 'testuser_ratelimit', 'password': PASSWORD})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) == 30
+        assert response.headers['X-RateLimit-Limit'] == '2'
+        assert response.get_json()['retry_after'] == 30
+
+        # Rejected attempts spent nothing, so two more accounts fit in the IP bucket
+        assert client.post('/api/login', json={'username': 'someone_else', 'password': 'x'}).status_code == 401
+        assert client.post('/api/login', json={'username': 'another', 'password': 'x'}).status_code == 401
+        assert client.post('/api/login', json={'username': 'third', 'password': 'x'}).status_code == 429
+
+        with patch.object(rate_limiter, 'backend', MemoryRateLimitBackend()):
+            login(client, 'testuser_ratelimit')
+
+            # Premium accounts are not exempt from the per-user limit
+            with patch('app.OPENAI_API_KEY', None):
+                assert client.post('/api/openai-call', json={'prompt': 'hi'}).status_code == 500
+                assert client.post('/api/openai-call', json={'prompt': 'hi'}).status_code == 429
+
+            # Anonymous requests are redirected by login_required before touching a bucket
+            client.post('/api/logout')
+            assert client.post('/api/openai-call', json={'prompt': 'hi'}).status_code == 302
+
+            with patch.object(rate_limiter, 'enabled', False):
+                for _ in range(3):
+                    assert client.post('/api/login', json={'username': 'testuser_ratelimit', 'password': 'x'}).status_code == 401
+
+            assert rate_limiter.stats()['rules']['openai_call_user']['limited'] >= 1
+            text = scrape_metrics(client).get_data(as_text=True)
+            assert 'rate_limit_requests_total{outcome="limited",rule="openai_call_user"}' in text
+
+    print("✓ Rate-limited route test passed")
+
+
+def run_tests():
+    """Run all rate limiting tests"""
+    return run_suite('Rate Limiting', [
+        test_token_bucket,
+        test_sqlite_backend_shared_between_workers,
+        test_sqlite_backend_reconnects_after_fork,
+        test_hot_path_overhead,
+        test_routes_return_429,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,155 @@
+"""
+Tests for read-replica routing: dashboard reads served from a replica SQLite file, writes on
+the primary and read-your-writes stickiness after a user's own write
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from read_replicas import ReplicaRouter, replica_binds, replica_urls
+from app import app, db, TradeAnalysis, rate_limiter, replica_router, save_trade_analysis
+from test_support import scrape_metrics, ensure_user, login, run_suite
+
+ANALYSIS = {
+    'market_type': 'Forex',
+    'patterns': ['Double Bottom'],
+    'indicators': ['RSI'],
+    'trade_setup': {'direction': 'Long', 'entry': '1.0850', 'stop_loss': '1.0800', 'take_profit': ['1.0950']},
+    'pattern_explanation': 'Replica test',
+    'reasoning': 'Replica test',
+    'confidence_score': 55,
+    'risk_factors': []
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def copy_database(source_path, target_path):
+    """Stand-in for replication: snapshot the primary file into the replica file"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def history_total(client):
+    response = client.get('/api/history')
+    assert response.status_code == 200
+    return response.get_json()['total']
+
+
+def test_router():
+    """Test replica configuration parsing, round-robin choice and stickiness"""
+    print("Testing replica router...")
+
+    urls = replica_urls(' sqlite:///a.db, ,sqlite:///b.db ')
+    assert urls == ['sqlite:///a.db', 'sqlite:///b.db']
+    binds = replica_binds(urls, lambda url: {'pool_size': 2})
+    assert binds == {'replica_0': {'url': 'sqlite:///a.db', 'pool_size': 2},
+                     'replica_1': {'url': 'sqlite:///b.db', 'pool_size': 2}}
+
+    assert ReplicaRouter().choose('1') is None
+    clock = FakeClock()
+    router = ReplicaRouter(binds, sticky_seconds=5, max_users=2, clock=clock)
+    assert [router.choose('1') for _ in range(3)] == ['replica_0', 'replica_1', 'replica_0']
+
+    router.record_write(1)
+    assert router.choose('1') is None and router.choose('2') is not None
+    # A write seen by another worker arrives as a timestamp from the session
+    assert router.choose('2', written_at=clock.now - 1) is None
+    clock.now += 5
+    assert router.choose('1') is not None
+
+    for user_id in (1, 2, 3):
+        router.record_write(user_id)
+    stats = router.stats()
+    assert stats['sticky_users'] == 2
+    assert (stats['replica_reads'], stats['sticky_reads'], stats['writes']) == (5, 2, 4)
+
+    print("✓ Replica router test passed")
+
+
+def test_dashboard_reads_use_replica():
+    """Test that reads hit the replica file and a user's own write keeps them on the primary"""
+    print("\nTesting replica routing with two SQLite files...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_replica').id
+        before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+        first_id = save_trade_analysis(user_id, dict(ANALYSIS), 'Swing', 'Balanced', 'Forex').id
+        primary_path = db.engine.url.database
+        engines = db.engines
+
+    tmpdir = tempfile.mkdtemp(prefix='test_replica_')
+    replica_engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'replica.db')}")
+    try:
+        copy_database(primary_path, os.path.join(tmpdir, 'replica.db'))
+        # Written after the snapshot, so only the primary has it
+        with app.app_context():
+            second_id = save_trade_analysis(user_id, dict(ANALYSIS), 'Day Trade', 'Balanced', 'Forex').id
+
+        clock = FakeClock()
+        router = ReplicaRouter(['replica_test'], sticky_seconds=10, clock=clock)
+        rate_limiter.reset()
+        with patch.dict(engines, {'replica_test': replica_engine}), patch('app.replica_router', router), \
+                app.test_client() as client:
+            login(client, 'testuser_replica')
+
+            assert history_total(client) == before + 1
+            assert client.get(f'/api/analysis/{first_id}').status_code == 200
+            assert client.get(f'/api/analysis/{second_id}').status_code == 404
+            assert client.get('/api/stats').get_json()['stats']['total_analyses'] == before + 1
+            assert client.get('/api/user').status_code == 200
+
+            # Writes are not routed: the outcome update reads and writes the primary
+            response = client.put(f'/api/analysis/{second_id}/outcome', json={'outcome': 'win'})
+            assert response.status_code == 200
+            assert history_total(client) == before + 2
+            assert client.get(f'/api/analysis/{second_id}').get_json()['analysis']['outcome'] == 'win'
+
+            # Another worker only has the write time from the session cookie
+            router.clear()
+            assert history_total(client) == before + 2
+
+            clock.now += 10
+            assert history_total(client) == before + 1
+
+            stats = router.stats()
+            assert stats['replicas'] == ['replica_test'] and stats['sticky_reads'] == 3
+            assert 'db_read_requests_total{target="primary_sticky"} 3' in scrape_metrics(client).get_data(as_text=True)
+
+        # Normal configuration: no replicas, so nothing is routed
+        assert not replica_router.enabled
+    finally:
+        replica_engine.dispose()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print("✓ Replica routing test passed")
+
+
+def run_tests():
+    """Run all read replica tests"""
+    return run_suite('Read Replica', [
+        test_router,
+        test_dashboard_reads_use_replica,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
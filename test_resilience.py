@@ -0,0 +1,274 @@
+"""
+Tests for retries, deadlines, the circuit breaker and hedged calls around the OpenAI API
+"""
+
+import io
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import httpx
+import openai
+
+from fake_openai_server import FakeOpenAIServer
+from openai_client import OpenAIClientManager
+from resilience import (
+    CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retries, parse_deadlines, retry_after_seconds
+)
+from app import app, DailyUsage, analyze_chart_with_ai
+from test_support import scrape_metrics, chart_png, ensure_user, login, run_suite
+
+FAST_RETRIES = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+
+
+def status_error(status, headers=None):
+    request = httpx.Request('POST', 'http://upstream.test/v1/chat/completions')
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    error_class = {429: openai.RateLimitError, 401: openai.AuthenticationError}.get(status, openai.InternalServerError)
+    return error_class('Upstream error', response=response, body=None)
+
+
+def analyze_upload(client, color='navy'):
+    return client.post('/api/analyze', data={'chart': (io.BytesIO(chart_png(color)), 'chart.png')},
+                       content_type='multipart/form-data')
+
+
+def test_backoff_and_retry_after():
+    """Test jittered backoff bounds, Retry-After parsing and per-call deadlines"""
+    print("Testing backoff and Retry-After...")
+
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=4.0)
+    for attempt, ceiling in ((1, 0.5), (2, 1.0), (3, 2.0), (6, 4.0)):
+        assert all(0 <= policy.backoff(attempt) <= ceiling for _ in range(50))
+    # The server's hint is a floor, even above max_delay
+    assert policy.backoff(1, retry_after=7) == 7
+
+    assert retry_after_seconds(status_error(429, {'Retry-After': '3'})) == 3
+    assert retry_after_seconds(status_error(429, {'retry-after-ms': '250'})) == 0.25
+    assert retry_after_seconds(status_error(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+    assert retry_after_seconds(status_error(500)) is None
+
+    assert parse_deadlines('analyze=90, openai_call=30') == {'analyze': 90.0, 'openai_call': 30.0}
+    assert parse_deadlines('') == {}
+
+    # Retry-After is honored between attempts
+    errors = [status_error(429, {'Retry-After': '2'})]
+    sleeps = []
+
+    def attempt(timeout):
+        if errors:
+            raise errors.pop()
+        return 'ok'
+
+    assert call_with_retries(attempt, RetryPolicy(base_delay=0.01), sleep=sleeps.append) == 'ok'
+    assert sleeps == [2]
+
+    print("✓ Backoff and Retry-After test passed")
+
+
+def test_transient_errors_retried():
+    """Test that 429 and 5xx responses are retried and a bad API key is not"""
+    print("\nTesting retries against injected errors...")
+
+    with FakeOpenAIServer() as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url, max_retries=0)
+        with app.app_context(), \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None), \
+                patch('app.openai_retry_policy', FAST_RETRIES), \
+                patch('app.openai_circuit', CircuitBreaker(failure_threshold=5)):
+            server.fail_next(429, retry_after=0)
+            server.fail_next(502)
+            result = analyze_chart_with_ai(chart_png('navy'), 'Swing', 'Balanced', 'Stocks')
+            assert result['success'], result
+            assert len(server.requests) == 3
+
+            server.fail_next(401)
+            result = analyze_chart_with_ai(chart_png('navy'), 'Swing', 'Balanced', 'Stocks')
+            assert not result['success']
+            assert 'Invalid OpenAI API key' in result['error']
+            assert 'retry_after' not in result
+            assert len(server.requests) == 4
+
+            # Out of attempts: the client is told when to come back
+            server.fail_next(500, count=3)
+            result = analyze_chart_with_ai(chart_png('navy'), 'Swing', 'Balanced', 'Stocks')
+            assert not result['success']
+            assert result['retry_after'] >= 1
+            assert len(server.requests) == 7
+        manager.close()
+
+    print("✓ Retry test passed")
+
+
+def test_deadline_bounds_slow_calls():
+    """Test that a slow upstream is cut off at the call's deadline"""
+    print("\nTesting call deadlines...")
+
+    with FakeOpenAIServer() as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url, max_retries=0)
+        server.delay_next(2.0, count=3)
+        with app.app_context(), \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None), \
+                patch('app.openai_retry_policy', FAST_RETRIES), \
+                patch('app.openai_circuit', CircuitBreaker(failure_threshold=5)), \
+                patch.dict(app.config, {'OPENAI_CALL_DEADLINES': {'analyze': 0.4}}):
+            started = time.perf_counter()
+            result = analyze_chart_with_ai(chart_png('navy'), 'Swing', 'Balanced', 'Stocks')
+            elapsed = time.perf_counter() - started
+        manager.close()
+
+    assert not result['success']
+    assert 'took too long' in result['error']
+    assert elapsed < 1.5, elapsed
+
+    print("✓ Deadline test passed")
+
+
+def test_circuit_breaker_states():
+    """Test closed -> open -> half-open -> closed transitions"""
+    print("\nTesting circuit breaker states...")
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, clock=lambda: now[0])
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    try:
+        breaker.before_call()
+        assert False, 'open circuit should fail fast'
+    except CircuitOpenError as e:
+        assert e.retry_after == 10
+
+    # After the recovery timeout one probe goes through; others still fail fast
+    now[0] = 10
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    try:
+        breaker.before_call()
+        assert False, 'only one probe at a time'
+    except CircuitOpenError:
+        pass
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    now[0] = 20
+    breaker.before_call()
+    breaker.record_success()
+    stats = breaker.stats()
+    assert (stats['state'], stats['consecutive_failures'], stats['opened'], stats['short_circuited']) == \
+        ('closed', 0, 2, 2)
+
+    print("✓ Circuit breaker state test passed")
+
+
+def test_open_circuit_fails_fast():
+    """Test the 503 response, released quota and health status while the circuit is open"""
+    print("\nTesting open circuit at the API...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_resilience', is_premium=False, reset_usage=True).id
+
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    with FakeOpenAIServer() as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url, max_retries=0)
+        with app.test_client() as client, \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None), \
+                patch('app.openai_retry_policy', RetryPolicy(max_attempts=1)), \
+                patch('app.openai_circuit', breaker):
+            login(client, 'testuser_resilience')
+            assert client.get('/api/health').get_json()['status'] == 'healthy'
+
+            server.fail_next(503, count=2, retry_after=1)
+            for color in ('red', 'blue'):
+                response = analyze_upload(client, color)
+                assert response.status_code == 503
+                assert response.headers['Retry-After'] == '1'
+
+            started = time.perf_counter()
+            response = analyze_upload(client, 'green')
+            assert time.perf_counter() - started < 0.5
+            assert response.status_code == 503
+            assert 0 < int(response.headers['Retry-After']) <= 30
+            assert 'temporarily unavailable' in response.get_json()['error']
+            assert len(server.requests) == 2
+
+            health = client.get('/api/health').get_json()
+            assert health['status'] == 'degraded'
+            assert health['openai_circuit']['state'] == 'open'
+            assert 0 < health['openai_circuit']['retry_in'] <= 30
+
+            text = scrape_metrics(client).get_data(as_text=True)
+            assert 'openai_circuit_open 1' in text
+            assert 'openai_circuit_short_circuited_total 1' in text
+        manager.close()
+
+    with app.app_context():
+        assert DailyUsage.get_count(user_id, datetime.utcnow().date()) == 0
+
+    print("✓ Open circuit test passed")
+
+
+def test_hedged_call_for_premium_users():
+    """Test that a slow first attempt is raced by a hedge for premium users only"""
+    print("\nTesting hedged calls...")
+
+    with app.app_context():
+        ensure_user('testuser_resilience', is_premium=True, reset_usage=True)
+
+    with FakeOpenAIServer() as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url, max_retries=0)
+        with app.test_client() as client, \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None), \
+                patch('app.openai_circuit', CircuitBreaker()), \
+                patch.dict(app.config, {'OPENAI_HEDGE_ENABLED': True, 'OPENAI_HEDGE_DELAY': 0.1}):
+            login(client, 'testuser_resilience')
+
+            server.delay_next(1.5)
+            started = time.perf_counter()
+            response = analyze_upload(client)
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200, response.get_json()
+            assert elapsed < 1.0, elapsed
+            assert len(server.requests) == 2
+
+            text = scrape_metrics(client).get_data(as_text=True)
+            assert 'openai_hedges_total{call="analyze"} 1' in text
+
+            # Free users wait for the single attempt
+            with app.app_context():
+                ensure_user('testuser_resilience', is_premium=False)
+            server.delay_next(0.3)
+            assert analyze_upload(client, 'gray').status_code == 200
+            assert len(server.requests) == 3
+        manager.close()
+
+    print("✓ Hedged call test passed")
+
+
+def run_tests():
+    """Run all resilience tests"""
+    return run_suite('OpenAI Resilience', [
+        test_backoff_and_retry_after,
+        test_transient_errors_retried,
+        test_deadline_bounds_slow_calls,
+        test_circuit_breaker_states,
+        test_open_circuit_fails_fast,
+        test_hedged_call_for_premium_users,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,155 @@
+"""
+Tests for /api/stats and the per-user stats rollup
+"""
+
+import sys
+import threading
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from stats import summarize_stats
+from app import app, db, TradeAnalysis, UserStatsRollup, save_trade_analysis, set_analysis_outcome
+from test_support import ensure_user, login, run_suite
+
+
+def setup_stats_user():
+    """Create (or reset) a user with no analyses"""
+    user = ensure_user('testuser_stats')
+    TradeAnalysis.query.filter_by(user_id=user.id).delete()
+    UserStatsRollup.query.filter_by(user_id=user.id).delete()
+    db.session.commit()
+    return user
+
+
+def count_queries(client, url):
+    """Return the response and the number of SELECT statements issued while serving it"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_execute)
+    return response, statements
+
+
+def test_summarize_stats():
+    """Test folding grouped rows into totals and breakdowns"""
+    print("Testing stats summary...")
+
+    stats = summarize_stats([
+        ('Crypto', 'Day Trading', 'Moderate', 'win', 2, 160, 2),
+        ('Crypto', 'Swing Trading', 'Moderate', 'loss', 1, 50, 1),
+        ('Forex', 'Day Trading', None, 'pending', 3, 0, 0),
+    ])
+
+    assert stats['total_analyses'] == 6
+    assert (stats['wins'], stats['losses'], stats['pending']) == (2, 1, 3)
+    assert stats['win_rate'] == 66.67
+    assert stats['avg_confidence'] == 70
+    assert stats['breakdowns']['asset_type']['Crypto']['total_analyses'] == 3
+    assert stats['breakdowns']['asset_type']['Forex']['avg_confidence'] == 0
+    assert stats['breakdowns']['trading_style']['Day Trading']['win_rate'] == 100
+    assert stats['breakdowns']['risk_profile']['Unknown']['pending'] == 3
+
+    print("✓ Stats summary test passed")
+
+
+def test_stats_endpoint_uses_rollup():
+    """Test that /api/stats answers from one query and stays correct after outcome updates"""
+    print("\nTesting /api/stats with the rollup...")
+
+    with app.app_context():
+        user_id = setup_stats_user().id
+        for asset_type, confidence in (('Crypto', 80), ('Crypto', 60), ('Forex', None)):
+            save_trade_analysis(user_id, {'confidence_score': confidence}, 'Day Trading', 'Moderate', asset_type)
+        analysis_ids = [a.id for a in TradeAnalysis.query.filter_by(user_id=user_id).order_by(TradeAnalysis.id)]
+
+    with app.test_client() as client:
+        login(client, 'testuser_stats')
+        client.get('/api/user')
+
+        response = client.put(f'/api/analysis/{analysis_ids[0]}/outcome', json={'outcome': 'win'})
+        assert response.status_code == 200
+        response = client.put(f'/api/analysis/{analysis_ids[1]}/outcome', json={'outcome': 'loss'})
+        assert response.status_code == 200
+        # Saving the same outcome again must not double count
+        client.put(f'/api/analysis/{analysis_ids[1]}/outcome', json={'outcome': 'loss', 'notes': 'stopped out'})
+
+        response, statements = count_queries(client, '/api/stats')
+        assert response.status_code == 200
+        stats = response.get_json()['stats']
+        # The logged-in user, the ETag version lookup and the stats themselves
+        assert len(statements) <= 3, statements
+        assert not any('trade_analysis' in statement for statement in statements)
+
+        assert stats['total_analyses'] == 3
+        assert (stats['wins'], stats['losses'], stats['pending']) == (1, 1, 1)
+        assert stats['win_rate'] == 50
+        assert stats['avg_confidence'] == 70
+        assert stats['breakdowns']['asset_type']['Crypto']['wins'] == 1
+        assert stats['breakdowns']['asset_type']['Forex']['pending'] == 1
+
+        # The live aggregate over trade_analysis must agree with the rollup
+        with patch.dict(app.config, {'STATS_ROLLUP_ENABLED': False}):
+            live_stats = client.get('/api/stats').get_json()['stats']
+        assert live_stats == stats
+
+    print("✓ /api/stats rollup test passed")
+
+
+def test_concurrent_outcome_updates():
+    """Test that an outcome change based on a stale read is not applied to the rollup"""
+    print("\nTesting concurrent outcome updates...")
+
+    with app.app_context():
+        user_id = setup_stats_user().id
+        analysis_id = save_trade_analysis(user_id, {'confidence_score': 50}, 'Swing', 'Moderate', 'Crypto').id
+
+    def put_outcome(outcome):
+        with app.test_client() as client:
+            login(client, 'testuser_stats')
+            assert client.put(f'/api/analysis/{analysis_id}/outcome', json={'outcome': outcome}).status_code == 200
+
+    with app.app_context():
+        # Both requests read 'pending'; the other one commits 'loss' first
+        stale = db.session.get(TradeAnalysis, analysis_id)
+        assert stale.outcome == 'pending'
+        other = threading.Thread(target=put_outcome, args=('loss',))
+        other.start()
+        other.join()
+        assert not set_analysis_outcome(stale, 'win', '')
+        db.session.rollback()
+
+    # Through the endpoint the second change is re-read and applied on top of the first
+    put_outcome('win')
+    with app.test_client() as client:
+        login(client, 'testuser_stats')
+        stats = client.get('/api/stats').get_json()['stats']
+        with patch.dict(app.config, {'STATS_ROLLUP_ENABLED': False}):
+            live_stats = client.get('/api/stats').get_json()['stats']
+    assert (stats['wins'], stats['losses'], stats['pending']) == (1, 0, 0)
+    assert live_stats == stats
+
+    print("✓ Concurrent outcome update test passed")
+
+
+def run_tests():
+    """Run all stats tests"""
+    return run_suite('Stats', [
+        test_summarize_stats,
+        test_stats_endpoint_uses_rollup,
+        test_concurrent_outcome_updates,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,166 @@
+"""
+Tests for streamed chart analysis over Server-Sent Events
+"""
+
+import io
+import json
+import sys
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from fake_openai_server import DEFAULT_ANALYSIS, FakeOpenAIServer
+from openai_client import OpenAIClientManager
+from prompts import create_prompt_registry
+from app import app, db, TradeAnalysis, DailyUsage
+from test_support import chart_png, ensure_user, login, run_suite
+
+
+def parse_events(chunks):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for block in b''.join(chunks).decode('utf-8').split('\n\n'):
+        if not block.strip():
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def stream_upload(client, chart):
+    return client.post('/api/analyze/stream', data={
+        'chart': (io.BytesIO(chart), 'chart.png'),
+        'trading_style': 'Swing',
+        'asset_type': 'Stocks'
+    }, content_type='multipart/form-data', buffered=False)
+
+
+def usage_today(user_id):
+    with app.app_context():
+        return DailyUsage.get_count(user_id, datetime.utcnow().date())
+
+
+def test_stream_forwards_deltas_and_saves():
+    """Test that partial output arrives before the model finishes and the result is persisted"""
+    print("Testing streamed analysis...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_stream', reset_usage=True).id
+        before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+
+    registry = create_prompt_registry()
+    with FakeOpenAIServer(stream_chunks=6, chunk_delay=0.05) as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url)
+        with app.test_client() as client, \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None), \
+                patch('app.analysis_prompts', registry):
+            login(client, 'testuser_stream')
+
+            started = time.perf_counter()
+            response = stream_upload(client, chart_png('purple'))
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            assert 'Content-Encoding' not in response.headers
+
+            chunks = []
+            first_chunk_at = None
+            for chunk in response.response:
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter() - started
+                chunks.append(chunk)
+            total = time.perf_counter() - started
+            response.close()
+        manager.close()
+
+    # Six chunks 50ms apart: the first bytes arrive long before the end
+    assert first_chunk_at < total / 2, (first_chunk_at, total)
+    assert server.requests[0]['body']['stream'] == True
+
+    events = parse_events(chunks)
+    assert events[0] == ('status', {'stage': 'analyzing'})
+    assert ''.join(data['text'] for event, data in events if event == 'delta') == server.content
+    assert sum(1 for event, _ in events if event == 'delta') == 6
+
+    event, result = events[-1]
+    assert event == 'result'
+    assert result['success'] == True
+    assert result['analysis']['patterns'] == DEFAULT_ANALYSIS['patterns']
+
+    with app.app_context():
+        assert TradeAnalysis.query.filter_by(user_id=user_id).count() == before + 1
+        saved = db.session.get(TradeAnalysis, result['analysis']['analysis_id'])
+        assert (saved.trading_style, saved.asset_type) == ('Swing', 'Stocks')
+    assert usage_today(user_id) == 1
+
+    usage = registry.stats()['usage']
+    assert (usage[0]['calls'], usage[0]['prompt_tokens'], usage[0]['completion_tokens']) == (1, 1200, 300)
+
+    print("✓ Streamed analysis test passed")
+
+
+def test_stream_failures_release_quota():
+    """Test that unparseable output, aborted streams and bad uploads do not use a daily slot"""
+    print("\nTesting streamed analysis failures...")
+
+    with app.app_context():
+        user_id = ensure_user('testuser_stream', reset_usage=True).id
+        before = TradeAnalysis.query.filter_by(user_id=user_id).count()
+
+    with FakeOpenAIServer(content='{"market_type": "Crypto", "patterns": [', chunk_delay=0.01) as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url)
+        with app.test_client() as client, \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None):
+            login(client, 'testuser_stream')
+
+            # Truncated JSON streams fine but fails validation at the end
+            response = stream_upload(client, chart_png('orange'))
+            events = parse_events(list(response.response))
+            response.close()
+            assert events[-1][0] == 'result'
+            assert events[-1][1] == {'success': False, 'error': 'Failed to parse the analysis response. Please try again.'}
+            assert usage_today(user_id) == 0
+
+            # The client goes away after the first event
+            response = stream_upload(client, chart_png('teal'))
+            next(iter(response.response))
+            response.close()
+            assert usage_today(user_id) == 0
+
+            # The response is closed before the stream was ever read
+            requests_before = len(server.requests)
+            response = stream_upload(client, chart_png('navy'))
+            assert usage_today(user_id) == 1
+            response.close()
+            assert usage_today(user_id) == 0
+            assert len(server.requests) == requests_before
+
+            response = client.post('/api/analyze/stream', data={'chart': (io.BytesIO(b'x'), 'notes.txt')},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 400
+            assert response.get_json()['success'] == False
+
+            with patch.dict(app.config, {'ANALYSIS_STREAMING_ENABLED': False}):
+                assert stream_upload(client, chart_png('purple')).status_code == 404
+        manager.close()
+
+    with app.app_context():
+        assert TradeAnalysis.query.filter_by(user_id=user_id).count() == before
+
+    print("✓ Streamed analysis failure test passed")
+
+
+def run_tests():
+    """Run all streaming tests"""
+    return run_suite('Streaming Analysis', [
+        test_stream_forwards_deltas_and_saves,
+        test_stream_failures_release_quota,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,80 @@
+"""
+Shared helpers for the test modules
+Each module works with its own user so the modules can run in any order against one database
+"""
+
+import io
+import traceback
+from unittest.mock import patch
+
+from PIL import Image
+
+from app import app, db, User, DailyUsage
+
+PASSWORD = 'testpass123'
+METRICS_TOKEN = 'test-metrics-token'
+
+
+def ensure_user(username, full_name='Test User', is_premium=None, reset_usage=False):
+    """
+    Create the user on first use and return it; call inside an app context
+    is_premium, when given, is applied on every call; reset_usage clears the daily quota
+    """
+    db.create_all()
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        email = f"{username.replace('testuser_', 'test_', 1)}@example.com"
+        user = User(username=username, email=email, full_name=full_name)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+    if is_premium is not None:
+        user.is_premium = is_premium
+    db.session.commit()
+    if reset_usage:
+        db.session.execute(db.delete(DailyUsage).where(DailyUsage.user_id == user.id))
+        db.session.commit()
+    return user
+
+
+def login(client, username):
+    """Log the test client in as username"""
+    response = client.post('/api/login', json={'username': username, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+
+def chart_png(color='green', size=(64, 48)):
+    """A small solid PNG; vary the color to get distinct uploads past the analysis cache"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def scrape_metrics(client):
+    """GET /api/metrics the way a configured scraper does"""
+    with patch.dict(app.config, {'METRICS_TOKEN': METRICS_TOKEN}):
+        return client.get('/api/metrics', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+
+
+def run_suite(name, tests):
+    """Run test functions in order, printing a summary; returns True when all pass"""
+    print("=" * 60)
+    print(f"Running {name} Tests")
+    print("=" * 60)
+
+    try:
+        for test in tests:
+            test()
+
+        print("\n" + "=" * 60)
+        print(f"✓ All {name} tests passed!")
+        print("=" * 60)
+        return True
+    except AssertionError as e:
+        print(f"\n✗ Test failed: {e}")
+        traceback.print_exc()
+        return False
+    except Exception as e:
+        print(f"\n✗ Unexpected error: {e}")
+        traceback.print_exc()
+        return False
@@ -0,0 +1,155 @@
+"""
+Tests for multi-timeframe analysis: label handling, the single-call analyze mode and
+per-timeframe sub-results stored against the parent analysis
+"""
+
+import io
+import json
+import sys
+from unittest.mock import patch
+
+from analysis_cache import make_cache_key
+from fake_openai_server import DEFAULT_ANALYSIS, FakeOpenAIServer
+from openai_client import OpenAIClientManager
+from timeframes import InvalidTimeframeError, normalize_timeframe_results, order_timeframes
+from app import app, AnalysisTimeframe, analyze_chart_with_ai
+from test_support import chart_png, ensure_user, login, run_suite
+
+
+def test_timeframe_labels():
+    """Test label normalization, ordering and alignment of model results"""
+    print("Testing timeframe labels...")
+
+    order, labels = order_timeframes(['4H', '5 min', '1h'])
+    assert labels == ['5m', '1h', '4h']
+    assert order == [1, 2, 0]
+
+    for bad in (['5m', '5min'], ['1h', '60m'], ['1d', '24h'], ['1y', '1h'], ['0m', '1h']):
+        try:
+            order_timeframes(bad)
+            assert False, f'{bad} should be rejected'
+        except InvalidTimeframeError:
+            pass
+
+    results = normalize_timeframe_results(
+        [{'timeframe': '4H', 'trend': 'Bullish', 'patterns': 'flag'}, {'trend': 'Sideways'}, 'junk'],
+        ['5m', '4h']
+    )
+    assert [r['timeframe'] for r in results] == ['5m', '4h']
+    assert results[1]['trend'] == 'Bullish'
+    assert results[1]['patterns'] == []
+    # No label match for 5m, so the entry in its position is used
+    assert results[0]['trend'] == 'Sideways'
+    assert normalize_timeframe_results(None, ['1h']) == [{'timeframe': '1h', 'trend': None, 'direction': None,
+                                                          'patterns': [], 'indicators': [],
+                                                          'confidence_score': None, 'summary': None}]
+
+    single = make_cache_key(b'abc', 'Swing', 'Balanced', 'Crypto', 'gpt-4o')
+    assert single == make_cache_key(b'abc', 'Swing', 'Balanced', 'Crypto', 'gpt-4o', None)
+    assert make_cache_key([b'ab', b'c'], 'Swing', 'Balanced', 'Crypto', 'gpt-4o', ['5m', '1h']) != \
+        make_cache_key([b'a', b'bc'], 'Swing', 'Balanced', 'Crypto', 'gpt-4o', ['5m', '1h'])
+
+    print("✓ Timeframe label test passed")
+
+
+def test_single_call_with_all_charts():
+    """Test that all timeframes go to the model in one request with the prompt sent once"""
+    print("\nTesting multi-timeframe single call...")
+
+    content = dict(DEFAULT_ANALYSIS, timeframes=[
+        {'timeframe': '1h', 'trend': 'Bullish', 'direction': 'Long', 'confidence_score': 70},
+        {'timeframe': '5m', 'trend': 'Sideways', 'direction': 'Neutral', 'confidence_score': 40}
+    ], confluence='Higher timeframe uptrend, lower timeframe consolidating')
+
+    with FakeOpenAIServer(content=json.dumps(content)) as server:
+        manager = OpenAIClientManager(api_key='test-key', base_url=server.base_url)
+        with app.app_context(), \
+                patch('app.OPENAI_API_KEY', 'test-key'), \
+                patch('app.openai_clients', manager), \
+                patch('app.analysis_cache', None):
+            result = analyze_chart_with_ai([chart_png('red'), chart_png('blue')], 'Day Trade', 'Balanced',
+                                           'Crypto', timeframes=['5m', '1h'])
+        manager.close()
+
+    assert result['success'], result
+    assert len(server.requests) == 1
+    parts = server.requests[0]['body']['messages'][0]['content']
+    assert [part['type'] for part in parts] == ['text', 'text', 'image_url', 'text', 'image_url']
+    assert 'different timeframes (5m, 1h)' in parts[0]['text']
+    assert [parts[1]['text'], parts[3]['text']] == ['Timeframe: 5m', 'Timeframe: 1h']
+
+    timeframes = result['analysis']['timeframes']
+    assert [(t['timeframe'], t['trend']) for t in timeframes] == [('5m', 'Sideways'), ('1h', 'Bullish')]
+
+    print("✓ Multi-timeframe single call test passed")
+
+
+def test_timeframes_endpoint_stores_sub_results():
+    """Test the upload endpoint, sub-result storage and the detail response"""
+    print("\nTesting /api/analyze/timeframes...")
+
+    with app.app_context():
+        ensure_user('testuser_timeframes', is_premium=True)
+
+    received = []
+
+    def fake_analysis(charts, trading_style, risk_profile, asset_type, timeframes=None):
+        received.append(([bytes(chart) for chart in charts], timeframes))
+        analysis = dict(DEFAULT_ANALYSIS, timeframes=normalize_timeframe_results(
+            [{'timeframe': label, 'trend': 'Bullish', 'patterns': ['flag']} for label in timeframes], timeframes
+        ))
+        return {'success': True, 'analysis': analysis}
+
+    with app.test_client() as client, patch('app.analyze_chart_with_ai', side_effect=fake_analysis) as mock_analyze:
+        login(client, 'testuser_timeframes')
+
+        response = client.post('/api/analyze/timeframes', data={
+            'chart': [(io.BytesIO(b'4h chart'), '4h.png'), (io.BytesIO(b'5m chart'), '5m.png')],
+            'timeframe': ['4h', '5m'],
+            'asset_type': 'Forex'
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        analysis_id = response.get_json()['analysis']['analysis_id']
+
+        # Charts are passed shortest timeframe first, matching the labels
+        assert received == [([b'5m chart', b'4h chart'], ['5m', '4h'])]
+
+        detail = client.get(f'/api/analysis/{analysis_id}').get_json()['analysis']
+        assert [t['timeframe'] for t in detail['timeframes']] == ['5m', '4h']
+        assert detail['timeframes'][0]['patterns'] == ['flag']
+        assert detail['asset_type'] == 'Forex'
+
+        sparse = client.get(f'/api/analysis/{analysis_id}?fields=outcome').get_json()['analysis']
+        assert sparse == {'id': analysis_id, 'outcome': 'pending'}
+
+        # Rejected uploads
+        for data in (
+            {'chart': [(io.BytesIO(b'x'), 'a.png')], 'timeframe': ['5m']},
+            {'chart': [(io.BytesIO(b'x'), 'a.png'), (io.BytesIO(b'y'), 'b.png')], 'timeframe': ['5m']},
+            {'chart': [(io.BytesIO(b'x'), 'a.png'), (io.BytesIO(b'y'), 'b.png')], 'timeframe': ['5m', 'soon']},
+            {'chart': [(io.BytesIO(b'x'), 'a.png'), (io.BytesIO(b'y'), 'b.png')], 'timeframe': ['1h', '60m']},
+            {'chart': [(io.BytesIO(b'x'), 'a.png'), (io.BytesIO(b'y'), 'b.txt')], 'timeframe': ['5m', '1h']},
+        ):
+            response = client.post('/api/analyze/timeframes', data=data, content_type='multipart/form-data')
+            assert response.status_code == 400, data
+        assert mock_analyze.call_count == 1
+
+    with app.app_context():
+        rows = AnalysisTimeframe.query.filter_by(analysis_id=analysis_id).order_by(AnalysisTimeframe.position).all()
+        assert [(row.position, row.timeframe, row.trend) for row in rows] == [(0, '5m', 'Bullish'), (1, '4h', 'Bullish')]
+
+    print("✓ /api/analyze/timeframes test passed")
+
+
+def run_tests():
+    """Run all multi-timeframe tests"""
+    return run_suite('Multi-Timeframe Analysis', [
+        test_timeframe_labels,
+        test_single_call_with_all_charts,
+        test_timeframes_endpoint_stores_sub_results,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,92 @@
+"""
+Tests for the in-memory upload path of /api/analyze
+Uploads must reach the analyzer without being written to disk
+"""
+
+import io
+import sys
+import tempfile
+from unittest.mock import patch
+
+from werkzeug.datastructures import FileStorage
+
+from app import app, ChartUploadRequest, read_upload
+from test_support import ensure_user, login, run_suite
+
+
+def test_read_upload_returns_memoryview():
+    """Test that in-memory and spooled streams are both exposed as memoryviews"""
+    print("Testing read_upload...")
+
+    in_memory = FileStorage(stream=io.BytesIO(b'chart bytes'), filename='chart.png')
+    view = read_upload(in_memory)
+    assert isinstance(view, memoryview)
+    assert view == b'chart bytes'
+    view.release()
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=4)
+    spooled.write(b'larger chart bytes')
+    view = read_upload(FileStorage(stream=spooled, filename='chart.png'))
+    assert view == b'larger chart bytes'
+
+    print("✓ read_upload test passed")
+
+
+def test_request_buffers_small_uploads_in_memory():
+    """Test that only uploads above the threshold get a spooled stream"""
+    print("\nTesting upload stream selection...")
+
+    with app.test_request_context('/api/analyze', method='POST'):
+        request = ChartUploadRequest.from_values()
+        threshold = app.config['UPLOAD_SPOOL_THRESHOLD']
+        assert isinstance(request._get_file_stream(1024, 'image/png'), io.BytesIO)
+        assert isinstance(request._get_file_stream(threshold + 1, 'image/png'), tempfile.SpooledTemporaryFile)
+        assert isinstance(request._get_file_stream(None, 'image/png'), tempfile.SpooledTemporaryFile)
+
+    print("✓ Upload stream selection test passed")
+
+
+def test_analyze_passes_upload_bytes_without_saving():
+    """Test that /api/analyze never saves the upload and keeps same-named uploads apart"""
+    print("\nTesting /api/analyze without disk writes...")
+
+    seen = []
+
+    def fake_analyze(image_bytes, trading_style, risk_profile, asset_type):
+        seen.append(bytes(image_bytes))
+        return {'success': True, 'analysis': {'market_type': 'Crypto'}}
+
+    with app.app_context():
+        ensure_user('testuser_uploads', is_premium=True)
+
+    with app.test_client() as client, \
+            patch('app.analyze_chart_with_ai', side_effect=fake_analyze), \
+            patch.object(FileStorage, 'save', side_effect=AssertionError('upload written to disk')):
+        login(client, 'testuser_uploads')
+
+        for payload in (b'first chart', b'second chart'):
+            data = {'chart': (io.BytesIO(payload), 'chart.png')}
+            response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+            assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+
+        assert seen == [b'first chart', b'second chart']
+
+        data = {'chart': (io.BytesIO(b''), 'chart.png')}
+        response = client.post('/api/analyze', data=data, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    print("✓ /api/analyze without disk writes test passed")
+
+
+def run_tests():
+    """Run all upload path tests"""
+    return run_suite('Upload Path', [
+        test_read_upload_returns_memoryview,
+        test_request_buffers_small_uploads_in_memory,
+        test_analyze_passes_upload_bytes_without_saving,
+    ])
+
+
+if __name__ == '__main__':
+    success = run_tests()
+    sys.exit(0 if success else 1)
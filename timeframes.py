@@ -0,0 +1,88 @@
+"""
+Timeframe labels for multi-timeframe analyses
+Charts of one instrument are uploaded with labels such as 5m, 1h or 4h. Labels are
+normalized and ordered from the shortest to the longest timeframe so the prompt, the
+cache key and the stored sub-results do not depend on upload order.
+"""
+
+import re
+
+_TIMEFRAME_LABEL = re.compile(r'^(\d{1,4})\s*(m|min|h|d|w)$')
+
+# Minutes per unit
+_UNIT_MINUTES = {'m': 1, 'min': 1, 'h': 60, 'd': 1440, 'w': 10080}
+
+# Fields kept from each per-timeframe result the model returns
+TIMEFRAME_RESULT_FIELDS = ('trend', 'direction', 'patterns', 'indicators', 'confidence_score', 'summary')
+
+
+class InvalidTimeframeError(ValueError):
+    """Raised for a timeframe label that cannot be parsed or is repeated"""
+
+
+def timeframe_minutes(label):
+    """Length of a timeframe in minutes, or None if the label is not recognized"""
+    if not isinstance(label, str):
+        return None
+    match = _TIMEFRAME_LABEL.match(label.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * _UNIT_MINUTES[match.group(2)]
+
+
+def normalize_timeframe(label):
+    """
+    Canonical form of a timeframe label, e.g. '15 min' -> '15m', '1H' -> '1h'
+    Raises InvalidTimeframeError for anything else
+    """
+    minutes = timeframe_minutes(label)
+    if minutes is None:
+        raise InvalidTimeframeError(f'Invalid timeframe: {label!r}. Use labels like 5m, 1h, 4h, 1d or 1w')
+    match = _TIMEFRAME_LABEL.match(label.strip().lower())
+    unit = 'm' if match.group(2) == 'min' else match.group(2)
+    return f'{int(match.group(1))}{unit}'
+
+
+def order_timeframes(labels):
+    """
+    Normalize labels and return the indices that sort them shortest first, with the
+    normalized labels in that order
+    """
+    normalized = [normalize_timeframe(label) for label in labels]
+    # Compare lengths, not labels: 1h and 60m are the same timeframe
+    if len({timeframe_minutes(label) for label in normalized}) != len(normalized):
+        raise InvalidTimeframeError('Each chart must have a different timeframe')
+    order = sorted(range(len(normalized)), key=lambda index: timeframe_minutes(normalized[index]))
+    return order, [normalized[index] for index in order]
+
+
+def normalize_timeframe_results(results, timeframes):
+    """
+    Align the model's per-timeframe results with the requested timeframes
+    Entries are matched by their timeframe label; requested timeframes without a match
+    take the unmatched entries in order, and any still missing become empty results
+    """
+    entries = [entry for entry in results if isinstance(entry, dict)] if isinstance(results, list) else []
+    requested = {timeframe_minutes(label) for label in timeframes}
+    by_label = {}
+    unmatched = []
+    for entry in entries:
+        minutes = timeframe_minutes(entry.get('timeframe'))
+        if minutes in requested:
+            by_label.setdefault(minutes, entry)
+        else:
+            unmatched.append(entry)
+    unmatched.reverse()
+
+    aligned = []
+    for label in timeframes:
+        entry = by_label.get(timeframe_minutes(label))
+        if entry is None:
+            entry = unmatched.pop() if unmatched else {}
+        result = {'timeframe': label}
+        result.update((field, entry.get(field)) for field in TIMEFRAME_RESULT_FIELDS)
+        for field in ('patterns', 'indicators'):
+            if not isinstance(result[field], list):
+                result[field] = []
+        aligned.append(result)
+    return aligned